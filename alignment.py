@@ -17,6 +17,24 @@
 #   4) Print the multiple alignment using method PrintDisplayStrings
 #      The default is to print the multiple alignment horizontally as single strings,
 #      however, you may specify the number of desired positions per line of text.
+#      To write several formats at once, in a single pass, use function RenderAll of module
+#      renderers.
+#   5) Optionally, save the alignment using method SaveState, and later restore it using function
+#      LoadState and add further pairwise alignments using method InsertAlignments, which
+#      updates the existing strings rather than creating them anew
+#   6) Optionally, before creating the strings, call method SetCompactRows to hold the display
+#      strings of each aligned structure in a compact encoding (see compactRows.py); they are
+#      decoded only as they are printed or requested
+#   7) To look at a few rows or columns of the multiple alignment, without creating all of its
+#      strings, use method View, which returns an AlignmentView (see alignmentView.py)
+#   8) For panels too large to hold in memory, use class WindowedAlignment of module
+#      windowedAlignment instead, which keeps the column store and display strings in spill
+#      files, and creates the strings one window of reference positions at a time
+#
+# Identical pairwise alignments (e.g., of near-identical strains) are stored once: a pairwise
+# alignment whose lines, or whose mapping onto the reference, matches that of an alignment
+# already added is not mapped or stored again, but shares the earlier alignment's row of the
+# column store and its display strings (the same stringPair object).
 #
 # Programmer's notes:
 #   a) A terminal '*' is added to the end of the reference sequence and to the ends of
@@ -37,14 +55,33 @@
 # support, updates, enhancements, or modifications.
 ##################################################################################################
 
-import re, copy
+import re, copy, bisect, cPickle, math, hashlib
+from array import array
+import compactRows            # compactRows.py module; encoded display strings
+import pairwise               # pairwise.py module; scores of pairwise alignments
+import alignmentView          # alignmentView.py module; rows and columns built on demand
 p_comment = re.compile('^#')
+p_referenceGap = re.compile('[-.]+')  # run of gap characters in the reference line of a pairwise alignment
 
 TM_ALIGN           = "TM-align"
 DALI_LITE          = "DaliLite"
 STANDARD           = "combAlign"
 ALIGNED_FASTA      = "aligned_fasta" # format according to www.bioperl.org/wiki/FASTA_multiple_alignment_format
-ACCEPTABLE_OUTPUT_FORMATS = (STANDARD,ALIGNED_FASTA)
+CLUSTAL            = "clustal"
+STOCKHOLM          = "stockholm"
+A2M                = "a2m"
+ACCEPTABLE_OUTPUT_FORMATS = (STANDARD,ALIGNED_FASTA,CLUSTAL,STOCKHOLM,A2M)  # written by module renderers
+LINEAR_ENGINE      = "linear"     # default; loop widths computed once, strings written in one pass
+COLUMNWISE_ENGINE  = "columnwise" # original engine; strings grown one column at a time
+ACCEPTABLE_BUILD_ENGINES = (LINEAR_ENGINE,COLUMNWISE_ENGINE)
+MAP_FIELDS         = ("matchName","referenceLine","correspondenceLine","matchLine")  # fields used by MapAlignment
+MAP_CHUNK_SIZE     = 64           # pairwise alignments sent to a worker process at a time
+STATE_VERSION      = 2            # of the alignment saved by method SaveState; a state of another version is refused
+STATE_HEADER       = "combAlign state %d\n"  # written ahead of the pickled alignment
+STRONG_CORRESPONDENCE = ":|"      # TM-align close pairs, Dali Lite identities
+WEAK_CORRESPONDENCE   = "."
+NON_RESIDUES       = "-*. "       # characters of a display string that are not residues
+CONSENSUS_NAME     = "consensus"  # label of the consensus line, when printed
 
 class Alignment(object):
 
@@ -54,19 +91,35 @@ class Alignment(object):
         self.reference   = "unknown"   # name of reference structure|sequence
         self.refHeader   = ">undefined"
         self.refSequence = "empty"
+        self.refLength   = 0           # length of reference sequence, including the terminal '*'
         self.alignmentCount = 0        # increments with each added alignment
-        self.multiAlignment = []       # list of pairwiseData objects, one per position along reference
         self.pair_i      = 0           # index for self.alignment list (max pair_i is No. of pairwise alignments-1)
         self.matchNameList = []        # captures list of match sequence names
-        self.pairwiseData = {          # Each residue of reference is tagged (via array position) with data:
-            "refChar"            : "", # Residue in the reference sequence at current position (should mimic self.refSequence)
-            "correspondenceList" : [], # list of values for R's that correspond ('.', ':', or ' ')
-            "matchList"          : [], # list of R's that correspond to position on reference
-            "gapList"            : [], # list of strings, each comprising a loop in match, gap in reference
-            }
+        self.scores      = {}          # alignment index -> dict of the scores given for it, if any (see pairwise.py)
+        # Column store: each residue of the reference is tagged (via array position) with data from
+        # every distinct pairwise alignment. Row r occupies bytes r*refLength:(r+1)*refLength of each
+        # matrix; alignment j is held in row rowIndex[j], and row r was first added as alignment
+        # rowOwners[r]. rowKeys maps a digest of the content of each row to the row.
+        self.rowIndex             = array('I')
+        self.rowOwners            = array('I')
+        self.rowKeys              = {}
+        self.matchMatrix          = bytearray()     # R's that correspond to each position on reference
+        self.correspondenceMatrix = bytearray()     # values for R's that correspond ('.', ':', ' ', or '|')
+        # Insertion table: loops in match sequences, i.e., gaps in reference. Loop k of the table is
+        # opened ahead of reference position insertionPositions[k], and comprises residues
+        # insertionResidues[insertionOffsets[k]:insertionOffsets[k+1]]. Row r owns loops
+        # insertionRowStarts[r]:insertionRowStarts[r+1], in order of reference position.
+        self.insertionPositions   = array('I')
+        self.insertionOffsets     = array('I',[0])
+        self.insertionResidues    = bytearray()
+        self.insertionRowStarts   = array('I',[0])
         self.loopStrings    = []       # list of strings in match sequences that extend gaps in reference
         self.refDisplayString = ""     # holds final (gapped) reference sequence
         self.displayStrings = []       # list of stringPairs for formatted alignment display
+        self.loopWidths  = None        # gap columns opened ahead of each reference position, once strings are created
+        self.columnIndex = None        # gapped column of each reference position, once strings are created
+        self.region      = None        # (first, last) reference residues (from 1) to print; None for all
+        self.builtCount  = 0           # number of alignments whose display strings have been created
         self.stringPair = {            # a matching sequence and the correspondence values ('.', ':', or ' ')
             "correspondence"  : "",
             "match"           : "",
@@ -78,13 +131,14 @@ class Alignment(object):
         else:
             self.method = TM_ALIGN 
         self.outputFormat = STANDARD 
+        self.buildEngine  = LINEAR_ENGINE
+        self.consensusLine = False     # When True, PrintDisplayStrings2file() adds a consensus line
+        self.compactRows  = False      # When True, display strings are held encoded (see compactRows.py)
 
     def EnterReference(self,refSeq):   # Enters a reference sequence 
-        # Method EnterReference() establishes the data structure for capturing the residue-
-        # by-residue correspondences between each reference residue and its counterpart in
-        # each aligned sequence or structure. Thus, for each position in the reference
-        # sequence, a pairwiseData object is created and assigned to that position,
-        # including the terminal '*'. 
+        # Method EnterReference() establishes the reference sequence against which the residue-
+        # by-residue correspondences of each aligned sequence or structure are captured. The
+        # column store holds one position per reference residue, including the terminal '*'.
 
         if isinstance(refSeq,dict):
             if "reference" in refSeq:
@@ -101,13 +155,7 @@ class Alignment(object):
                     self.refSequence += '*'  # add terminal '*'
             else:
                 return False
-
-            # Construct self.multiAlignment list of pairwiseData objects, one per reference residue
-            # Data details are entered in method AddAlignment
-            refLength = len(self.refSequence) # sequence length plus 1 (including the '*')
-            for i in xrange(0,refLength):  
-                nextPairwise = copy.deepcopy(self.pairwiseData)
-                self.multiAlignment.append(nextPairwise)
+            self.refLength = len(self.refSequence) # sequence length plus 1 (including the '*')
             return True
         else:
             return False
@@ -119,65 +167,135 @@ class Alignment(object):
         #                      ..         .   .  ::::  # correspondence
         #           ---------TDPA---------P---P--PTAL  # match
         # For the multiple alignment, gaps are introduced into the reference sequence string.
-        # For example, the 2-residue gap is recorded as "TD" in the gapList field of self.
-        # pairwiseData at array position 8 (self.multiAlignment[8]), attached to preceding 'A',
-        # in self.pairwiseData["gapList"].
-        
-        if isinstance(newAlignment,dict):
-            if "matchName" in newAlignment:
-                matchName = newAlignment["matchName"]
-            else:
-                return 2
-            if "referenceLine" in newAlignment:
-                reference = newAlignment["referenceLine"]
-                if reference[-1] != '*':
-                    reference += '*'
-                referenceLen = len(reference)
-            else:
-                return 2
-            if "correspondenceLine" in newAlignment:
-                correspondence = newAlignment["correspondenceLine"]
-                if correspondence[-1] != '*':
-                    correspondence += '*'
-                correspondenceLen = len(correspondence)
-            else:
-                return 2
-            if "matchLine" in newAlignment:
-                match = newAlignment["matchLine"]
-                if match[-1] != '*':
-                    match += '*'
-                matchLen = len(match)
-            else:
-                return 2
-
-            # Input alignment should consiste of 3 strings (reference, correspondence, and
-            # aligned sequence), which are of equal length
-            if referenceLen == correspondenceLen and referenceLen == matchLen and matchLen > 0:
-                self.matchNameList.append(matchName)
-                gapString = ""
-                ref_i = 0  # index of positions along reference sequence (no gaps)
-                # i is index of positions along gapped reference from alignment
-                for i in xrange(0,matchLen):
-                    if reference[i] == '-' or reference[i] == '.':  # gap was introduced into reference sequence
-                        gapString += match[i]
-                    else:  # next character in reference line is not gap character
-                        self.multiAlignment[ref_i]["refChar"] = self.refSequence[ref_i]  #*** redundant: assigns every time
-                        self.multiAlignment[ref_i]["matchList"].append(match[i])
-                        self.multiAlignment[ref_i]["correspondenceList"].append(correspondence[i])
-                        self.multiAlignment[ref_i-1]["gapList"].append(gapString) # associate gapstring w/previous ref R
-                        gapString = ""  # reset
-                        ref_i += 1
-                # Construct empty display strings for correspondence and match\
-                self.loopStrings.append("")  # construct/add to list of loopStrings, one for each match sequence
-                newStringPair = copy.deepcopy(self.stringPair)
-                self.displayStrings.append(newStringPair)
-                self.alignmentCount += 1
-                return 0
-            else:
-		print "referenceLen is", referenceLen, "correspondenceLen is", correspondenceLen, "matchLen is", matchLen
-                return 3  # error code
+        # For example, the 2-residue gap is recorded as loop "TD" in the insertion table, opened
+        # ahead of reference position 9 (following 'A' at position 8). The match and correspondence
+        # characters at each reference position are appended to the column store.
+        # An alignment whose lines are those of an alignment already added is not mapped again.
+        # The alignment's scores, if any were given, are kept (see method SetScores).
+        key = LinesDigest(newAlignment)
+        if key in self.rowKeys:
+            failure = self.AddSharedAlignment(newAlignment["matchName"],self.rowKeys[key])
         else:
-            return 1  # error code
+            (failure, mapped) = MapAlignment(self.refLength,newAlignment)
+            if failure == 0:
+                failure = self.AddMappedAlignment(newAlignment["matchName"],mapped)
+            if failure == 0 and key:
+                self.rowKeys[key] = self.rowIndex[-1]
+        if failure == 0 and newAlignment.get("scores"):
+            self.SetScores(self.alignmentCount-1,newAlignment["scores"])
+        return failure
+
+    def AddMappedAlignment(self,matchName,mapped):
+        # Method AddMappedAlignment() appends a pairwise alignment that has already been mapped
+        # onto reference positions (see function MapAlignment) to the column store.
+        if len(mapped["matchRow"]) != self.refLength:
+            print "reference residue count is", len(mapped["matchRow"]), "reference sequence length is", self.refLength
+            return 3  # error code
+        key = MappedDigest(mapped)
+        if key in self.rowKeys:
+            return self.AddSharedAlignment(matchName,self.rowKeys[key])
+        self.rowKeys[key] = len(self.rowOwners)
+        self.rowIndex.append(len(self.rowOwners))
+        self.rowOwners.append(self.alignmentCount)
+        self.matchMatrix          += mapped["matchRow"]
+        self.correspondenceMatrix += mapped["correspondenceRow"]
+        base = self.insertionOffsets[-1]
+        self.insertionPositions.extend(mapped["loopPositions"])
+        self.insertionOffsets.extend([base + end for end in mapped["loopEnds"]])
+        self.insertionResidues += mapped["loopResidues"]
+        self.insertionRowStarts.append(len(self.insertionPositions))
+        self.matchNameList.append(matchName)
+        # Construct empty display strings for correspondence and match
+        self.loopStrings.append("")  # construct/add to list of loopStrings, one for each match sequence
+        newStringPair = copy.deepcopy(self.stringPair)
+        self.displayStrings.append(newStringPair)
+        self.alignmentCount += 1
+        return 0
+
+    def AddSharedAlignment(self,matchName,r):  # Adds an alignment identical to that held in row r of the column store
+        self.rowIndex.append(r)
+        self.matchNameList.append(matchName)
+        self.loopStrings.append("")
+        self.displayStrings.append(self.displayStrings[self.rowOwners[r]])
+        self.alignmentCount += 1
+        return 0
+
+    def SetScores(self,j,scores):  # Records the scores (dict of score name -> value) given for alignment j
+        self.scores[j] = dict(scores)
+
+    def IsRowOwner(self,j):  # Returns True if alignment j was the first added of those sharing its row
+        return self.rowOwners[self.rowIndex[j]] == j
+
+    def ShareDisplayStrings(self,first=0):  # Points each alignment from first on to the stringPair of its row's first alignment
+        for j in xrange(first,self.alignmentCount):
+            self.displayStrings[j] = self.displayStrings[self.rowOwners[self.rowIndex[j]]]
+
+    def GetMappedAlignment(self,j):  # Returns alignment j from the column store, as mapped by function MapAlignment
+        r = self.rowIndex[j]
+        start = r * self.refLength
+        first = self.insertionRowStarts[r]
+        last  = self.insertionRowStarts[r+1]
+        base  = self.insertionOffsets[first]
+        mapped = {
+            "matchRow"          : str(self.matchMatrix[start:start+self.refLength]),
+            "correspondenceRow" : str(self.correspondenceMatrix[start:start+self.refLength]),
+            "loopPositions"     : self.insertionPositions[first:last],
+            "loopEnds"          : array('I',[end - base for end in self.insertionOffsets[first+1:last+1]]),
+            "loopResidues"      : str(self.insertionResidues[base:self.insertionOffsets[last]]),
+            }
+        return mapped
+
+    def GetLoops(self,j):  # Returns dict of loop strings in alignment j, keyed by the reference position they precede
+        loops = {}
+        r = self.rowIndex[j]
+        for k in xrange(self.insertionRowStarts[r],self.insertionRowStarts[r+1]):
+            loops[self.insertionPositions[k]] = str(self.insertionResidues[self.insertionOffsets[k]:self.insertionOffsets[k+1]])
+        return loops
+
+    def GetLoop(self,j,position):  # Returns loop string (possibly empty) opened by alignment j ahead of position
+        r = self.rowIndex[j]
+        k = bisect.bisect_left(self.insertionPositions,position,self.insertionRowStarts[r],self.insertionRowStarts[r+1])
+        if k < self.insertionRowStarts[r+1] and self.insertionPositions[k] == position:
+            return str(self.insertionResidues[self.insertionOffsets[k]:self.insertionOffsets[k+1]])
+        return ""
+
+    def ReadRecord(self,r,start=0,end=None):
+        # Method ReadRecord() returns (match characters, correspondence characters, loops) of
+        # row r of the column store at reference positions start through end-1, where loops
+        # maps each position to the loop opened ahead of it (for positions start through end-1
+        # only).
+        if end is None:
+            end = self.refLength
+        offset = r * self.refLength
+        positions = self.insertionPositions
+        offsets = self.insertionOffsets
+        first = bisect.bisect_left(positions,start,self.insertionRowStarts[r],self.insertionRowStarts[r+1])
+        last  = bisect.bisect_left(positions,end,first,self.insertionRowStarts[r+1])
+        loops = {}
+        for k in xrange(first,last):
+            loops[positions[k]] = str(self.insertionResidues[offsets[k]:offsets[k+1]])
+        return (str(self.matchMatrix[offset+start:offset+end]), str(self.correspondenceMatrix[offset+start:offset+end]), loops)
+
+    def GetPairwiseData(self,i):
+        # Method GetPairwiseData() reconstructs, from the column store, the data captured for
+        # reference position i: the reference residue, the match and correspondence characters
+        # from each alignment, and the loop (possibly empty) that each alignment inserts
+        # following position i.
+        pairwise = {
+            "refChar"            : "",
+            "correspondenceList" : [],
+            "matchList"          : [],
+            "gapList"            : [],
+            }
+        if self.alignmentCount > 0:
+            pairwise["refChar"] = self.refSequence[i]
+        nextPosition = (i + 1) % self.refLength  # loop opened ahead of next position (leading loop wraps to '*')
+        for j in xrange(0,self.alignmentCount):
+            offset = self.rowIndex[j] * self.refLength + i
+            pairwise["matchList"].append(chr(self.matchMatrix[offset]))
+            pairwise["correspondenceList"].append(chr(self.correspondenceMatrix[offset]))
+            pairwise["gapList"].append(self.GetLoop(j,nextPosition))
+        return pairwise
 
     def IsLoop(self):
         result = False
@@ -186,13 +304,211 @@ class Alignment(object):
                 result = True
         return result
 
-    def CreateAlignmentStrings(self):
-        for i in xrange(0,len(self.refSequence)): # Add next chars to display strings; iterate through multiAlignment data structure
-            for j in xrange(0,self.alignmentCount): # Append gapList at prev refSeq pos to j's current loopString
-                self.loopStrings[j] += self.multiAlignment[i-1]["gapList"][j] # recall: gap is associated w/prev pos
+    def CreateAlignmentStrings(self):  # Build the gapped reference and display strings using self.buildEngine
+        if self.buildEngine == COLUMNWISE_ENGINE:
+            self.CreateAlignmentStringsColumnwise()
+        else:
+            self.CreateAlignmentStringsLinear()
+
+    def ComputeLoopWidths(self):
+        # The number of gap columns opened in the reference ahead of position i is the length
+        # of the longest loop opened ahead of position i, across all alignments.
+        loopWidths = [0] * self.refLength
+        offsets = self.insertionOffsets
+        k = 0
+        for position in self.insertionPositions:
+            width = offsets[k+1] - offsets[k]
+            if width > loopWidths[position]:
+                loopWidths[position] = width
+            k += 1
+        return loopWidths
+
+    def ComputeColumnIndex(self, loopWidths=None):  # Returns the gapped column of each reference position, given the loop widths (by default, the alignment's)
+        if loopWidths is None:
+            loopWidths = self.loopWidths
+        columnIndex = array('I')
+        col = 0
+        for width in loopWidths:
+            col += width  # gap columns opened ahead of the position
+            columnIndex.append(col)
+            col += 1
+        return columnIndex
+
+    def Region(self,start,end):
+        # Method Region() returns the (first, last+1) gapped columns spanned by reference residues
+        # start through end (numbered from 1), including the gap columns between them but not
+        # those ahead of residue start, or None if the residues are not in the reference or the
+        # strings have not been created.
+        if self.columnIndex is None or not (1 <= start <= end < self.refLength):
+            return None
+        return (self.columnIndex[start-1], self.columnIndex[end-1] + 1)
+
+    def GetBuildCounters(self):  # Returns dict of counts describing the alignment and its display strings
+        loopWidths = self.loopWidths or [0]
+        counters = {
+            "alignmentsAdded"  : self.alignmentCount,
+            "distinctAlignments" : len(self.rowOwners),  # rows of the column store
+            "referenceLength"  : max(self.refLength - 1, 0),  # excluding the terminal '*'
+            "gappedLength"     : len(self.refDisplayString),
+            "loopCount"        : len(self.insertionPositions),
+            "insertionColumns" : sum(loopWidths),
+            "largestLoop"      : max(loopWidths),
+            }
+        return counters
+
+    def CreateAlignmentStringsLinear(self):
+        # Method CreateAlignmentStringsLinear() produces exactly the same strings as method
+        # CreateAlignmentStringsColumnwise(), but determines the width of each insertion loop
+        # once, up front, so that every display string can be written in a single pass into a
+        # preallocated buffer. A loop is written left-justified into its gap columns, and the
+        # remainder of the columns is left as '-' (match) and ' ' (correspondence).
+        self.loopWidths = self.ComputeLoopWidths()
+        self.columnIndex = self.ComputeColumnIndex()
+        self.builtCount = 0
+        if self.alignmentCount == 0:  # no reference residues were registered
+            return
+
+        # Gapped reference: each reference position is preceded by its loop width of gap characters
+        loopPositions = [i for i in xrange(0,self.refLength) if self.loopWidths[i]]
+        gappedLength = self.refLength + sum(self.loopWidths)
+        self.refDisplayString = self.BuildDisplayRow(self.refSequence, (), loopPositions, self.loopWidths, gappedLength, '-')
+        self.CreateDisplayRows()
+
+    def CreateDisplayRows(self):  # Writes the display strings of alignments added since the last build
+        refLength = self.refLength
+        loopWidths = self.loopWidths
+        loopPositions = [i for i in xrange(0,refLength) if loopWidths[i]]
+        gappedLength = refLength + sum(loopWidths)
+        positions = self.insertionPositions
+        for j in xrange(self.builtCount,self.alignmentCount):
+            if not self.IsRowOwner(j):  # shares the display strings written for its row
+                continue
+            r = self.rowIndex[j]
+            loops = {}
+            for k in xrange(self.insertionRowStarts[r],self.insertionRowStarts[r+1]):
+                loops[positions[k]] = k
+            start = r * refLength
+            self.displayStrings[j]["match"] = self.BuildDisplayRow(
+                self.matchMatrix[start:start+refLength], loops, loopPositions, loopWidths, gappedLength, '-')
+            self.displayStrings[j]["correspondence"] = self.BuildDisplayRow(
+                self.correspondenceMatrix[start:start+refLength], (), loopPositions, loopWidths, gappedLength, ' ')
+            if getattr(self,"compactRows",False):
+                self.displayStrings[j] = compactRows.CompactRow(self.displayStrings[j]["match"],self.displayStrings[j]["correspondence"])
+        self.ShareDisplayStrings(self.builtCount)
+        self.builtCount = self.alignmentCount
+
+    def InsertAlignments(self,newAlignments):
+        # Method InsertAlignments() adds a set of new pairwise alignments to an alignment whose
+        # strings have already been created (e.g., one restored using function LoadState), without
+        # recreating them. Returns the list of AddAlignment codes, one per new alignment.
+        codes = []
+        for newAlignment in newAlignments:
+            codes.append(self.AddAlignment(newAlignment))
+        self.ExtendAlignmentStrings()
+        return codes
+
+    def ExtendAlignmentStrings(self):
+        # Method ExtendAlignmentStrings() brings the gapped reference and display strings up to
+        # date with alignments added since they were created. Only the loops of the new
+        # alignments are examined: where a new loop is longer than the gap already opened in the
+        # reference, the extra gap columns are spliced into the existing strings at the end of
+        # that gap, which keeps existing loops left-justified. The new display strings are then
+        # written as usual. The result is identical to recreating all of the strings.
+        if self.loopWidths is None or self.builtCount == 0:
+            self.CreateAlignmentStrings()
+            return
+        oldWidths = self.loopWidths
+        newWidths = list(oldWidths)
+        positions = self.insertionPositions
+        offsets = self.insertionOffsets
+        builtRows = bisect.bisect_left(self.rowOwners,self.builtCount)  # rows first added before the last build
+        for k in xrange(self.insertionRowStarts[builtRows],len(positions)):
+            width = offsets[k+1] - offsets[k]
+            if width > newWidths[positions[k]]:
+                newWidths[positions[k]] = width
+
+        splices = []  # (column, count) of gap columns to insert, in existing string coordinates
+        col = 0
+        for i in xrange(0,self.refLength):
+            col += oldWidths[i]
+            if newWidths[i] > oldWidths[i]:
+                splices.append((col,newWidths[i]-oldWidths[i]))
+            col += 1
+        if splices:
+            self.refDisplayString = self.SpliceColumns(self.refDisplayString,splices,'-')
+            for j in xrange(0,self.builtCount):
+                if not self.IsRowOwner(j):  # spliced with its row's first alignment
+                    continue
+                stringPair = self.displayStrings[j]
+                stringPair["match"]          = self.SpliceColumns(stringPair["match"],splices,'-')
+                stringPair["correspondence"] = self.SpliceColumns(stringPair["correspondence"],splices,' ')
+        self.loopWidths = newWidths
+        self.columnIndex = self.ComputeColumnIndex()
+        self.CreateDisplayRows()
+
+    def SpliceColumns(self,string,splices,fill):  # Inserts count fill characters at each (column, count) of splices
+        pieces = []
+        prev = 0
+        for (col,count) in splices:
+            pieces.append(string[prev:col])
+            pieces.append(fill * count)
+            prev = col
+        pieces.append(string[prev:])
+        return ''.join(pieces)
+
+    def SaveState(self,STATEFILE):  # Saves the alignment, including its strings, to an open (binary) file
+        STATEFILE.write(STATE_HEADER % STATE_VERSION)
+        cPickle.dump(self,STATEFILE,cPickle.HIGHEST_PROTOCOL)
+
+    def BuildDisplayRow(self, row, loops, loopPositions, loopWidths, gappedLength, fill):
+        # Writes one display string: the per-position characters in row, with the gap columns ahead
+        # of each position in loopPositions holding that position's loop from the insertion table
+        # (loops maps position to table index), left-justified, and fill character elsewhere.
+        buffer = bytearray(fill * gappedLength)
+        offsets = self.insertionOffsets
+        col  = 0
+        prev = 0
+        for position in loopPositions:
+            buffer[col:col+position-prev] = row[prev:position]  # residues since previous loop
+            col += position - prev
+            if position in loops:
+                k = loops[position]
+                buffer[col:col+offsets[k+1]-offsets[k]] = self.insertionResidues[offsets[k]:offsets[k+1]]
+            col += loopWidths[position]
+            prev = position
+        buffer[col:] = row[prev:]
+        return str(buffer)
+
+    def BuildWindowRow(self, row, loops, start, loopPositions, loopWidths, width, fill):
+        # Writes the columns of one window of a display string: as method BuildDisplayRow, given
+        # the per-position characters in row of the window's positions (from start), the loop
+        # positions of the window, and loops mapping each position of the window to its loop
+        # (see method ReadRecord). The window is width columns wide.
+        buffer = bytearray(fill * width)
+        col  = 0
+        prev = start
+        for position in loopPositions:
+            buffer[col:col+position-prev] = row[prev-start:position-start]  # residues since previous loop
+            col += position - prev
+            if position in loops:
+                buffer[col:col+len(loops[position])] = loops[position]
+            col += loopWidths[position]
+            prev = position
+        buffer[col:] = row[prev-start:]
+        return str(buffer)
+
+    def CreateAlignmentStringsColumnwise(self):  # Original engine; appends one column at a time
+        # Only the first alignment of each row of the column store is written; the others share its display strings
+        owners = self.rowOwners
+        loops = dict([(j, self.GetLoops(j)) for j in owners])
+        matchRows = dict([(j, str(self.matchMatrix[r*self.refLength:(r+1)*self.refLength])) for (r, j) in enumerate(owners)])
+        correspondenceRows = dict([(j, str(self.correspondenceMatrix[r*self.refLength:(r+1)*self.refLength])) for (r, j) in enumerate(owners)])
+        for i in xrange(0,self.refLength): # Add next chars to display strings; iterate through the column store
+            for j in owners: # Append loop opened ahead of refSeq pos to j's current loopString
+                self.loopStrings[j] += loops[j].get(i,"")
             while self.IsLoop():
                 self.refDisplayString += '-'  # open/continue gap: reference seq's display string gets gap character
-                for j in xrange(0,self.alignmentCount):  
+                for j in owners:  
                     if self.loopStrings[j]:  # true if string not empty
                         self.displayStrings[j]["match"] += self.loopStrings[j][0]  # add 1st char from loopString[j]
                         self.loopStrings[j] = self.loopStrings[j][1:]  # remove 1st char from loopString[j]
@@ -200,10 +516,17 @@ class Alignment(object):
                     else:
                         self.displayStrings[j]["match"]          += '-'
                         self.displayStrings[j]["correspondence"] += ' '
-            self.refDisplayString += self.multiAlignment[i]["refChar"]
-            for j in xrange(0,self.alignmentCount):
-                self.displayStrings[j]["match"] += self.multiAlignment[i]["matchList"][j]
-                self.displayStrings[j]["correspondence"] += self.multiAlignment[i]["correspondenceList"][j]
+            if self.alignmentCount > 0:
+                self.refDisplayString += self.refSequence[i]
+            for j in owners:
+                self.displayStrings[j]["match"] += matchRows[j][i]
+                self.displayStrings[j]["correspondence"] += correspondenceRows[j][i]
+        self.loopWidths = self.ComputeLoopWidths()
+        self.columnIndex = self.ComputeColumnIndex()
+        self.builtCount = self.alignmentCount
+
+    def View(self):  # Returns an AlignmentView (see alignmentView.py) of the alignments added so far
+        return alignmentView.AlignmentView(self)
 
     def PrintReference(self):
         print "REFERENCE SEQUENCE:"
@@ -213,7 +536,8 @@ class Alignment(object):
     def PrintPairwiseData(self):
         position = 1
         print "LIST OF PAIRWISE DATA VALUES:"
-        for pairwise in self.multiAlignment:
+        for i in xrange(0,self.refLength):
+            pairwise = self.GetPairwiseData(i)
             print "Position number ", position
             print pairwise["refChar"]
             print pairwise["matchList"]
@@ -228,134 +552,94 @@ class Alignment(object):
             print "WARNING: unacceptable output format in alignment.py"
             return 4 
 
+    def SetRegion(self, start=None, end=None):  # Restricts PrintDisplayStrings2file() to reference residues start through end
+        if start is None:
+            self.region = None
+        elif 1 <= int(start) <= int(end) < self.refLength:
+            self.region = (int(start), int(end))
+        else:
+            print "WARNING: region is not within the reference sequence in alignment.py"
+            return 4
+
+    def SetCompactRows(self, compact):  # Determines whether display strings written by the default engine are held encoded
+        self.compactRows = bool(compact)
+
+    def SetConsensusLine(self, consensusLine):  # Determines whether PrintDisplayStrings2file() adds a consensus line
+        self.consensusLine = bool(consensusLine)
+
+    def ComputeColumnStatistics(self,first=0,last=None):
+        # Method ComputeColumnStatistics() computes, for each column of the multiple alignment
+        # (once its strings are created), the following, returned as a dict of per-column lists:
+        #   strong      - number of alignments with strong correspondence (':' or '|') in the column
+        #   weak        - number of alignments with weak correspondence ('.') in the column
+        #   gapFraction - fraction of sequences, including the reference, with a gap ('-' or '.') in the column
+        #   frequencies - dict of residue (in uppercase) -> number of sequences with it in the column
+        #   entropy     - Shannon entropy (bits) of the column's residues, ignoring gaps
+        #   consensus   - the most frequent residue in the column (first alphabetically, in case of
+        #                 a tie), '-' if the column has no residues, or '*' for the terminal column
+        # Statistics are computed for columns first through last-1 (by default, all columns).
+        # The display strings are joined end to end, so that each column is taken in a single
+        # slice (every gappedLength-th character), and characters are tallied with str.count.
+        return ColumnStatistics(self.refDisplayString,[stringPair["match"] for stringPair in self.displayStrings],
+            [stringPair["correspondence"] for stringPair in self.displayStrings],first,last)
+
+    def SetBuildEngine(self, engine):  # Determines execution of CreateAlignmentStrings()
+        if engine in ACCEPTABLE_BUILD_ENGINES:
+            self.buildEngine = engine
+        else:
+            print "WARNING: unacceptable build engine in alignment.py"
+            return 4
+
+    def GetPrintColumns(self):  # Returns (first, last+1) columns to print: all, or those of the region set by SetRegion()
+        region = getattr(self,"region",None)
+        if region:
+            if getattr(self,"columnIndex",None) is None:
+                self.columnIndex = self.ComputeColumnIndex()
+            return self.Region(region[0],region[1])
+        return (0, len(self.refDisplayString))
+
     def PrintDisplayStrings2file(self, OUTFILE, width=0):  # default is to print all sequence lines as single string
-        width = int(width) # cast to integer
-       
-        # Print summary information 
+        import renderers  # imported here, as module renderers imports this one
+        renderers.RenderAll(self,[(self.outputFormat,OUTFILE)],width)
+
+    def PrintSummary(self, OUTFILE, width, first, last, format=None):  # Prints summary information; returns the number of segments
         OUTFILE.write("%s%s\n" % ("Input format was ", self.method))
-        OUTFILE.write("%s%s\n" % ("Output format is ", self.outputFormat))
+        OUTFILE.write("%s%s\n" % ("Output format is ", format or self.outputFormat))
         OUTFILE.write("%s%s\n" % ("Length of gapped reference: ", len(self.refDisplayString))) 
+        region = getattr(self,"region",None)
+        if region:
+            OUTFILE.write("%s%s%s%s%s%s%s%s\n" % ("Region printed is reference residues ", region[0], " to ", region[1],
+                ", columns ", first+1, " to ", last))
 
         # Determine how many segments to print 
+        printLength = last - first
         if width == 0:
             segmentCount = 1
-        elif len(self.refDisplayString)%width == 0:
-            segmentCount = len(self.refDisplayString)/width
+        elif printLength%width == 0:
+            segmentCount = printLength/width
         else:
-            segmentCount = len(self.refDisplayString)/width + 1
+            segmentCount = printLength/width + 1
 
         OUTFILE.write("%s%s\n" % ("There will be this many segments: ", segmentCount))
         OUTFILE.write("%s%s\n" % ("The reference structure was:  ",self.reference))
         OUTFILE.write("%s%s\n" % ("The reference fasta was:  ",self.refHeader[1:]))
         OUTFILE.write("%s\n" % ("The compared structures were:"))
-        for name in self.matchNameList:
-            OUTFILE.write("%s%s\n" % ("  ",name))
-
-        # Print in ALIGNED_FASTA format
-        if self.outputFormat == ALIGNED_FASTA:
-            if width == 0:  # Simple case, print each sequence as single line
-                OUTFILE.write("%s\n" % (self.refHeader))
-                OUTFILE.write("%s\n" % (self.refDisplayString))
-                for i in xrange(0,len(self.matchNameList)):
-                    OUTFILE.write("%s%s\n" % (">", self.matchNameList[i]))
-                    pairwise = self.displayStrings[i]
-                    OUTFILE.write("%s\n" % (pairwise["match"]))
-                        
-            else:  # Split each sequence into fragments of size 'width'
-
-                # First, print the reference gapped sequence
-                OUTFILE.write("%s\n" % (self.refHeader))
-                for i in xrange(0,segmentCount-1):
-                    offset = i * width
-                    start = offset
-                    end   = offset + width
-                    OUTFILE.write("%s\n" % (self.refDisplayString[start:end])) 
-                if end < len(self.refDisplayString):
-                    OUTFILE.write("%s\n" % (self.refDisplayString[end:]))
-
-                # Next, for each aligned protein, print its gapped sequence
-                j = 0
-                for stringPair in self.displayStrings:
-                    # Print the current header
-                    OUTFILE.write("%s%s\n" % (">", self.matchNameList[j]))  # aligned protein's header
-                    j += 1
-                    for i in xrange(0,segmentCount-1):
-                        # Calculate offset and start,end for current segment, then print
-                        offset = i * width
-                        start = offset
-                        end   = offset + width
-                        OUTFILE.write("%s\n" % (stringPair["match"][start:end]))
-                    if end < len(stringPair["match"]):
-                        OUTFILE.write("%s\n" % (stringPair["match"][end:]))
-            return
+        for j in xrange(0,len(self.matchNameList)):
+            if j in self.scores:  # followed by its scores, if any were given
+                OUTFILE.write("%s%s%s%s\n" % ("  ",self.matchNameList[j],"  ",pairwise.FormatScores(self.scores[j])))
+            else:
+                OUTFILE.write("%s%s\n" % ("  ",self.matchNameList[j]))
+        return segmentCount
 
-        # Print in default output format...
-        if width == 0:  # Simple case:  print as is
-            OUTFILE.write("%s%s%s\n" % (self.refDisplayString, " ", self.refHeader))
-            for stringPair in self.displayStrings:
-                OUTFILE.write("%s\n" % (stringPair["correspondence"]))
-                OUTFILE.write("%s\n" % (stringPair["match"]))
-                
-        else: # Split each reference and correspondence/match
-            # We need to determine how many chunks to split the alignment data
-            # into, depending on how long each chunk should be. 
-            list_i = 0 # need this to access match names in self.matchNameList
-            segmentSets = []  # list of stringPair segments
-            segmentSetDict = {
-                "reference"      : "",
-                "correspondence" : "",
-                "match"          : "",
-                "matchName"      : "",
-                }
-            # Perform splits: split data into designated chunks
-            # Split reference, correspondence, and match strings
-            # Assuming you have pairwise alignments A, B, C, and D,
-            # comprising alignment chunks A1, A2, A3, etc.,
-            # This places segmentSet objects as follows in segmentSets list:
-            #    A1  A2  A3  B1  B2  B3  C1  C2  C3  D1  D2  D3
-            # To be printed as:
-            #    A1
-            #    B1
-            #    C1
-            #    D1
-            #    A2
-            #    B2  etc.
-            last = False
-            for stringPair in self.displayStrings:  # iterate through alignment strings
-                for i in xrange(0,segmentCount):  # len is same for all strings; split segmentCount times
-                    segmentSet = copy.deepcopy(segmentSetDict) # create new segmentSet
-                    if i == segmentCount-1:  # last segment (may be shorter than width)
-                        refSegment   = self.refDisplayString       [i*width:]
-                        correSegment = stringPair["correspondence"][i*width:]
-                        matchSegment = stringPair["match"]         [i*width:]
-                        segmentSet["correspondence"] = correSegment
-                        segmentSet["match"]          = matchSegment
-                        segmentSet["reference"]      = refSegment
-                        segmentSet["matchName"]      = self.matchNameList[list_i] # Name already appended in CreateAlignmentStrings
-                    else:
-                        refSegment   = self.refDisplayString       [i*width:(i+1)*width]
-                        correSegment = stringPair["correspondence"][i*width:(i+1)*width]
-                        matchSegment = stringPair["match"]         [i*width:(i+1)*width]
-                        segmentSet["correspondence"] = correSegment
-                        segmentSet["match"]          = matchSegment
-                        segmentSet["reference"]      = refSegment
-                        segmentSet["matchName"]      = self.matchNameList[list_i] # need to re-insert name due to line split
-                    segmentSets.append(segmentSet)
-                list_i += 1
-            OUTFILE.write("%s%s\n" % ("There are this many segment sets: ", len(segmentSets)))
-
-            refHeader = self.refHeader[1:]  # trim '>' from header
-
-            for i in xrange(0,segmentCount):
-                first = True
-                for j in xrange(0,self.alignmentCount):
-                    k = (j * segmentCount) + i
-                    if first:
-                        OUTFILE.write("%s%s%s\n" % (segmentSets[k]["reference"]," ",refHeader)) 
-                        first = False
-                    OUTFILE.write("%s\n"     % (segmentSets[k]["correspondence"]))
-                    OUTFILE.write("%s%s%s\n" % (segmentSets[k]["match"]," ", segmentSets[k]["matchName"]))
-                OUTFILE.write("%s\n" % (""))
+    def WriteFastaRecord(self,OUTFILE,header,sequence,width):  # Writes one aligned fasta record
+        if width == 0:
+            OUTFILE.write("%s\n%s\n" % (header,sequence))
+        else:
+            lines = [header]
+            for start in xrange(0,len(sequence),width):
+                lines.append(sequence[start:start+width])
+            lines.append("")
+            OUTFILE.write("\n".join(lines))
 
     def PrintAll(self):
         print "ALL DATA:"
@@ -372,3 +656,195 @@ class Alignment(object):
         self.PrintPairwiseData()
         self.PrintDisplayStrings()
                 
+
+def LoadState(STATEFILE):  # Returns the Alignment saved to an open (binary) file by method SaveState
+    header = STATE_HEADER % STATE_VERSION
+    if STATEFILE.readline(len(header)) != header:
+        raise ValueError("not a saved alignment state of this version of combAlign; build it again")
+    myAlignment = cPickle.load(STATEFILE)
+    if not isinstance(myAlignment,Alignment):
+        raise ValueError("not a saved alignment state")
+    return myAlignment
+
+def ColumnStatistics(reference,matches,correspondences,first=0,last=None):
+    # Function ColumnStatistics() computes the column statistics described under method
+    # ComputeColumnStatistics, given the gapped reference string and the match and
+    # correspondence strings of each aligned structure, all of the same length.
+    gappedLength = len(reference)
+    statistics = {"strong":[], "weak":[], "gapFraction":[], "frequencies":[], "entropy":[], "consensus":""}
+    if gappedLength == 0:
+        return statistics
+    sequences = ''.join([reference] + matches).upper()
+    correspondences = ''.join(correspondences)
+    sequenceCount = len(matches) + 1
+    consensus = []
+    if last is None:
+        last = gappedLength
+    for i in xrange(first,min(last,gappedLength)):
+        column = sequences[i::gappedLength]
+        frequencies = {}
+        for residue in set(column):
+            if residue not in NON_RESIDUES:
+                frequencies[residue] = column.count(residue)
+        residueCount = sum(frequencies.values())
+        entropy = 0.0
+        for count in frequencies.values():
+            p = float(count) / residueCount
+            entropy -= p * math.log(p,2)
+        if frequencies:
+            consensus.append(max(sorted(frequencies),key=frequencies.get))
+        elif '*' in column:
+            consensus.append('*')
+        else:
+            consensus.append('-')
+        correspondence = correspondences[i::gappedLength]
+        statistics["strong"].append(sum([correspondence.count(c) for c in STRONG_CORRESPONDENCE]))
+        statistics["weak"].append(correspondence.count(WEAK_CORRESPONDENCE))
+        statistics["gapFraction"].append((column.count('-') + column.count('.')) / float(sequenceCount))
+        statistics["frequencies"].append(frequencies)
+        statistics["entropy"].append(entropy)
+    statistics["consensus"] = ''.join(consensus)
+    return statistics
+
+def LinesDigest(newAlignment):  # Returns a digest of the lines of a pairwise alignment, or None if it lacks any
+    if not isinstance(newAlignment,dict):
+        return None
+    for field in MAP_FIELDS:
+        if field not in newAlignment:
+            return None
+    digest = hashlib.sha1("lines")
+    for field in MAP_FIELDS[1:]:  # the lines, but not the name
+        digest.update(newAlignment[field])
+        digest.update('\0')
+    return digest.digest()
+
+def MappedDigest(mapped):  # Returns a digest of a pairwise alignment as mapped by function MapAlignment
+    digest = hashlib.sha1("mapped")
+    for field in (mapped["matchRow"], mapped["correspondenceRow"], mapped["loopPositions"].tostring(),
+                  mapped["loopEnds"].tostring(), mapped["loopResidues"]):
+        digest.update(field)
+        digest.update('\0')
+    return digest.digest()
+
+def MapAlignment(refLength,newAlignment):
+    # Function MapAlignment() maps a pairwise alignment (see method AddAlignment) onto the
+    # positions of a reference sequence of length refLength (including the terminal '*').
+    # Returns (code, mapped), where code is 0 on success (otherwise an AddAlignment error code),
+    # and mapped is a dict comprising the match and correspondence characters at each reference
+    # position (matchRow, correspondenceRow), and the loops that the alignment inserts into the
+    # reference: loop k is opened ahead of reference position loopPositions[k], and comprises
+    # residues loopResidues[loopEnds[k-1]:loopEnds[k]].
+    if not isinstance(newAlignment,dict):
+        return (1, None)  # error code
+    if "matchName" not in newAlignment:
+        return (2, None)
+    if "referenceLine" in newAlignment:
+        reference = newAlignment["referenceLine"]
+        if reference[-1] != '*':
+            reference += '*'
+        referenceLen = len(reference)
+    else:
+        return (2, None)
+    if "correspondenceLine" in newAlignment:
+        correspondence = newAlignment["correspondenceLine"]
+        if correspondence[-1] != '*':
+            correspondence += '*'
+        correspondenceLen = len(correspondence)
+    else:
+        return (2, None)
+    if "matchLine" in newAlignment:
+        match = newAlignment["matchLine"]
+        if match[-1] != '*':
+            match += '*'
+        matchLen = len(match)
+    else:
+        return (2, None)
+
+    # Input alignment should consiste of 3 strings (reference, correspondence, and
+    # aligned sequence), which are of equal length
+    if not (referenceLen == correspondenceLen and referenceLen == matchLen and matchLen > 0):
+        print "referenceLen is", referenceLen, "correspondenceLen is", correspondenceLen, "matchLen is", matchLen
+        return (3, None)  # error code
+
+    matchFragments          = []
+    correspondenceFragments = []
+    loopPositions = array('I')
+    loopEnds      = array('I')
+    loopFragments = []
+    loopEnd = 0
+    ref_i = 0  # index of positions along reference sequence (no gaps)
+    prev  = 0  # i is index of positions along gapped reference from alignment
+    for gap in p_referenceGap.finditer(reference):  # gaps were introduced into reference sequence
+        start, end = gap.span()
+        matchFragments.append(match[prev:start])
+        correspondenceFragments.append(correspondence[prev:start])
+        ref_i += start - prev
+        loopPositions.append(ref_i)  # loop precedes the next reference residue
+        loopFragments.append(match[start:end])
+        loopEnd += end - start
+        loopEnds.append(loopEnd)
+        prev = end
+    matchFragments.append(match[prev:])
+    correspondenceFragments.append(correspondence[prev:])
+    ref_i += matchLen - prev
+
+    # Every reference residue must be accounted for by the alignment
+    if ref_i != refLength:
+        print "reference residue count is", ref_i, "reference sequence length is", refLength
+        return (3, None)  # error code
+
+    mapped = {
+        "matchRow"          : ''.join(matchFragments),
+        "correspondenceRow" : ''.join(correspondenceFragments),
+        "loopPositions"     : loopPositions,
+        "loopEnds"          : loopEnds,
+        "loopResidues"      : ''.join(loopFragments),
+        }
+    return (0, mapped)
+
+def MapAlignmentChunk(job):  # Maps a list of pairwise alignments in a worker process; job is (refLength, pairwiseList)
+    (refLength, pairwiseList) = job
+    return [MapAlignment(refLength,newAlignment) for newAlignment in pairwiseList]
+
+def MapAlignmentsParallel(refLength,pairwiseIterable,workers=0,chunkSize=MAP_CHUNK_SIZE):
+    # Function MapAlignmentsParallel() maps the pairwise alignments of pairwiseIterable onto the
+    # positions of a reference sequence of length refLength, as function MapAlignment does, but
+    # in a pool of worker processes (0 workers: one per cpu), chunkSize alignments at a time.
+    # Yields (matchName, code, mapped) for each pairwise alignment, in input order, so that
+    # adding them with method AddMappedAlignment produces exactly the alignment that calling
+    # AddAlignment on each would. Only the fields that MapAlignment uses are sent to a worker,
+    # and no more than two chunks per worker are outstanding, so that memory use is bounded
+    # regardless of the number of alignments.
+    import multiprocessing, collections
+    if workers <= 0:
+        workers = multiprocessing.cpu_count()
+    pool = multiprocessing.Pool(workers)
+    pending = collections.deque()  # (names, result) for each chunk submitted, in input order
+    try:
+        names = []
+        chunk = []
+        for newAlignment in pairwiseIterable:
+            if isinstance(newAlignment,dict):
+                names.append(newAlignment.get("matchName",""))
+                chunk.append(dict([(key,newAlignment[key]) for key in MAP_FIELDS if key in newAlignment]))
+            else:
+                names.append("")
+                chunk.append(newAlignment)
+            if len(chunk) == chunkSize:
+                pending.append((names, pool.apply_async(MapAlignmentChunk,((refLength,chunk),))))
+                names = []
+                chunk = []
+                while len(pending) > 2 * workers:
+                    (doneNames, result) = pending.popleft()
+                    for (matchName, (code, mapped)) in zip(doneNames,result.get()):
+                        yield (matchName, code, mapped)
+        if chunk:
+            pending.append((names, pool.apply_async(MapAlignmentChunk,((refLength,chunk),))))
+        while pending:
+            (doneNames, result) = pending.popleft()
+            for (matchName, (code, mapped)) in zip(doneNames,result.get()):
+                yield (matchName, code, mapped)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
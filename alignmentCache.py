@@ -0,0 +1,201 @@
+#################################################################################################
+# Module:  alignmentCache.py
+# Version No.: 1.1
+#
+# Description: This module contains an on-disk cache of pairwise alignments that have already
+# been parsed and mapped onto reference positions.
+# Classes: AlignmentCache, MemoryAlignmentCache
+#
+# Two kinds of entries are kept, each in its own file, named by a content hash:
+#   1) A mapped pairwise alignment (see function MapAlignment in alignment.py), keyed by a hash
+#      of the reference sequence plus the reference, correspondence, and match lines of the
+#      pairwise alignment. Entries are independent of the name of the aligned structure.
+#   2) A manifest for an input file, keyed by a hash of the input format plus the contents of
+#      the file, listing the reference fasta and, in order, the name, mapped-alignment key,
+#      and scores (see pairwise.py) of each pairwise alignment in the file.
+# A run that finds the manifest for its input file, and all of the alignments it lists, need
+# neither parse the input file nor map its alignments; this is the case when only the width
+# or format of the output has changed. Entries are stored in compact binary (marshal) form.
+# The cache is bounded in size: when it grows beyond its limit, the least recently used
+# entries are removed.
+# Class MemoryAlignmentCache keeps the same entries in memory, for a long-running process (see
+# combAlignServer.py) that builds many mssas; it may be used wherever an AlignmentCache is.
+#
+# Copyright 2014 by Carol L. Ecale Zhou, Lawrence Livermore National Security.  All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational,
+# research, and not-for-profit purposes, without fee and without a signed licensing agreement, is
+# hereby granted, provided that the above copyright notice, this paragraph and the following two
+# paragraphs appear in all copies, modifications, and distributions. Contact Office of XXXX,
+# Lawrence Livermore National Security (LLNS) for commercial licensing opportunities.
+#    In no event shall LLNS be liable to any party for direct, indirect, special, incidental, or
+# consequential damages, including lost profits, arising out of the use of this software and its
+# documentation, even if LLNS has been advised of the possibility of such damage.
+#    LLNL disclaims any warranties, including, but not limited to, the implied warranties of
+# merchantability and fitness for a particular purpose. The software and accompanying documentation
+# if any, provided hereunder is provided "as is", LLNS has no obligation to provide maintenance,
+# support, updates, enhancements, or modifications.
+##################################################################################################
+
+import os, marshal, hashlib, collections
+from array import array
+
+DEFAULT_MAX_BYTES  = 256 * 1024 * 1024
+MAPPED_SUFFIX      = ".map"
+MANIFEST_SUFFIX    = ".manifest"
+READ_CHUNK         = 1024 * 1024
+CACHE_VERSION      = 2       # entries written by a different version are ignored
+
+def AlignmentKey(refSequence,pairwise):  # Returns cache key of a pairwise alignment against refSequence
+    digest = hashlib.sha1()
+    for field in (refSequence.rstrip('*'), pairwise["referenceLine"], pairwise["correspondenceLine"], pairwise["matchLine"]):
+        digest.update(field)
+        digest.update('\0')
+    return digest.hexdigest()
+
+def InputKey(inFile,inFormat):  # Returns cache key of an input file (given by name) read in format inFormat
+    digest = hashlib.sha1()
+    digest.update(inFormat)
+    digest.update('\0')
+    INFILE = open(inFile,"rb")
+    chunk = INFILE.read(READ_CHUNK)
+    while chunk:
+        digest.update(chunk)
+        chunk = INFILE.read(READ_CHUNK)
+    INFILE.close()
+    return digest.hexdigest()
+
+class AlignmentCache(object):
+
+    def __init__(self,directory,maxBytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.maxBytes  = int(maxBytes)
+        self.hits      = 0
+        self.misses    = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.totalBytes = 0
+        for name in os.listdir(directory):
+            if name.endswith(MAPPED_SUFFIX) or name.endswith(MANIFEST_SUFFIX):
+                self.totalBytes += os.path.getsize(os.path.join(directory,name))
+
+    def Read(self,name):  # Returns the unmarshalled entry in file name, or None; marks the entry as recently used
+        path = os.path.join(self.directory,name)
+        try:
+            ENTRY = open(path,"rb")
+            entry = marshal.load(ENTRY)
+            ENTRY.close()
+            os.utime(path,None)
+        except (IOError, OSError, EOFError, ValueError, TypeError):
+            self.misses += 1
+            return None
+        if not isinstance(entry,tuple) or entry[0] != CACHE_VERSION:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def Write(self,name,entry):  # Writes entry to file name, atomically, then enforces the size limit
+        path = os.path.join(self.directory,name)
+        temp = "%s.%s.tmp" % (path,os.getpid())
+        ENTRY = open(temp,"wb")
+        marshal.dump(entry,ENTRY)
+        ENTRY.close()
+        if os.path.exists(path):
+            self.totalBytes -= os.path.getsize(path)
+        os.rename(temp,path)
+        self.totalBytes += os.path.getsize(path)
+        if self.totalBytes > self.maxBytes:
+            self.Evict()
+
+    def Evict(self):  # Removes least recently used entries until the cache is within its size limit
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(MAPPED_SUFFIX) or name.endswith(MANIFEST_SUFFIX):
+                path = os.path.join(self.directory,name)
+                try:
+                    info = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((info.st_mtime,info.st_size,path))
+        entries.sort()
+        self.totalBytes = sum([size for (mtime,size,path) in entries])
+        for (mtime,size,path) in entries:
+            if self.totalBytes <= self.maxBytes:
+                break
+            try:
+                os.remove(path)
+                self.totalBytes -= size
+            except OSError:
+                pass
+
+    def GetMapped(self,key):  # Returns the mapped alignment stored under key, or None
+        entry = self.Read(key + MAPPED_SUFFIX)
+        if entry is None:
+            return None
+        (version, matchRow, correspondenceRow, loopPositions, loopEnds, loopResidues) = entry
+        mapped = {
+            "matchRow"          : matchRow,
+            "correspondenceRow" : correspondenceRow,
+            "loopPositions"     : array('I',loopPositions),
+            "loopEnds"          : array('I',loopEnds),
+            "loopResidues"      : loopResidues,
+            }
+        return mapped
+
+    def PutMapped(self,key,mapped):
+        self.Write(key + MAPPED_SUFFIX, (CACHE_VERSION, mapped["matchRow"], mapped["correspondenceRow"],
+            mapped["loopPositions"].tostring(), mapped["loopEnds"].tostring(), mapped["loopResidues"]))
+
+    def GetManifest(self,key):  # Returns (refSeq, lineCount, [(matchName, alignment key, scores), ...]) for an input, or None
+        entry = self.Read(key + MANIFEST_SUFFIX)
+        if entry is None:
+            return None
+        (version, refSeq, lineCount, names, keys, scores) = entry
+        return (refSeq, lineCount, zip(names,keys,scores))
+
+    def PutManifest(self,key,refSeq,lineCount,alignments):
+        names  = [name for (name,alignmentKey,scores) in alignments]
+        keys   = [alignmentKey for (name,alignmentKey,scores) in alignments]
+        scores = [scores for (name,alignmentKey,scores) in alignments]
+        self.Write(key + MANIFEST_SUFFIX, (CACHE_VERSION, refSeq, lineCount, names, keys, scores))
+
+class MemoryAlignmentCache(object):  # Holds the entries of an AlignmentCache in memory, in order of last use
+
+    def __init__(self,maxBytes=DEFAULT_MAX_BYTES):
+        self.maxBytes   = int(maxBytes)
+        self.hits       = 0
+        self.misses     = 0
+        self.totalBytes = 0
+        self.entries    = collections.OrderedDict()  # name -> (size, entry), least recently used first
+
+    def Read(self,name):  # Returns the entry stored under name, or None; marks the entry as recently used
+        if name not in self.entries:
+            self.misses += 1
+            return None
+        (size, entry) = self.entries.pop(name)
+        self.entries[name] = (size, entry)
+        self.hits += 1
+        return entry
+
+    def Write(self,name,entry,size):  # Stores entry under name, then enforces the size limit
+        if name in self.entries:
+            self.totalBytes -= self.entries.pop(name)[0]
+        self.entries[name] = (size, entry)
+        self.totalBytes += size
+        while self.totalBytes > self.maxBytes and self.entries:
+            self.totalBytes -= self.entries.popitem(last=False)[1][0]
+
+    def GetMapped(self,key):  # Returns the mapped alignment stored under key, or None
+        return self.Read(key + MAPPED_SUFFIX)
+
+    def PutMapped(self,key,mapped):
+        size = len(mapped["matchRow"]) + len(mapped["correspondenceRow"]) + len(mapped["loopResidues"]) + \
+            mapped["loopPositions"].itemsize * (len(mapped["loopPositions"]) + len(mapped["loopEnds"]))
+        self.Write(key + MAPPED_SUFFIX,mapped,size)
+
+    def GetManifest(self,key):  # Returns (refSeq, lineCount, [(matchName, alignment key, scores), ...]) for an input, or None
+        return self.Read(key + MANIFEST_SUFFIX)
+
+    def PutManifest(self,key,refSeq,lineCount,alignments):
+        size = len(refSeq["sequence"]) + sum([len(name) + 40 + 16 * len(scores) for (name,alignmentKey,scores) in alignments])
+        self.Write(key + MANIFEST_SUFFIX,(refSeq,lineCount,list(alignments)),size)
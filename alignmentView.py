@@ -0,0 +1,149 @@
+#################################################################################################
+# Module:  alignmentView.py
+# Version No.: 1.1
+#
+# Description: This module provides a view of a multiple alignment (see alignment.py) whose rows
+# and columns are built on demand, from the column store and the insertion table, without
+# creating all of the alignment's strings.
+# Class: AlignmentView
+#
+# An AlignmentView is returned by method View of an Alignment (or of a WindowedAlignment; see
+# windowedAlignment.py), once the reference and any number of pairwise alignments have been
+# added. The width of the gap opened ahead of each reference position is computed when the view
+# is created (a single pass over the loops of the insertion table); thereafter:
+#   Row(name)            - returns the gapped string of the named aligned structure (or of the
+#                          reference, given its name), or its correspondence string
+#   Column(i)            - returns column i of the multiple alignment (numbered from 0): the
+#                          reference's character, followed by that of each aligned structure
+#   Block(rows,columns)  - returns columns first through last-1 of each of the named rows
+# Only the reference positions spanned by the columns requested are read, so that looking at a
+# few rows or columns of a large panel costs little more than those rows or columns. The strings
+# returned are exactly the corresponding parts of the strings created by method
+# CreateAlignmentStrings. A row may also be named by its alignment's index (from 0), which
+# distinguishes aligned structures of the same name (the reference is row REFERENCE); a name
+# otherwise refers to the first aligned structure of that name. Alignments added after the
+# view is created are not in the view; create a new view to see them.
+#
+# Copyright 2014 by Carol L. Ecale Zhou, Lawrence Livermore National Security.  All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational,
+# research, and not-for-profit purposes, without fee and without a signed licensing agreement, is
+# hereby granted, provided that the above copyright notice, this paragraph and the following two
+# paragraphs appear in all copies, modifications, and distributions. Contact Office of XXXX,
+# Lawrence Livermore National Security (LLNS) for commercial licensing opportunities.
+#    In no event shall LLNS be liable to any party for direct, indirect, special, incidental, or
+# consequential damages, including lost profits, arising out of the use of this software and its
+# documentation, even if LLNS has been advised of the possibility of such damage.
+#    LLNL disclaims any warranties, including, but not limited to, the implied warranties of
+# merchantability and fitness for a particular purpose. The software and accompanying documentation
+# if any, provided hereunder is provided "as is", LLNS has no obligation to provide maintenance,
+# support, updates, enhancements, or modifications.
+##################################################################################################
+
+import bisect
+
+MATCH          = "match"      # keys of a stringPair
+CORRESPONDENCE = "correspondence"
+REFERENCE      = -1           # row number of the reference
+
+class AlignmentView(object):  # Rows and columns of a multiple alignment, built on demand
+
+    def __init__(self,myAlignment):
+        self.alignment      = myAlignment
+        self.alignmentCount = myAlignment.alignmentCount  # alignments in the view
+        self.loopWidths     = myAlignment.ComputeLoopWidths()
+        self.columnIndex    = myAlignment.ComputeColumnIndex(self.loopWidths)  # gapped column of each reference position
+        self.gappedLength = 0
+        if self.alignmentCount > 0 and self.columnIndex:  # as method CreateAlignmentStrings, no strings without alignments
+            self.gappedLength = self.columnIndex[-1] + 1
+        self.rowNumbers = {}  # name -> index of the first alignment of that name
+        for j in xrange(self.alignmentCount-1,-1,-1):
+            self.rowNumbers[myAlignment.matchNameList[j]] = j
+
+    def Names(self):  # Returns the name of the reference, followed by those of the aligned structures
+        return [self.alignment.reference] + self.alignment.matchNameList[:self.alignmentCount]
+
+    def Length(self):  # Returns the number of columns of the multiple alignment
+        return self.gappedLength
+
+    def RowNumber(self,name):  # Returns the index of the alignment named (or REFERENCE); raises KeyError if there is none
+        if isinstance(name,(int,long)):
+            if 0 <= name < self.alignmentCount or name == REFERENCE:
+                return name
+            raise KeyError(name)
+        if name in self.rowNumbers:
+            return self.rowNumbers[name]
+        if name == self.alignment.reference:
+            return REFERENCE
+        raise KeyError(name)
+
+    def Span(self,start,end):  # Returns (first, last+1) reference positions whose columns include columns start through end-1
+        return (bisect.bisect_left(self.columnIndex,start), bisect.bisect_left(self.columnIndex,end-1) + 1)
+
+    def Segment(self,name,key,start,end):
+        # Method Segment() returns columns start through end-1 of the match or correspondence
+        # string of the named row; the reference has no correspondence string. Only the
+        # reference positions spanned by the columns are read.
+        j = self.RowNumber(name)
+        end = min(end,self.gappedLength)
+        if start >= end:
+            return ""
+        (first, last) = self.Span(start,end)
+        col = self.columnIndex[first] - self.loopWidths[first]  # first column of the positions read
+        loopPositions = [i for i in xrange(first,last) if self.loopWidths[i]]
+        myAlignment = self.alignment
+        if j == REFERENCE:
+            if key != MATCH:
+                raise KeyError(key)
+            (row, loops, fill) = (myAlignment.refSequence[first:last], {}, '-')
+        else:
+            (matchRow, correspondenceRow, loops) = myAlignment.ReadRecord(myAlignment.rowIndex[j],first,last)
+            if key == MATCH:
+                (row, fill) = (matchRow, '-')
+            elif key == CORRESPONDENCE:
+                (row, loops, fill) = (correspondenceRow, {}, ' ')
+            else:
+                raise KeyError(key)
+        string = myAlignment.BuildWindowRow(row,loops,first,loopPositions,self.loopWidths,self.columnIndex[last-1]+1-col,fill)
+        return string[start-col:end-col]
+
+    def Row(self,name,key=MATCH):  # Returns the whole match (or correspondence) string of the named row
+        return self.Segment(name,key,0,self.gappedLength)
+
+    def Column(self,i):
+        # Method Column() returns column i (from 0) of the multiple alignment, as a string of the
+        # reference's character followed by that of each aligned structure, in the order added.
+        if not 0 <= i < self.gappedLength:
+            raise IndexError(i)
+        myAlignment = self.alignment
+        position = bisect.bisect_left(self.columnIndex,i)
+        offset = i - (self.columnIndex[position] - self.loopWidths[position])  # column within the position's columns
+        insertion = offset < self.loopWidths[position]
+        rowChars = {}  # character of each row of the column store
+        for r in set(myAlignment.rowIndex[:self.alignmentCount]):
+            (matchRow, correspondenceRow, loops) = myAlignment.ReadRecord(r,position,position+1)
+            if not insertion:
+                rowChars[r] = matchRow
+            elif offset < len(loops.get(position,"")):
+                rowChars[r] = loops[position][offset]
+            else:
+                rowChars[r] = '-'
+        if insertion:
+            chars = ['-']
+        else:
+            chars = [myAlignment.refSequence[position]]
+        for j in xrange(0,self.alignmentCount):
+            chars.append(rowChars[myAlignment.rowIndex[j]])
+        return ''.join(chars)
+
+    def Block(self,rows=None,columns=None,key=MATCH):
+        # Method Block() returns a list of columns first through last-1, given columns as
+        # (first, last), of the match (or correspondence) string of each of the named rows. By
+        # default, all columns are returned, of the reference followed by every aligned
+        # structure (or, for correspondence strings, of every aligned structure).
+        if rows is None:
+            rows = range(0,self.alignmentCount)
+            if key == MATCH:
+                rows = [REFERENCE] + rows
+        if columns is None:
+            columns = (0, self.gappedLength)
+        return [self.Segment(name,key,columns[0],columns[1]) for name in rows]
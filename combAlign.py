@@ -37,7 +37,13 @@
 # input file format should be parsed into the 'pairwise' data structure. If this is done
 # properly, then all subsequent calls to class alignment.py will function in exactly
 # the same way. To add additional formats, one need only add code under the 'ALIGN'
-# block (see line 332, beginning 'if ALIGN'). 
+# block of method ParseLines in module pairwise.py (beginning 'if ALIGN').
+# Alternatively, a directory of unmodified TM-align or Dali Lite output files may be read
+# directly (see module rawInput.py), without assembling a combAlign input file.
+# combAlign.py may also be imported as a module, without side effects: function BuildMSSA
+# builds an mssa in-process and writes files only if asked to; the command line interface
+# (function main) is a thin wrapper around it. With a memory budget (memory=), the mssa is
+# built out of core (see windowedAlignment.py), for panels too large to hold in memory.
 #
 # Copyright 2014 by Carol L. Ecale Zhou, Lawrence Livermore National Security. All Rights
 # Reserved. Permission to use, copy, modify, and distribute this software and its 
@@ -57,22 +63,22 @@
 #############################################################################################
 
 import sys
-import string
-import re, os
+import os
+import re
 import alignment              # alignment.py module by C. Zhou
-
-p_number = re.compile('\d+')  # search pattern for number string
+import pairwise               # pairwise.py module; reads input file
+import runStats               # runStats.py module; times stages of a run
+import renderers              # renderers.py module; writes the mssa in each output format
+import compressedFiles        # compressedFiles.py module; reads and writes gzip, bzip2, and xz files
 
 # FILES
 
-inFile   = ""  # user provided
-outFile  = "./combAlign.out"
-logFile  = "./combAlign.log"
+logFile  = "./combAlign.log"   # default log and mssa files written by the command line interface
 mssaFile = "./combAlign.mssa"
 
 # HELP STRINGS and CONSTANTS
 
-HELP_STRING = """Description:  CombAlign parses a set of pairwise structure-based sequence alignments produced by TM-align (see http://zhanglab.ccmb.med.umich.edu/TM-align/), or by DaliLite (see http://www.ebi.ad.uk/Tools/structure/dalilite), and produces a gapped, one-to-many, structure-based sequence alignment (MSSA). Although any alignment program may be used to produce the input pairwise alignments, including sequence- or structure-based tools, the format of the input to combAlign.py should correspond to that produce by TM-align or DaliLite. A reference sequence, corresponding to the sequence or structure that has been compared to multiple others, is used to construct the one-to-many alignment as output. Gaps may be introduced into the reference sequence, as needed, to reflect deletions in the reference with respect to any other sequdnce/structure or residues in the reference that were not aligned with any other sequence/structure according to the criteria aplied in the pairwise alignments. The resulting MSSA may be output in the CombAlign format or in alignedFASTA format.
+HELP_STRING = """Description:  CombAlign parses a set of pairwise structure-based sequence alignments produced by TM-align (see http://zhanglab.ccmb.med.umich.edu/TM-align/), or by DaliLite (see http://www.ebi.ad.uk/Tools/structure/dalilite), and produces a gapped, one-to-many, structure-based sequence alignment (MSSA). Although any alignment program may be used to produce the input pairwise alignments, including sequence- or structure-based tools, the format of the input to combAlign.py should correspond to that produce by TM-align or DaliLite. A reference sequence, corresponding to the sequence or structure that has been compared to multiple others, is used to construct the one-to-many alignment as output. Gaps may be introduced into the reference sequence, as needed, to reflect deletions in the reference with respect to any other sequdnce/structure or residues in the reference that were not aligned with any other sequence/structure according to the criteria aplied in the pairwise alignments. The resulting MSSA may be output in the CombAlign format, or in alignedFASTA, Clustal, Stockholm, or A2M format, or in several of these at once.
 
 Type: python combAlign.py input       -for additional information about the required input format
 Type: python combAlign.py usage       -for command-line examples for running CombAlign
@@ -80,7 +86,7 @@ Type: python combAlign.py in_formats  -for a listing of the acceptable pairwise
 Type: python combAlign.py out_formats -for a listing of the acceptable output formats
 """ 
 
-INPUT_STRING = """Input requirements:  CombAlign takes as input a single text file containing alignment data. Use 'python combAlign.py' followed by command-line parameters that specify the input file name, input format, output format, and desired line width for output. The input file comprises a single protein sequence in fasta format representing the reference sequence or structure, followed by a set of pairwise alignments. Each pairwise alignment is a comparison of the reference to another protein (in that order). The input file is structured in the following way, regardless of the program used to generated the pairwise alignments:  The fasta reference sequence is preceded by 'REFERENCE' on a single line of text. The word 'REFERENCE' may be followed by a single space and the name of the reference protein. Following the reference fasta is a set of pairwise alignments, each preceded by 'ALIGNMENT' followed by a space and the name of the aligned protein, on a single line of text. The word 'END' on a single line of text signifies the end of the data. A well-formatted input file generated by TM-align will look something like this:
+INPUT_STRING = """Input requirements:  CombAlign takes as input a single text file containing alignment data. Use 'python combAlign.py' followed by command-line parameters that specify the input file name, input format, output format, and desired line width for output. The input file comprises a single protein sequence in fasta format representing the reference sequence or structure, followed by a set of pairwise alignments. Each pairwise alignment is a comparison of the reference to another protein (in that order). The input file is structured in the following way, regardless of the program used to generated the pairwise alignments:  The fasta reference sequence is preceded by 'REFERENCE' on a single line of text. The word 'REFERENCE' may be followed by a single space and the name of the reference protein. Following the reference fasta is a set of pairwise alignments, each preceded by 'ALIGNMENT' followed by a space and the name of the aligned protein, on a single line of text. The 'ALIGNMENT' line may end with the scores of the alignment, as name=value fields (TM-score, TM-score_match, RMSD, aligned_length, Z-score, identity), e.g. 'ALIGNMENT Sudan TM-score=0.61 RMSD=2.3'; the scores are reported with the aligned structure's name in the output, and may be used to filter the alignments (e.g., min_tm=0.5). The word 'END' on a single line of text signifies the end of the data. A well-formatted input file generated by TM-align will look something like this:
 
 REFRENCE Reston_Ebolavirus_delta_peptide 
 >Reston_GPdelta
@@ -108,6 +114,46 @@ python combAlign.py file=my_align_file1 in_format=DaliLite out_format=standard l
 This command will generate an mssa in the alignedFASTA format with gapped sequences each in a continuous string 
 python combAlign.py file=my_align_file2 in_format=TM-align out_format=aligned_fasta length=0
 
+This command will write the mssa in the CombAlign, Clustal, and Stockholm formats, from a single build, to my_mssa.mssa, my_mssa.aln, and my_mssa.sto:
+python combAlign.py file=my_align_file1 in_format=DaliLite out_format=combAlign,clustal,stockholm mssa=my_mssa.mssa
+
+This command will read a gzip-compressed input file, and write the mssa compressed with xz, to my_mssa.mssa.xz (input may be compressed with gzip, bzip2, or xz; the output is compressed if the mssa file name ends in .gz, .bz2, or .xz):
+python combAlign.py file=my_align_file1.gz in_format=TM-align mssa=my_mssa.mssa compress=xz
+
+This command will also save the build state, so that alignments may be added later without a full rebuild:
+python combAlign.py file=my_align_file2 in_format=TM-align state=my_state
+
+This command will reuse alignments parsed in earlier runs, kept in directory my_cache (limited to 500 megabytes):
+python combAlign.py file=my_align_file1 in_format=DaliLite width=100 cache=my_cache cache_size=500
+
+This command will read unmodified TM-align output files (one run per file) in directory my_tmalign_runs, taking as reference the structure named 1abc, whose sequence is in my_ref.fasta:
+python combAlign.py dir=my_tmalign_runs in_format=TM-align reference=1abc ref_fasta=my_ref.fasta
+The output files are parsed in one worker process per cpu; parse_workers=N sets the number of processes (1 to parse them serially).
+
+This command will add a line giving the consensus (most frequent) residue of each column of the mssa:
+python combAlign.py file=my_align_file1 in_format=DaliLite consensus=yes
+
+This command will hold the mssa in a compact form while it is built, to reduce the memory needed for many alignments:
+python combAlign.py file=my_align_file1 in_format=TM-align compact=yes
+
+This command will build the mssa out of core, holding no more than about 500 megabytes of it in memory at a time, for panels of tens of thousands of structures; the rest is kept in temporary files in directory my_scratch:
+python combAlign.py file=my_align_file1 in_format=TM-align memory=500 spill_dir=my_scratch
+
+This command will skip pairwise alignments whose TM-score is below 0.5 or whose Z-score is below 8, before they are added; the scores are read from the ALIGNMENT lines (type 'python combAlign.py input'), or from unmodified TM-align or Dali Lite output files. Thresholds min_tm, min_z, min_identity, min_aligned, and max_rmsd are accepted:
+python combAlign.py file=my_align_file1 in_format=TM-align min_tm=0.5 min_z=8
+
+This command will print only the columns of the mssa that span reference residues 300 through 500:
+python combAlign.py file=my_align_file1 in_format=DaliLite region=300-500
+
+This command will map the pairwise alignments onto the reference in 8 worker processes (0 for one per cpu):
+python combAlign.py file=my_align_file1 in_format=TM-align workers=8
+
+This command will also write timings and counts for each stage of the run as a JSON record, and profile the run:
+python combAlign.py file=my_align_file1 in_format=TM-align stats=my_stats.json profile=my_profile
+
+This command will add the alignments in my_new_aligns (same reference) to the saved build state, and save the result:
+python combAlign.py file=my_new_aligns in_format=TM-align update=my_state state=my_state
+
 The input data files must be formatted according to the specified 'format' parameter.
 """
 
@@ -118,300 +164,603 @@ TM_ALIGN            = "TM-align"
 DALI_LITE           = "DaliLite"
 COMB_ALIGN          = "combAlign"
 ALIGNED_FASTA       = "aligned_fasta"
+CLUSTAL             = "clustal"
+STOCKHOLM           = "stockholm"
+A2M                 = "a2m"
 DEFAULT_FORMAT      = TM_ALIGN 
 DEFAULT_OUTPUT_FORMAT = COMB_ALIGN 
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024  # size limit of cache of mapped alignments
+DEFAULT_PARSE_WORKERS = 0    # worker processes parsing a directory of raw output files (0: one per cpu)
 CHATTY              = True  # When True, informative statements will be printed
 #CHATTY              = False  # When True, informative statements will be printed
-DL_START            = 6     # column number at which Dali Lite alignment data begins
-DL_END              = 66    # col num at which DL alignments end, except final fragment
-REFERENCE_LINE      = True  # Bool; controls capture of data line for TM-align format
-CORRESPONDENCE_LINE = False #  "
-MATCH_LINE          = False #  "
-
-# DATA STRUCTURES
-refSeq = {            # Data pertaining to the sequence of the reference structure
-    "reference" : "",
-    "header"    : "",
-    "sequence"  : "",
-    }
-reference = ""  # Name of the reference structure in the TMalign alignments
-                # reference is the header of the fasta provided at top of input alignments file 
-
-# VARIABLES
-width  = DEFAULT_WIDTH   # width of output alignment segments
-format = DEFAULT_FORMAT  # program used to perform pairwise alignments, begin w/default 
-outFormat = DEFAULT_OUTPUT_FORMAT
+
 ACCEPTABLE_INPUT_FORMATS = (TM_ALIGN, DALI_LITE)
-ACCEPTABLE_OUTPUT_FORMATS  = (DEFAULT_OUTPUT_FORMAT, ALIGNED_FASTA)
+ACCEPTABLE_OUTPUT_FORMATS  = (DEFAULT_OUTPUT_FORMAT, ALIGNED_FASTA, CLUSTAL, STOCKHOLM, A2M)
 
 # PATTERNS
-p_dataFragment = re.compile('[\w\.\-]*')
-p_refName      = re.compile('^REFERENCE\s+(\w+)')
-
-# Get input parameter(s) 
-# User needs to provide 1) name of file containing reference fasta sequence and 
-# list of pairwise alignments, 2) the format of (ie, program used to generate) the 
-# alignment, 3) (Optional) desired line length for output.
-
-argCount = len(sys.argv)
-if (argCount < REQUIRED_PARAMS):
-    print "Insufficient parameters. Type: \'python combAlign.py help\'" 
-    exit(0)
-
-for i in range(1,argCount):
-    match = re.search("^help$", sys.argv[i].lower())
-    if match:
-        print HELP_STRING
-        print USAGE_STRING
-        exit(0)
-    match = re.search('^input$', sys.argv[i].lower())
-    if match:
-        print INPUT_STRING
-        exit(0)
-    match = re.search('^usage$', sys.argv[i].lower())
-    if match:
-        print USAGE_STRING
-        exit(0)
-    match = re.search('^in_formats$', sys.argv[i].lower())
-    if match:
-        print "Acceptable input formats are", ACCEPTABLE_INPUT_FORMATS
-        exit(0)
-    match = re.search('^out_formats', sys.argv[i].lower())
-    if match:
-        print "Acceptable output formats are", ACCEPTABLE_OUTPUT_FORMATS
-        exit(0)
-    match = re.search('=', sys.argv[i])
-    if match:
-        (parameter,value) = sys.argv[i].split('=')
-        if (parameter.lower() == 'in_format' or parameter.lower() == 'input'):
-            format = value
-            if format not in ACCEPTABLE_INPUT_FORMATS:
-                print "Please use an acceptable format:", ACCEPTABLE_INPUT_FORMATS
-                exit(0)
-        if (parameter.lower() == 'file'): 
-            inFile = value
-        if (parameter.lower() == 'width' or parameter.lower() == 'length'):
-            width = value
-            match = re.search('[^\d]', width)
-            if match:
-                print "Choose a more realistic line width."
-                print USAGE_STRING
-                exit(0)
-            if (int(width) < 0 or int(width) > 255):
-                print "Choose a more realistic line width."
-                print USAGE_STRING
-                exit(0)
-        if (parameter.lower() == 'out_format' or parameter.lower() == 'output'):
-            outFormat = value
-            if outFormat not in ACCEPTABLE_OUTPUT_FORMATS:
-                print "Please request an acceptable output format:", ACCEPTABLE_OUTPUT_FORMATS
-                exit(0)
-
-# Reflect parameters
-if CHATTY:
-    print "Your input file name is", inFile 
-    print "Your input format is", format 
-    print "Your output format is", outFormat
-    print "Your desired line width is", width 
-
-INFILE  = open(inFile,"r")
-#OUTFILE = open(outFile,"w")
-LOGFILE = open(logFile,"w")
-LOGFILE.write("%s%s\n" % ("Name of input file: ", inFile))
-LOGFILE.write("%s%s\n" % ("Output mssa is in file: ", mssaFile))
-LOGFILE.write("%s%s\n" % ("Input format is: ", format))
-LOGFILE.write("%s%s\n" % ("Output format is: ", outFormat))
-LOGFILE.write("%s%s\n" % ("Line width is ", width))
-MSSAFILE = open(mssaFile,"w")
-
-# Set up data structure for holding alignments
-pairwise = {   # dict holding next pairwise alignment 
-    "matchName"          : "",  # name of sequence aligned to reference
-    "referenceLine"      : "",  # reference sequence (complete) with possible gaps as '-'
-    "correspondenceLine" : "",  # string of characters: blank, '.', or ':'
-    "matchLine"          : "",  # match sequence (maybe incomplete) with possible gaps as '-'
-    }
-failure = 0  # will be test result from method call
-
-# Create an Alignment object
-myAlignment = alignment.Alignment(format)
-
-if CHATTY:
-    print "Acquiring R-R correspondences from input file..."
-
-# Switches that control handling of input file data lines
-FASTA = False
-ALIGN = False
-
-fLines = INFILE.read().splitlines()
-lineCount = len(fLines)
-
-for i in xrange(0,lineCount):
-    nextLine = fLines[i]  # Get next data line
-    if (nextLine == '' or nextLine == '\^#'):  # comment line starts with '#' 
-        continue  # skip blank and comment lines
-
-    # Check if end of data input is reached
-    match = re.search('^END', nextLine)
-    if match:  
-        if ALIGN:   # (should be true) save away current alignment data
-            failure = myAlignment.AddAlignment(pairwise)
-            if CHATTY:
-                if failure == 0:
-                    print "Pairwise alignment", pairwise["matchName"], "successfully added."
-                else:
-                    print "Method AddAlignment failure code", failure, "at", pairwise["matchName"]
-            # Reset
-            pairwise["referenceLine"] = ''
-            pairwise["correspondenceLine"] = ''
-            pairwise["matchLine"] = ''
-        else:
-            if CHATTY:
-                print "WARNING:  Problem with input data file at line", i 
-            LOGFILE.write("\n%s%s\n" % ("Problem with input data file at line", i))
-        break  # jump out of loop, although this should be last iteration anyway
-
-    # Check if alignment is next
-    match = re.search('^ALIGNMENT', nextLine)
-    if match:
-
-        # If ALIGN flag is 'on', then last data item was the previous alignment
-        if ALIGN:  # First, wrap up previous alignment
-            failure = myAlignment.AddAlignment(pairwise)
-            if CHATTY:
-                if failure == 0:
-                    print "Pairwise alignment", pairwise["matchName"], "successfully added."
-                else:
-                    print "Method AddAlignment failure code", failure, "at", pairwise["matchName"]
-            # Reset
-            pairwise["referenceLine"] = ''
-            pairwise["correspondenceLine"] = ''
-            pairwise["matchLine"] = ''
-
-            # Capture name of the next aligned sequence/structure from tag 
-            (preamble, pairwise["matchName"]) = nextLine.split(' ')
-
-        # If FASTA flag still 'on', then last data item was the reference fasta
-        elif FASTA:  # Register the reference fasta before processing alignment 
-            myAlignment.EnterReference(refSeq)
-            if CHATTY:
-                print "Your reference fasta sequence is:"
-                print refSeq["header"]
-                print refSeq["sequence"] 
-            FASTA = False  # done!, and there should be only one fasta in input data file
-
-            # Next order of business, capture the name of the aligned sequence/structure
-            ALIGN = True
-            (preamble, pairwise["matchName"]) = nextLine.split(' ')
-        else:
-            if CHATTY:
-                print "WARNING: Problem with input file at line", i 
-            LOGFILE.write("\n%s%s\n" % ("WARNING:  Problem with input file at line", i))
-
-        continue
-
-    # Check if fasta header is next
-    match = re.search('^REFERENCE', nextLine) # Check for reference fasta 
-    if match:  # Reference fasta is next
-        FASTA = True
-        ALIGN = False
-        match = re.search('^REFERENCE\s+(\w+)', nextLine)
-        if match:
-            refSeq["reference"] = match.group(1)
+p_help       = re.compile('^help$')
+p_input      = re.compile('^input$')
+p_usage      = re.compile('^usage$')
+p_inFormats  = re.compile('^in_formats$')
+p_outFormats = re.compile('^out_formats')
+p_nonDigit   = re.compile('[^\d]')
+
+class MSSAResult(object):  # A built multiple structure-based sequence alignment, ready to be written
+
+    def __init__(self,myAlignment,refSeq,inFormat,outFormat,width,lineCount):
+        self.alignment = myAlignment  # Alignment object, with alignment strings created
+        self.refSeq    = refSeq       # reference fasta, as read from the input
+        self.inFormat  = inFormat
+        self.outFormat = outFormat
+        self.width     = width        # width of output alignment segments
+        self.lineCount = lineCount    # number of input lines read
+        self.failures  = []           # (matchName, failure code) for each alignment not added
+        self.filtered  = []           # (matchName, reason) for each alignment whose scores failed the thresholds
+        self.stats     = None         # runStats.RunStats for the build
+
+    def Write(self,OUTFILE,outFormat=None):  # Prints the mssa to an open file, in outFormat or else the first format requested
+        self.WriteAll([(outFormat or OutputFormats(self.outFormat)[0], OUTFILE)])
+
+    def WriteAll(self,outputs):  # Prints the mssa in each (format, open file) of outputs, in a single pass
+        renderers.RenderAll(self.alignment,outputs,self.width)
+
+    def Render(self):  # Returns the mssa as a string
+        import cStringIO
+        OUTFILE = cStringIO.StringIO()
+        self.Write(OUTFILE)
+        return OUTFILE.getvalue()
+
+def OutputFormats(outFormat):  # Returns the list of output formats requested, given one or more, separated by commas
+    return [format for format in outFormat.split(',') if format]
+
+def CheckOutputFormats(outFormat):  # Returns True if each output format requested is acceptable
+    formats = OutputFormats(outFormat)
+    if not formats:
+        return False
+    for format in formats:
+        if format not in ACCEPTABLE_OUTPUT_FORMATS:
+            return False
+    return True
+
+def ParseRegion(value):  # Returns (first, last) reference residues given as 'first-last', or None if malformed
+    bounds = value.split('-')
+    if len(bounds) != 2 or p_nonDigit.search(bounds[0]) or p_nonDigit.search(bounds[1]) or not bounds[0] or not bounds[1]:
+        return None
+    return (int(bounds[0]), int(bounds[1]))
+
+def RegisterReference(myAlignment,refSeq,baseState,chatty):
+    # Enters the reference fasta into a new alignment, or checks that it matches the reference
+    # of an alignment restored from a saved state
+    if not baseState:
+        myAlignment.EnterReference(refSeq)
+    elif refSeq["sequence"].rstrip('*') != myAlignment.refSequence.rstrip('*'):
+        raise ValueError("Reference sequence does not match that of the saved state")
+    if chatty:
+        print "Your reference fasta sequence is:"
+        print refSeq["header"]
+        print refSeq["sequence"] 
+
+def ReportAlignment(matchName,failure,failures,chatty):  # Records the outcome of adding a pairwise alignment
+    if failure != 0:
+        failures.append((matchName,failure))
+    if chatty:
+        if failure == 0:
+            print "Pairwise alignment", matchName, "successfully added."
         else:
-            refSeq["reference"] = '' 
-        continue
-    
-    if FASTA:  # Capture fasta data
-
-        # Check if it's a header line
-        match = re.search('^\>', nextLine)
-        if match:
-            refSeq["header"] = nextLine
-            if (refSeq["reference"] == ''):  # use header as reference name if user did not provide
-                refSeq["reference"] = refSeq["header"].lstrip('>')
-            continue
- 
-        # Check if it's a sequence line  
-        match = re.search('[\w\*]', nextLine)  # should be letters or '*'
-        if match:
-            refSeq["sequence"] = refSeq["sequence"] + nextLine
+            print "Method AddAlignment failure code", failure, "at", matchName
+
+def FilterAlignments(alignments,thresholds,filtered,chatty):
+    # Function FilterAlignments() yields each pairwise alignment of iterable alignments whose
+    # scores pass thresholds (see pairwise.FailedThreshold), and appends (matchName, reason)
+    # of each of the others to list filtered.
+    for nextPairwise in alignments:
+        reason = None
+        if isinstance(nextPairwise,dict):
+            reason = pairwise.FailedThreshold(nextPairwise.get("scores",{}),thresholds)
+        if reason:
+            filtered.append((nextPairwise["matchName"],reason))
+            if chatty:
+                print "Pairwise alignment", nextPairwise["matchName"], "filtered out:", reason
             continue
+        yield nextPairwise
 
-    if ALIGN:  # Capture alignment data. Additional formats could be accommodated here.
-
-        if (format == TM_ALIGN):
-            if REFERENCE_LINE:
-                pairwise["referenceLine"] = nextLine
-                REFERENCE_LINE = False
-                CORRESPONDENCE_LINE = True
-            elif CORRESPONDENCE_LINE:
-                pairwise["correspondenceLine"] = nextLine
-                CORRESPONDENCE_LINE = False
-                MATCH_LINE = True
-            elif MATCH_LINE:
-                pairwise["matchLine"] = nextLine
-                MATCH_LINE = False
-                REFERENCE_LINE = True
+def QueueScores(alignments,scoreQueue):  # Yields each pairwise alignment of iterable alignments, appending its scores to scoreQueue
+    for nextPairwise in alignments:
+        if isinstance(nextPairwise,dict):
+            scoreQueue.append(nextPairwise.get("scores"))
+        else:
+            scoreQueue.append(None)
+        yield nextPairwise
+
+def AddAlignments(myAlignment,alignments,chatty,cache=None,stats=None,workers=1,thresholds=None,filtered=None):
+    # Function AddAlignments() adds each pairwise alignment of iterable alignments to
+    # myAlignment. If a cache is given, mapped alignments are taken from it when present, and
+    # added to it otherwise. Otherwise, unless workers is 1, alignments are mapped onto the
+    # reference in that many worker processes (0: one per cpu), and added in input order.
+    # If thresholds are given, alignments whose scores fail them are skipped before they are
+    # mapped, and listed, with the reason, in filtered (see function FilterAlignments).
+    # Time spent mapping and adding is accumulated in stats; when mapping in worker processes,
+    # the time to map includes the time to produce the alignments. Returns (failures, names),
+    # where names lists (matchName, cache key, scores) of each alignment, if a cache is given.
+    if cache:
+        import alignmentCache
+    if stats is None:
+        stats = runStats.RunStats()
+    failures = []
+    names    = []
+    if thresholds:
+        alignments = FilterAlignments(alignments,thresholds,filtered,chatty)
+    if workers != 1 and not cache:
+        import collections
+        scoreQueue = collections.deque()  # scores of the alignments sent to be mapped, in input order
+        mappedAlignments = alignment.MapAlignmentsParallel(myAlignment.refLength,QueueScores(alignments,scoreQueue),workers)
+        for (matchName, failure, mapped) in stats.Timed(runStats.STAGE_MAP,mappedAlignments):
+            scores = scoreQueue.popleft()
+            if failure == 0:
+                stats.Start(runStats.STAGE_ADD)
+                failure = myAlignment.AddMappedAlignment(matchName,mapped)
+                if failure == 0 and scores:
+                    myAlignment.SetScores(myAlignment.alignmentCount-1,scores)
+                stats.Stop(runStats.STAGE_ADD)
+            ReportAlignment(matchName,failure,failures,chatty)
+        return (failures, names)
+    for nextPairwise in alignments:
+        stats.Start(runStats.STAGE_ADD)
+        if cache:
+            key = alignmentCache.AlignmentKey(myAlignment.refSequence,nextPairwise)
+            mapped = cache.GetMapped(key)
+            if mapped:
+                failure = 0
             else:
-                LOGFILE.write("%s%s\n" % ("Problem at line", i)) 
-            continue
-
-        if (format == DALI_LITE):
-            match = re.match('^DSSP', nextLine)
-            if match:  # Calculate begin/end column numbers for extracting data fragment
-                dataSet = re.findall(p_dataFragment, nextLine) # dataSet[2] contains DSSP result string
-                DL_END = len(dataSet[3]) + 6 # calculate column number at which data fragment ends
-            match = re.match('^Query', nextLine)
-            if match:
-                pairwise["referenceLine"] += nextLine[DL_START:DL_END]  # fragment of nextLine containing sequence
-            match = re.search('^ident', nextLine)
-            if match:
-                pairwise["correspondenceLine"] += nextLine[DL_START:DL_END] 
-            match = re.search('^Sbjct', nextLine)
-            if match:
-                pairwise["matchLine"] += nextLine[DL_START:DL_END] 
-            continue
-
-    if FASTA:  # Capture fasta data
-        match = re.search('^\>', nextLine)
-        if match:
-            refSeq["header"] = nextLine
-            if (refSeq["reference"] == ''):  # use header as reference name if user did not provide
-                refSeq["reference"] = refSeq["header"].lstrip('>')
-            continue
-
-        match = re.search('[\w\*]', nextLine)  # should be letters or '*'
-        if match:
-            refSeq["sequence"] += nextLine
-            continue
-
-LOGFILE.write("%s%s\n" % ("Infile is ", inFile))
-LOGFILE.write("%s%s\n" % ("The format is ", format))
-LOGFILE.write("%s%s\n" % ("Infile lineCount is: ", lineCount))
-LOGFILE.write("%s%s\n" % ("Reference fasta is: ", refSeq["reference"]))
-LOGFILE.write("%s\n%s\n" % (refSeq["header"], refSeq["sequence"]))
-LOGFILE.write("\n%s\n" % ("Calculating combined alignment."))
-
-# Print multiple structure-based sequence alignment
-if CHATTY:
-    print "Setting output format..."
-LOGFILE.write("%s\n" % ("Setting output format."))
-myAlignment.SetOutputFormat(outFormat)
-if CHATTY:
-    print "Creating alignment strings..."
-LOGFILE.write("%s\n" % ("Creating alignment strings."))
-myAlignment.CreateAlignmentStrings()
-if CHATTY:
-    print "Printing display strings to the output mssa file..."
-LOGFILE.write("%s\n" % ("Printing display strings to output mssa file."))
-myAlignment.PrintDisplayStrings2file(MSSAFILE,width)
-
-if CHATTY:
-    print "Look for your output in file", mssaFile
-    print "Done!"
-LOGFILE.write("%s\n" % ("Done!"))
-
-# Clean up
-INFILE.close()
-LOGFILE.close()
+                (failure, mapped) = alignment.MapAlignment(myAlignment.refLength,nextPairwise)
+                if failure == 0:
+                    cache.PutMapped(key,mapped)
+            scores = nextPairwise.get("scores",{})
+            if failure == 0:
+                failure = myAlignment.AddMappedAlignment(nextPairwise["matchName"],mapped)
+                if failure == 0 and scores:
+                    myAlignment.SetScores(myAlignment.alignmentCount-1,scores)
+            names.append((nextPairwise["matchName"],key,scores))
+        else:
+            failure = myAlignment.AddAlignment(nextPairwise)
+        stats.Stop(runStats.STAGE_ADD)
+        ReportAlignment(nextPairwise["matchName"],failure,failures,chatty)
+    return (failures, names)
+
+def ReadAlignments(myAlignment,INFILE,inFormat,LOGFILE,chatty,baseState,cache=None,inputKey=None,stats=None,workers=1,thresholds=None,filtered=None):
+    # Function ReadAlignments() reads the input file one pairwise alignment at a time, and
+    # adds each to myAlignment (see function AddAlignments). A manifest of the input file is
+    # stored in the cache under inputKey, if given, unless some alignments were filtered out.
+    # Time spent reading is accumulated in stats.
+    # Returns (refSeq, lineCount, failures).
+    if stats is None:
+        stats = runStats.RunStats()
+    failures = []
+    reader = pairwise.PairwiseReader(INFILE,inFormat,LOGFILE,chatty)
+    stats.Start(runStats.STAGE_PARSE)
+    refSeq = reader.ReadReference()
+    stats.Stop(runStats.STAGE_PARSE)
+    if refSeq:  # Register the reference fasta before processing alignments
+        RegisterReference(myAlignment,reader.refSeq,baseState,chatty)
+        alignments = stats.Timed(runStats.STAGE_PARSE,reader.Alignments())
+        (failures, names) = AddAlignments(myAlignment,alignments,chatty,cache,stats,workers,thresholds,filtered)
+        if inputKey and not failures and not filtered:
+            cache.PutManifest(inputKey,reader.refSeq,reader.lineCount,names)
+    return (reader.refSeq, reader.lineCount, failures)
+
+def ReadRawAlignments(myAlignment,directory,inFormat,LOGFILE,chatty,baseState,refFasta=None,referenceName=None,cache=None,stats=None,workers=1,thresholds=None,filtered=None,parseWorkers=DEFAULT_PARSE_WORKERS):
+    # Function ReadRawAlignments() reads the unmodified TM-align or Dali Lite output files in
+    # directory (see rawInput.py), parsing them in parseWorkers worker processes (0: one per
+    # cpu) unless parseWorkers is 1, and mapping them in workers processes (see function
+    # AddAlignments), and adds to myAlignment each alignment that involves the reference structure, referenceName
+    # (by default, the first structure of the first file). The reference sequence is read from
+    # fasta file refFasta, if given, and otherwise is derived from the alignments.
+    # Returns (refSeq, lineCount, failures).
+    import rawInput
+    if stats is None:
+        stats = runStats.RunStats()
+    refSeq = {"reference":"", "header":"", "sequence":""}
+    alignments = []
+    lineCount = 0
+    stats.Start(runStats.STAGE_PARSE)
+    for (path, count, fileAlignments, message) in rawInput.ReadRawDirectory(directory,inFormat,parseWorkers):
+        lineCount += count
+        if message:
+            Warn("%s %s: %s" % ("Problem with input file",path,message),LOGFILE,chatty)
+        alignments.extend(fileAlignments)
+    stats.Stop(runStats.STAGE_PARSE)
+    if not alignments:
+        return (refSeq, lineCount, [])
+    if not referenceName:
+        referenceName = alignments[0][0]
+    (oriented, skipped) = rawInput.OrientAlignments(alignments,referenceName)
+    for (name1, name2) in skipped:
+        Warn("%s %s %s %s %s" % ("Alignment of",name1,"to",name2,"does not involve the reference; skipped"),LOGFILE,chatty)
+    if refFasta:
+        refSeq = rawInput.ReadFasta(refFasta,referenceName)
+    elif oriented:
+        refSeq = rawInput.DeriveReference(referenceName,oriented[0]["referenceLine"])
+    else:
+        return (refSeq, lineCount, [])
+    RegisterReference(myAlignment,refSeq,baseState,chatty)
+    (failures, names) = AddAlignments(myAlignment,oriented,chatty,cache,stats,workers,thresholds,filtered)
+    return (refSeq, lineCount, failures)
+
+def Warn(message,LOGFILE,chatty):  # Reports a problem with the input
+    if chatty:
+        print "WARNING:", message
+    if LOGFILE:
+        LOGFILE.write("\n%s\n" % (message))
+
+def BuildMSSA(source,inFormat=DEFAULT_FORMAT,outFormat=DEFAULT_OUTPUT_FORMAT,width=DEFAULT_WIDTH,mssaFile=None,logFile=None,chatty=False,stateFile=None,baseState=None,cacheDir=None,cacheBytes=DEFAULT_CACHE_BYTES,stats=None,workers=1,refFasta=None,referenceName=None,consensus=False,compact=False,region=None,cache=None,memory=None,spillDir=None,thresholds=None,parseWorkers=DEFAULT_PARSE_WORKERS):
+    # Function BuildMSSA() reads a combAlign input file (a file name, or an open file), and
+    # returns an MSSAResult holding the multiple alignment. No file is written unless an
+    # output mssa file and/or a log file is named. Unacceptable parameters raise ValueError.
+    # If baseState names a state file saved by a previous build, the input's alignments are
+    # inserted into that alignment rather than building one from scratch; the input's
+    # reference must match. If stateFile is named, the resulting state is saved to it.
+    # If cacheDir names a cache directory, parsed and mapped alignments are reused from it, or
+    # saved to it, within a limit of cacheBytes (see alignmentCache.py). Alternatively, an open
+    # cache (e.g., an alignmentCache.MemoryAlignmentCache kept between builds) may be given.
+    # The time spent in each stage of the build, and counts describing the input and the
+    # result, are accumulated in stats (a runStats.RunStats), if given, and in any case are
+    # available as the result's stats.
+    # Unless workers is 1, pairwise alignments are mapped onto the reference in that many
+    # worker processes (0: one per cpu); the result is the same as when mapped serially.
+    # If source names a directory, it is read as a directory of unmodified TM-align or Dali
+    # Lite output files (see function ReadRawAlignments), with reference structure
+    # referenceName, whose sequence is read from fasta file refFasta, if given. The files are
+    # parsed concurrently, in parseWorkers worker processes (by default, one per cpu; 1 to
+    # parse them serially), whatever the number of workers mapping the alignments.
+    # If consensus is True, the consensus residue of each column is added as a final line.
+    # If compact is True, the display strings are held in compact form (see compactRows.py).
+    # If region is given, as (first, last) reference residues numbered from 1, only the columns
+    # spanning those residues are written.
+    # outFormat may name several output formats, separated by commas; the mssa is then written
+    # in each of them in a single pass, to mssaFile with its extension replaced by that of the
+    # format (see renderers.OutputFileNames).
+    # An input file (or the files of a directory, and refFasta) may be compressed with gzip,
+    # bzip2, or xz, and is read as a stream; an mssa file whose name ends in .gz, .bz2, or .xz is
+    # compressed as it is written (see compressedFiles.py).
+    # If memory is given (in bytes), the mssa is built out of core, within that memory budget:
+    # the mapped alignments and the display strings are spilled to temporary files (in
+    # directory spillDir, if given), and the strings are created one window of reference
+    # positions at a time (see windowedAlignment.py). A saved state cannot then be used.
+    # If thresholds are given, as a dict of threshold parameter (e.g., min_tm) -> value (see
+    # pairwise.SCORE_THRESHOLDS), pairwise alignments whose scores fail them are skipped before
+    # they are mapped; they are listed, with the reason, in the result's filtered list.
+    if inFormat not in ACCEPTABLE_INPUT_FORMATS:
+        raise ValueError("Please use an acceptable format: %s" % (ACCEPTABLE_INPUT_FORMATS,))
+    if not CheckOutputFormats(outFormat):
+        raise ValueError("Please request an acceptable output format: %s" % (ACCEPTABLE_OUTPUT_FORMATS,))
+    if p_nonDigit.search(str(width)) or int(width) < 0 or int(width) > 255:
+        raise ValueError("Choose a more realistic line width.")
+    for parameter in (thresholds or {}):
+        if parameter not in pairwise.SCORE_THRESHOLDS:
+            raise ValueError("Please use an acceptable score threshold: %s" % (tuple(sorted(pairwise.SCORE_THRESHOLDS)),))
+    if memory and (stateFile or baseState):
+        raise ValueError("A saved build state cannot be used in an out-of-core build")
+    if stats is None:
+        stats = runStats.RunStats()
+    stats.Start(runStats.STAGE_TOTAL)
+
+    rawDirectory = isinstance(source,basestring) and os.path.isdir(source)
+    if rawDirectory:
+        inFile = source
+        INFILE = None
+    elif isinstance(source,basestring):
+        inFile = source
+        INFILE = compressedFiles.OpenInput(inFile)
+    else:
+        inFile = getattr(source,"name","")
+        INFILE = source
+    LOGFILE  = None
+    outputs  = []    # (format, open file) of each mssa file written
+    mssaFiles = []
+    if mssaFile:
+        mssaFiles = renderers.OutputFileNames(mssaFile,OutputFormats(outFormat))
+    try:
+        if logFile:
+            LOGFILE = open(logFile,"w")
+            LOGFILE.write("%s%s\n" % ("Name of input file: ", inFile))
+            LOGFILE.write("%s%s\n" % ("Output mssa is in file: ", ", ".join(mssaFiles)))
+            LOGFILE.write("%s%s\n" % ("Input format is: ", inFormat))
+            LOGFILE.write("%s%s\n" % ("Output format is: ", outFormat))
+            LOGFILE.write("%s%s\n" % ("Line width is ", width))
+        for (format, fileName) in zip(OutputFormats(outFormat),mssaFiles):
+            outputs.append((format, compressedFiles.OpenOutput(fileName)))
+
+        # Create an Alignment object, or restore a previously built one
+        if baseState:
+            STATEFILE = open(baseState,"rb")
+            myAlignment = alignment.LoadState(STATEFILE)
+            STATEFILE.close()
+        elif memory:
+            import windowedAlignment
+            myAlignment = windowedAlignment.WindowedAlignment(inFormat,memory,spillDir)
+        else:
+            myAlignment = alignment.Alignment(inFormat)
+
+        if chatty:
+            print "Acquiring R-R correspondences from input file..."
+
+        # A named input file whose alignments are all in the cache need not be read at all
+        inputKey = None
+        manifest = None
+        filtered = []    # (matchName, reason) of each alignment whose scores failed the thresholds
+        if cache or cacheDir:
+            import alignmentCache
+            if not cache:
+                cache = alignmentCache.AlignmentCache(cacheDir,cacheBytes)
+            if INFILE and INFILE is not source:
+                inputKey = alignmentCache.InputKey(inFile,inFormat)
+                manifest = cache.GetManifest(inputKey)
+        if manifest:
+            (refSeq, lineCount, names) = manifest
+            mappedList = [cache.GetMapped(key) for (name,key,scores) in names]
+            if None in mappedList:
+                manifest = None  # some alignments have since been evicted
+        if manifest:
+            failures = []
+            RegisterReference(myAlignment,refSeq,baseState,chatty)
+            stats.Start(runStats.STAGE_ADD)
+            for i in xrange(0,len(names)):
+                (name, key, scores) = names[i]
+                reason = thresholds and pairwise.FailedThreshold(scores,thresholds)
+                if reason:
+                    filtered.append((name,reason))
+                    continue
+                failure = myAlignment.AddMappedAlignment(name,mappedList[i])
+                if failure == 0 and scores:
+                    myAlignment.SetScores(myAlignment.alignmentCount-1,scores)
+                ReportAlignment(name,failure,failures,chatty)
+            stats.Stop(runStats.STAGE_ADD)
+        elif rawDirectory:
+            (refSeq, lineCount, failures) = ReadRawAlignments(myAlignment,inFile,inFormat,LOGFILE,chatty,baseState,refFasta,referenceName,cache,stats,workers,thresholds,filtered,parseWorkers)
+        else:
+            (refSeq, lineCount, failures) = ReadAlignments(myAlignment,INFILE,inFormat,LOGFILE,chatty,baseState,cache,inputKey,stats,workers,thresholds,filtered)
+        if cache:
+            stats.Count("cacheHits",cache.hits)
+            stats.Count("cacheMisses",cache.misses)
+
+        if LOGFILE:
+            LOGFILE.write("%s%s\n" % ("Infile is ", inFile))
+            LOGFILE.write("%s%s\n" % ("The format is ", inFormat))
+            LOGFILE.write("%s%s\n" % ("Infile lineCount is: ", lineCount))
+            LOGFILE.write("%s%s\n" % ("Reference fasta is: ", refSeq["reference"]))
+            LOGFILE.write("%s\n%s\n" % (refSeq["header"], refSeq["sequence"]))
+            for (name, reason) in filtered:
+                LOGFILE.write("%s%s%s%s\n" % ("Pairwise alignment filtered out: ", name, ", ", reason))
+            LOGFILE.write("\n%s\n" % ("Calculating combined alignment."))
+
+        # Create multiple structure-based sequence alignment
+        if chatty:
+            print "Setting output format..."
+        if LOGFILE:
+            LOGFILE.write("%s\n" % ("Setting output format."))
+        myAlignment.SetOutputFormat(OutputFormats(outFormat)[0])
+        myAlignment.SetConsensusLine(consensus)
+        if compact:
+            myAlignment.SetCompactRows(True)
+        if region and myAlignment.SetRegion(region[0],region[1]) == 4:
+            raise ValueError("Region %s-%s is not within the reference sequence" % (region[0],region[1]))
+        if chatty:
+            print "Creating alignment strings..."
+        if LOGFILE:
+            LOGFILE.write("%s\n" % ("Creating alignment strings."))
+        stats.Start(runStats.STAGE_CREATE)
+        if baseState:
+            myAlignment.ExtendAlignmentStrings()
+        else:
+            myAlignment.CreateAlignmentStrings()
+        stats.Stop(runStats.STAGE_CREATE)
+        if stateFile:
+            stats.Start(runStats.STAGE_STATE)
+            STATEFILE = open(stateFile,"wb")
+            myAlignment.SaveState(STATEFILE)
+            STATEFILE.close()
+            stats.Stop(runStats.STAGE_STATE)
+        result = MSSAResult(myAlignment,refSeq,inFormat,outFormat,int(width),lineCount)
+        result.failures = failures
+        result.filtered = filtered
+        result.stats    = stats
+        stats.Describe("input",inFile)
+        stats.Describe("inFormat",inFormat)
+        stats.Describe("outFormat",outFormat)
+        stats.Describe("width",int(width))
+        stats.Count("linesRead",lineCount)
+        stats.Count("alignmentsFailed",len(failures))
+        stats.Count("alignmentsFiltered",len(filtered))
+        for (name, value) in myAlignment.GetBuildCounters().items():
+            stats.Count(name,value)
+
+        # Print multiple structure-based sequence alignment
+        if outputs:
+            if chatty:
+                print "Printing display strings to the output mssa file..."
+            if LOGFILE:
+                LOGFILE.write("%s\n" % ("Printing display strings to output mssa file."))
+            stats.Start(runStats.STAGE_WRITE)
+            writers = [(format, runStats.CountingWriter(MSSAFILE)) for (format, MSSAFILE) in outputs]
+            result.WriteAll(writers)
+            stats.Stop(runStats.STAGE_WRITE)
+            stats.Count("bytesWritten",sum([WRITER.bytes for (format, WRITER) in writers]))
+        if LOGFILE:
+            LOGFILE.write("%s\n" % ("Done!"))
+    finally:  # Clean up
+        if INFILE and INFILE is not source:
+            INFILE.close()
+        if LOGFILE:
+            LOGFILE.close()
+        for (format, MSSAFILE) in outputs:
+            MSSAFILE.close()
+        stats.Stop(runStats.STAGE_TOTAL)
+    return result
+
+def main(argv):
+    # Get input parameter(s) 
+    # User needs to provide 1) name of file containing reference fasta sequence and 
+    # list of pairwise alignments, 2) the format of (ie, program used to generate) the 
+    # alignment, 3) (Optional) desired line length for output.
+    inFile    = ""                     # user provided
+    width     = DEFAULT_WIDTH          # width of output alignment segments
+    format    = DEFAULT_FORMAT         # program used to perform pairwise alignments, begin w/default 
+    outFormat = DEFAULT_OUTPUT_FORMAT
+    mssa      = mssaFile
+    log       = logFile
+    state     = None                   # save build state to this file
+    update    = None                   # insert alignments into the build state saved in this file
+    cacheDir  = None                   # reuse parsed and mapped alignments cached in this directory
+    cacheBytes = DEFAULT_CACHE_BYTES
+    statsFile = None                   # write timings and counts of the run as JSON to this file
+    profileFile = None                 # save a cProfile profile of the run to this file
+    workers   = 1                      # map pairwise alignments in this many worker processes (0: one per cpu)
+    parseWorkers = DEFAULT_PARSE_WORKERS  # with dir=, parse the output files in this many worker processes (0: one per cpu)
+    refFasta  = None                   # with dir=, fasta file holding the reference sequence
+    referenceName = None               # with dir=, name of the reference structure
+    consensus = False                  # add a consensus line to the mssa
+    compact   = False                  # hold display strings in compact form, to save memory
+    region    = None                   # print only the columns spanning these reference residues
+    compress  = None                   # compress the mssa file(s) with gzip, bzip2, or xz
+    memory    = None                   # build out of core, within this memory budget (bytes)
+    spillDir  = None                   # with memory=, directory of the temporary spill files
+    thresholds = {}                    # skip pairwise alignments whose scores fail these (e.g., min_tm)
+
+    argCount = len(argv)
+    if (argCount < REQUIRED_PARAMS):
+        print "Insufficient parameters. Type: \'python combAlign.py help\'" 
+        return 0
+
+    for i in range(1,argCount):
+        if p_help.search(argv[i].lower()):
+            print HELP_STRING
+            print USAGE_STRING
+            return 0
+        if p_input.search(argv[i].lower()):
+            print INPUT_STRING
+            return 0
+        if p_usage.search(argv[i].lower()):
+            print USAGE_STRING
+            return 0
+        if p_inFormats.search(argv[i].lower()):
+            print "Acceptable input formats are", ACCEPTABLE_INPUT_FORMATS
+            return 0
+        if p_outFormats.search(argv[i].lower()):
+            print "Acceptable output formats are", ACCEPTABLE_OUTPUT_FORMATS
+            return 0
+        if '=' in argv[i]:
+            (parameter,value) = argv[i].split('=',1)
+            if (parameter.lower() == 'in_format' or parameter.lower() == 'input'):
+                format = value
+                if format not in ACCEPTABLE_INPUT_FORMATS:
+                    print "Please use an acceptable format:", ACCEPTABLE_INPUT_FORMATS
+                    return 0
+            if (parameter.lower() == 'file'): 
+                inFile = value
+            if (parameter.lower() == 'dir'):  # directory of unmodified TM-align or DaliLite output files
+                inFile = value
+            if (parameter.lower() == 'consensus'):
+                consensus = value.lower() in ('yes','true','1')
+            if (parameter.lower() == 'compact'):
+                compact = value.lower() in ('yes','true','1')
+            if (parameter.lower() == 'region'):  # first-last reference residues, numbered from 1
+                region = ParseRegion(value)
+                if region is None:
+                    print "Please give the region as first-last reference residue numbers, e.g. region=300-500."
+                    return 0
+            if (parameter.lower() == 'compress'):
+                compress = value.lower()
+                if compress not in compressedFiles.ACCEPTABLE_COMPRESSIONS:
+                    print "Please request an acceptable compression:", compressedFiles.ACCEPTABLE_COMPRESSIONS
+                    return 0
+            if (parameter.lower() == 'memory'):  # in megabytes
+                if p_nonDigit.search(value) or int(value) < 1:
+                    print "Please give the memory budget as a whole number of megabytes."
+                    return 0
+                memory = int(value) * 1024 * 1024
+            if (parameter.lower() == 'spill_dir'):
+                spillDir = value
+            if (parameter.lower() in pairwise.SCORE_THRESHOLDS):
+                try:
+                    thresholds[parameter.lower()] = float(value)
+                except ValueError:
+                    print "Please give the score threshold", parameter, "as a number."
+                    return 0
+            if (parameter.lower() == 'ref_fasta'):
+                refFasta = value
+            if (parameter.lower() == 'reference'):
+                referenceName = value
+            if (parameter.lower() == 'width' or parameter.lower() == 'length'):
+                width = value
+                if p_nonDigit.search(width):
+                    print "Choose a more realistic line width."
+                    print USAGE_STRING
+                    return 0
+                if (int(width) < 0 or int(width) > 255):
+                    print "Choose a more realistic line width."
+                    print USAGE_STRING
+                    return 0
+            if (parameter.lower() == 'out_format' or parameter.lower() == 'output'):
+                outFormat = value
+                if not CheckOutputFormats(outFormat):
+                    print "Please request an acceptable output format:", ACCEPTABLE_OUTPUT_FORMATS
+                    return 0
+            if (parameter.lower() == 'mssa'):
+                mssa = value
+            if (parameter.lower() == 'log'):
+                log = value
+            if (parameter.lower() == 'state'):
+                state = value
+            if (parameter.lower() == 'update'):
+                update = value
+            if (parameter.lower() == 'cache'):
+                cacheDir = value
+            if (parameter.lower() == 'cache_size'):  # in megabytes
+                if p_nonDigit.search(value):
+                    print "Please give the cache size as a whole number of megabytes."
+                    return 0
+                cacheBytes = int(value) * 1024 * 1024
+            if (parameter.lower() == 'stats'):
+                statsFile = value
+            if (parameter.lower() == 'profile'):
+                profileFile = value
+            if (parameter.lower() == 'workers'):
+                if p_nonDigit.search(value):
+                    print "Please request a number of worker processes (0 for one per cpu)."
+                    return 0
+                workers = int(value)
+            if (parameter.lower() == 'parse_workers'):
+                if p_nonDigit.search(value):
+                    print "Please request a number of parsing worker processes (0 for one per cpu)."
+                    return 0
+                parseWorkers = int(value)
+
+    mssa = compressedFiles.AddCompressionSuffix(mssa,compress)
+
+    # Reflect parameters
+    if CHATTY:
+        print "Your input file name is", inFile 
+        print "Your input format is", format 
+        print "Your output format is", outFormat
+        print "Your desired line width is", width 
+
+    stats = runStats.RunStats(profileFile is not None)
+    try:
+        BuildMSSA(inFile,format,outFormat,width,mssa,log,CHATTY,state,update,cacheDir,cacheBytes,stats,workers,refFasta,referenceName,consensus,compact,region,None,memory,spillDir,thresholds,parseWorkers)
+    except (ValueError,) + compressedFiles.READ_ERRORS, e:
+        print e
+        return 0
+    if statsFile:
+        STATSFILE = open(statsFile,"w")
+        stats.WriteJSON(STATSFILE)
+        STATSFILE.close()
+    if profileFile:
+        stats.WriteProfile(profileFile)
+
+    if CHATTY:
+        print "Look for your output in file", ", ".join(renderers.OutputFileNames(mssa,OutputFormats(outFormat)))
+        print "Done!"
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,277 @@
+#############################################################################################
+# Module:  combAlignAllVsAll.py
+# Version No.: 1.1
+#
+# Description:  This code builds, from a single set of pairwise alignments among a family of
+# structures, one mssa centred on each structure of the family. The input is a combAlign input
+# file (type 'python combAlign.py input' for a description) that may contain any number of
+# 'REFERENCE' sections, each followed by the 'ALIGNMENT's of that reference to other members
+# of the family. The name given on a 'REFERENCE' line must be the name by which the same
+# structure is given on the 'ALIGNMENT' lines of other sections.
+# The input file is parsed once, and every pairwise alignment is held, by the names of its
+# two structures, for use in any mssa that needs it. For each structure S, the mssa centred
+# on S comprises S's alignment to every other structure T with which it was compared: the
+# alignment of S to T is used as given if present, and otherwise is obtained by inverting the
+# alignment of T to S (exchanging its reference and match lines; the correspondence line is
+# the same in either direction). The sequence of S is taken from its 'REFERENCE' section if
+# it has one, and otherwise is derived from the match line of an alignment to S, by removing
+# the gap characters. Each mssa is written to an output directory as <name>.mssa (or, if several
+# output formats are requested, as <name> with the extension of each; see renderers.py),
+# compressed if requested (see compressedFiles.py).
+# The scores of each pairwise alignment, if given (see pairwise.ParseScores), are kept with
+# it, and reported in each mssa that uses it; an inverted alignment takes the scores of the
+# alignment given, with the TM-scores normalized by either structure exchanged. As in
+# combAlign.py, alignments whose scores fail the thresholds given (e.g., min_tm=0.5) are
+# skipped, and listed in the summary.
+#
+# Copyright 2014 by Carol L. Ecale Zhou, Lawrence Livermore National Security. All Rights
+# Reserved. Permission to use, copy, modify, and distribute this software and its
+# documentation for educational, research, and not-for-profit purposes, without fee and
+# without a signed licensing agreement, is hereby granted, provided that the above
+# copyright notice, this paragraph and the following two paragraphs appear in all copies,
+# modifications, and distributions. Contact Office of XXXX, Lawrence Livermore National
+# Security for commercial licensing opportunities.
+#    In no event shall LLNS be liable to any party for direct, indirect, special, incidental,
+# or consequential damages, including lost profits, arising out of the use of this
+# software and its documentation, even if LLNS has been advised of the possibility of
+# such damage.
+#    LLNS disclaims any warranties, including, but no limited to, the implied
+# warranties of merchantability and fitness for a particular purpose. The software and
+# accompanying documentation, if any, provided hereunder is provided "as is", LLNS has
+# no obligation to provide maintenance, support, updates, enhancements, or modifications.
+#############################################################################################
+
+import sys
+import os
+import re
+import alignment              # alignment.py module by C. Zhou
+import pairwise               # pairwise.py module; reads input file
+import combAlign              # combAlign.py module; constants and parameter checks
+import renderers              # renderers.py module; writes the mssa in each output format
+import compressedFiles        # compressedFiles.py module; reads gzip, bzip2, and xz files
+
+USAGE_STRING = """Here are some examples for how to run combAlignAllVsAll.py:
+
+This command will build one mssa centred on each structure named in my_family_aligns, in directory my_mssas:
+python combAlignAllVsAll.py file=my_family_aligns in_format=TM-align out_format=combAlign width=80 outdir=my_mssas
+
+This command will build the mssas centred on Sudan and Zaire only:
+python combAlignAllVsAll.py file=my_family_aligns in_format=DaliLite outdir=my_mssas references=Sudan,Zaire
+
+This command will write each mssa in both the CombAlign and Stockholm formats, as <name>.mssa and <name>.sto:
+python combAlignAllVsAll.py file=my_family_aligns in_format=TM-align out_format=combAlign,stockholm outdir=my_mssas
+
+This command will skip pairwise alignments whose TM-score is below 0.5, and write each mssa compressed with gzip, as <name>.mssa.gz (thresholds min_tm, min_z, min_identity, min_aligned, and max_rmsd are accepted, as by combAlign.py):
+python combAlignAllVsAll.py file=my_family_aligns in_format=TM-align outdir=my_mssas min_tm=0.5 compress=gz
+
+A summary of the mssas built, and of any pairwise alignments that could not be added or were filtered out, is written to the output directory as combAlign_all.summary.
+"""
+
+DEFAULT_OUTDIR = "."
+SUMMARY_FILE   = "combAlign_all.summary"
+GAP_CHARACTERS = "-. "  # characters removed from a match line to derive its sequence
+
+p_unsafeName   = re.compile('[^\w.-]')  # characters replaced in output file names
+
+class PairwiseSet(object):  # All pairwise alignments among a family of structures, parsed once
+
+    def __init__(self):
+        self.structures = []    # names of structures, in order of first appearance
+        self.sequences  = {}    # name -> refSeq dict, for structures given a 'REFERENCE' section
+        self.pairs      = {}    # (reference name, match name) -> pairwise dict
+        self.partners   = {}    # name -> names of structures compared with it, in order of appearance
+
+    def AddStructure(self,name):
+        if name not in self.partners:
+            self.structures.append(name)
+            self.partners[name] = []
+
+    def Read(self,INFILE,inFormat,LOGFILE=None,chatty=False):
+        # Method Read() reads every 'REFERENCE' section of an open input file, and holds each
+        # pairwise alignment by the names of its two structures. Returns the number of lines read.
+        reader = pairwise.PairwiseReader(INFILE,inFormat,LOGFILE,chatty)
+        refSeq = reader.ReadReference()
+        while refSeq:
+            reference = refSeq["reference"].strip()
+            self.AddStructure(reference)
+            self.sequences[reference] = refSeq
+            for nextPairwise in reader.Alignments():
+                matchName = nextPairwise["matchName"]
+                self.AddStructure(matchName)
+                self.pairs[(reference,matchName)] = {
+                    "matchName"          : matchName,
+                    "referenceLine"      : nextPairwise["referenceLine"],
+                    "correspondenceLine" : nextPairwise["correspondenceLine"],
+                    "matchLine"          : nextPairwise["matchLine"],
+                    "scores"             : nextPairwise.get("scores",{}),
+                    }
+                for (name, other) in ((reference,matchName),(matchName,reference)):
+                    if other not in self.partners[name]:
+                        self.partners[name].append(other)
+            refSeq = reader.ReadReference()
+        return reader.lineCount
+
+    def GetSequence(self,name):  # Returns a refSeq dict for structure name, derived from a match line if need be
+        if name in self.sequences:
+            return self.sequences[name]
+        for other in self.partners.get(name,[]):
+            if (other,name) in self.pairs:
+                matchLine = self.pairs[(other,name)]["matchLine"].rstrip('*')
+                return {
+                    "reference" : name,
+                    "header"    : ">" + name,
+                    "sequence"  : matchLine.translate(None,GAP_CHARACTERS),
+                    }
+        return None
+
+    def GetCentredAlignments(self,name):
+        # Method GetCentredAlignments() returns the list of pairwise dicts aligning structure
+        # name to each structure compared with it, inverting alignments given the other way.
+        centred = []
+        for other in self.partners.get(name,[]):
+            if (name,other) in self.pairs:
+                centred.append(self.pairs[(name,other)])
+            else:
+                centred.append(pairwise.InvertPairwise(self.pairs[(other,name)],other))
+        return centred
+
+def BuildCentredMSSA(pairSet,name,inFormat,outFormat,width,mssaFile=None,chatty=False,thresholds=None):
+    # Function BuildCentredMSSA() builds, and optionally writes, the mssa centred on structure
+    # name, skipping pairwise alignments whose scores fail thresholds, if given. Returns
+    # (Alignment, failures, filtered), where failures lists (matchName, failure code) for each
+    # pairwise alignment that could not be added, and filtered lists (matchName, reason) for
+    # each that was skipped, or (None, None, None) if no sequence is known for the structure.
+    refSeq = pairSet.GetSequence(name)
+    if refSeq is None:
+        return (None, None, None)
+    myAlignment = alignment.Alignment(inFormat)
+    myAlignment.EnterReference(refSeq)
+    filtered = []
+    (failures, names) = combAlign.AddAlignments(myAlignment,pairSet.GetCentredAlignments(name),chatty,thresholds=thresholds,filtered=filtered)
+    formats = combAlign.OutputFormats(outFormat)
+    myAlignment.SetOutputFormat(formats[0])
+    myAlignment.CreateAlignmentStrings()
+    if mssaFile:
+        outputs = []
+        try:
+            for (format, fileName) in zip(formats,renderers.OutputFileNames(mssaFile,formats)):
+                outputs.append((format, compressedFiles.OpenOutput(fileName)))
+            renderers.RenderAll(myAlignment,outputs,width)
+        finally:
+            for (format, MSSAFILE) in outputs:
+                MSSAFILE.close()
+    return (myAlignment, failures, filtered)
+
+def BuildAllMSSAs(source,inFormat=combAlign.DEFAULT_FORMAT,outFormat=combAlign.DEFAULT_OUTPUT_FORMAT,width=combAlign.DEFAULT_WIDTH,outDir=DEFAULT_OUTDIR,references=None,chatty=False,thresholds=None,compress=None):
+    # Function BuildAllMSSAs() reads a family's pairwise alignments (from a file name, or an
+    # open file, compressed or not) once, and writes the mssa centred on each structure (or on
+    # each structure named in references) to outDir, compressed with compress, if given.
+    # Pairwise alignments whose scores fail thresholds, if given (see combAlign.BuildMSSA), are
+    # skipped. Returns a list of (name, mssa file, alignment count, failures, filtered) per
+    # structure; the mssa file is None if no sequence is known for the structure.
+    if inFormat not in combAlign.ACCEPTABLE_INPUT_FORMATS:
+        raise ValueError("Please use an acceptable format: %s" % (combAlign.ACCEPTABLE_INPUT_FORMATS,))
+    if not combAlign.CheckOutputFormats(outFormat):
+        raise ValueError("Please request an acceptable output format: %s" % (combAlign.ACCEPTABLE_OUTPUT_FORMATS,))
+    if combAlign.p_nonDigit.search(str(width)) or int(width) < 0 or int(width) > 255:
+        raise ValueError("Choose a more realistic line width.")
+    for parameter in (thresholds or {}):
+        if parameter not in pairwise.SCORE_THRESHOLDS:
+            raise ValueError("Please use an acceptable score threshold: %s" % (tuple(sorted(pairwise.SCORE_THRESHOLDS)),))
+    if compress and compress not in compressedFiles.ACCEPTABLE_COMPRESSIONS:
+        raise ValueError("Please request an acceptable compression: %s" % (compressedFiles.ACCEPTABLE_COMPRESSIONS,))
+    if not os.path.isdir(outDir):
+        os.makedirs(outDir)
+
+    pairSet = PairwiseSet()
+    if isinstance(source,basestring):
+        INFILE = compressedFiles.OpenInput(source)
+        pairSet.Read(INFILE,inFormat,None,chatty)
+        INFILE.close()
+    else:
+        pairSet.Read(source,inFormat,None,chatty)
+
+    results = []
+    taken = set()
+    for name in references or pairSet.structures:
+        fileName = p_unsafeName.sub('_',name) or "unnamed"
+        unique = fileName
+        suffix = 1
+        while unique in taken:
+            suffix += 1
+            unique = "%s_%s" % (fileName,suffix)
+        taken.add(unique)
+        mssaFile = compressedFiles.AddCompressionSuffix(os.path.join(outDir,unique + ".mssa"),compress)
+        if chatty:
+            print "Building mssa centred on", name, "..."
+        (myAlignment, failures, filtered) = BuildCentredMSSA(pairSet,name,inFormat,outFormat,int(width),mssaFile,chatty,thresholds)
+        if myAlignment is None:
+            results.append((name, None, 0, [], []))
+        else:
+            results.append((name, mssaFile, myAlignment.alignmentCount, failures, filtered))
+    return results
+
+def WriteSummary(results,OUTFILE):  # Prints one tab-delimited line per structure
+    OUTFILE.write("%s\t%s\t%s\t%s\t%s\n" % ("reference","alignments","mssa","not added","filtered out"))
+    for (name, mssaFile, count, failures, filtered) in results:
+        if mssaFile is None:
+            OUTFILE.write("%s\t%s\t%s\t%s\t%s\n" % (name,0,"","no sequence found",""))
+        else:
+            OUTFILE.write("%s\t%s\t%s\t%s\t%s\n" % (name,count,mssaFile,",".join(["%s(%s)" % (matchName,code) for (matchName,code) in failures]),
+                                                  ",".join(["%s(%s)" % (matchName,reason) for (matchName,reason) in filtered])))
+
+def main(argv):
+    inFile     = ""
+    inFormat   = combAlign.DEFAULT_FORMAT
+    outFormat  = combAlign.DEFAULT_OUTPUT_FORMAT
+    width      = combAlign.DEFAULT_WIDTH
+    outDir     = DEFAULT_OUTDIR
+    references = None
+    thresholds = {}
+    compress   = None
+
+    for i in range(1,len(argv)):
+        if argv[i].lower() in ('help','usage'):
+            print USAGE_STRING
+            return 0
+        if '=' in argv[i]:
+            (parameter,value) = argv[i].split('=',1)
+            parameter = parameter.lower()
+            if parameter == 'file':
+                inFile = value
+            if parameter == 'in_format' or parameter == 'input':
+                inFormat = value
+            if parameter == 'out_format' or parameter == 'output':
+                outFormat = value
+            if parameter == 'width' or parameter == 'length':
+                width = value
+            if parameter == 'outdir':
+                outDir = value
+            if parameter == 'references':
+                references = [name for name in value.split(',') if name]
+            if parameter == 'compress':
+                compress = value.lower()
+            if parameter in pairwise.SCORE_THRESHOLDS:
+                try:
+                    thresholds[parameter] = float(value)
+                except ValueError:
+                    print "Please give the score threshold", parameter, "as a number."
+                    return 0
+
+    if not inFile:
+        print "Please provide an input file (file=)."
+        print USAGE_STRING
+        return 0
+    try:
+        results = BuildAllMSSAs(inFile,inFormat,outFormat,width,outDir,references,combAlign.CHATTY,thresholds,compress)
+    except (ValueError,) + compressedFiles.READ_ERRORS, e:
+        print e
+        return 0
+    SUMMARYFILE = open(os.path.join(outDir,SUMMARY_FILE),"w")
+    WriteSummary(results,SUMMARYFILE)
+    SUMMARYFILE.close()
+    WriteSummary(results,sys.stdout)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
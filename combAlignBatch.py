@@ -0,0 +1,401 @@
+#############################################################################################
+# Module:  combAlignBatch.py
+# Version No.: 1.1
+#
+# Description:  This code runs combAlign on a batch of input files, each comprising a
+# reference fasta sequence followed by a set of pairwise alignments (type 'python
+# combAlign.py input' for a description of the input file). The batch is given either as a
+# directory, in which case every (non-hidden) file in the directory is an input file, or
+# as a manifest: a text file listing one input file per line, optionally followed by the
+# input format of that file. Each input file's mssa is built in a worker process, and is
+# written, along with its log, to an output directory under the input file's base name. A
+# failure on one input file is recorded in the batch summary and does not affect the others.
+# In pipelined mode (function PipelineBatch), reading the next input files, building the
+# current mssas, and writing the previous ones overlap: a reader thread reads (and
+# decompresses) input files ahead of the build, and a writer thread writes each built mssa,
+# while the mssas are built in the main thread or in a pool of worker processes. The stages
+# are joined by bounded queues, so that no stage runs more than a few inputs ahead of the
+# next, and the batch takes about as long as its slowest stage, rather than the sum of all.
+# Only inputs of at most READ_AHEAD_BYTES (uncompressed) are read ahead, and only their mssas
+# are held in memory for the writer thread; a larger input is streamed from its file, and its
+# mssa written to its files, by the build stage itself, as in the unpipelined mode. Memory held
+# between stages is therefore bounded by about (2*depth + workers) * READ_AHEAD_BYTES, times the
+# ratio of an mssa's size to its input's.
+#
+# Copyright 2014 by Carol L. Ecale Zhou, Lawrence Livermore National Security. All Rights
+# Reserved. Permission to use, copy, modify, and distribute this software and its
+# documentation for educational, research, and not-for-profit purposes, without fee and
+# without a signed licensing agreement, is hereby granted, provided that the above
+# copyright notice, this paragraph and the following two paragraphs appear in all copies,
+# modifications, and distributions. Contact Office of XXXX, Lawrence Livermore National
+# Security for commercial licensing opportunities.
+#    In no event shall LLNS be liable to any party for direct, indirect, special, incidental,
+# or consequential damages, including lost profits, arising out of the use of this
+# software and its documentation, even if LLNS has been advised of the possibility of
+# such damage.
+#    LLNS disclaims any warranties, including, but no limited to, the implied
+# warranties of merchantability and fitness for a particular purpose. The software and
+# accompanying documentation, if any, provided hereunder is provided "as is", LLNS has
+# no obligation to provide maintenance, support, updates, enhancements, or modifications.
+#############################################################################################
+
+import sys
+import os
+import time
+import threading
+import Queue
+import cStringIO
+import combAlign              # combAlign.py module; builds one mssa
+import compressedFiles        # compressedFiles.py module; compression suffixes, compressed input and output
+import renderers              # renderers.py module; names of the files of several output formats
+
+USAGE_STRING = """Here are some examples for how to run combAlignBatch.py:
+
+This command will build an mssa for every input file in directory my_inputs, using 8 worker processes:
+python combAlignBatch.py dir=my_inputs in_format=TM-align out_format=combAlign width=80 outdir=my_mssas workers=8
+
+This command will build an mssa for every input file listed in my_manifest, one per line, each optionally followed by its input format:
+python combAlignBatch.py manifest=my_manifest in_format=DaliLite outdir=my_mssas
+
+This command will overlap reading the next input files and writing the finished mssas with building the current ones, holding at most 4 inputs between stages:
+python combAlignBatch.py dir=my_inputs in_format=TM-align outdir=my_mssas workers=2 pipeline=yes depth=4
+
+In pipelined mode, input files larger than 64 MB (uncompressed) are not read ahead; each is streamed by the build stage, which also writes its mssa.
+
+For each input file, the mssa and log are written to the output directory as <name>.mssa and <name>.log. If several output formats are requested (e.g., out_format=combAlign,clustal), the mssa is written in each, as <name>.mssa, <name>.aln, and so on.
+A summary of the status of each job is written to the output directory as combAlign_batch.summary.
+"""
+
+DEFAULT_OUTDIR   = "."
+DEFAULT_WORKERS  = 0     # 0: one worker process per cpu
+DEFAULT_DEPTH    = 2     # in pipelined mode, inputs (or mssas) held between two stages
+READ_AHEAD_BYTES = 64 * 1024 * 1024  # in pipelined mode, largest input read ahead and held in memory
+SUMMARY_FILE     = "combAlign_batch.summary"
+STATUS_OK        = "OK"
+STATUS_WARNING   = "WARNING"  # mssa was built, but some pairwise alignments could not be added
+STATUS_FAILED    = "FAILED"
+
+def ListBatchInputs(directory=None,manifest=None,inFormat=combAlign.DEFAULT_FORMAT):
+    # Function ListBatchInputs() returns the list of (input file, input format) jobs named
+    # by a directory or by a manifest file. Blank lines and '#' comments in a manifest are
+    # skipped.
+    inputs = []
+    if directory:
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory,name)
+            if not name.startswith('.') and os.path.isfile(path):
+                inputs.append((path,inFormat))
+    if manifest:
+        MANIFEST = open(manifest,"r")
+        for nextLine in MANIFEST:
+            fields = nextLine.split()
+            if not fields or fields[0].startswith('#'):
+                continue
+            if len(fields) > 1:
+                inputs.append((fields[0],fields[1]))
+            else:
+                inputs.append((fields[0],inFormat))
+        MANIFEST.close()
+    return inputs
+
+def OutputName(path,taken):  # Returns a base name for path's output files, unique among taken names
+    name = os.path.splitext(compressedFiles.SplitCompressionSuffix(os.path.basename(path))[0])[0]
+    unique = name
+    suffix = 1
+    while unique in taken:
+        suffix += 1
+        unique = "%s_%s" % (name,suffix)
+    taken.add(unique)
+    return unique
+
+def RunBatchJob(job):
+    # Function RunBatchJob() builds and writes the mssa for a single input file; it is run
+    # in a worker process. Any error is caught and reported in the returned job status.
+    status = {
+        "input"    : job["input"],
+        "status"   : STATUS_OK,
+        "mssa"     : job["mssa"],
+        "seconds"  : 0.0,
+        "message"  : "",
+        }
+    start = time.time()
+    try:
+        result = combAlign.BuildMSSA(job["input"],job["inFormat"],job["outFormat"],job["width"],job["mssa"],job["log"])
+        if result.alignment.alignmentCount == 0:
+            status["status"]  = STATUS_FAILED
+            status["message"] = "no pairwise alignments were added"
+        elif result.failures:
+            status["status"]  = STATUS_WARNING
+            status["message"] = "%s pairwise alignment(s) not added" % (len(result.failures))
+    except Exception, e:
+        status["status"]  = STATUS_FAILED
+        status["message"] = "%s: %s" % (e.__class__.__name__,e)
+    status["seconds"] = time.time() - start
+    return status
+
+def CreateJobs(inputs,outDir,outFormat,width):  # Returns the job dict of each (input file, input format), creating outDir
+    if not os.path.isdir(outDir):
+        os.makedirs(outDir)
+    jobs = []
+    taken = set()
+    for (path,inFormat) in inputs:
+        name = OutputName(path,taken)
+        jobs.append({
+            "input"     : path,
+            "inFormat"  : inFormat,
+            "outFormat" : outFormat,
+            "width"     : width,
+            "mssa"      : os.path.join(outDir,name + ".mssa"),
+            "log"       : os.path.join(outDir,name + ".log"),
+            })
+    return jobs
+
+def BuildBatch(inputs,outDir=DEFAULT_OUTDIR,outFormat=combAlign.DEFAULT_OUTPUT_FORMAT,width=combAlign.DEFAULT_WIDTH,workers=DEFAULT_WORKERS,chatty=False):
+    # Function BuildBatch() builds an mssa for each (input file, input format) in inputs,
+    # across a pool of worker processes, and returns the list of job statuses in input order.
+    jobs = CreateJobs(inputs,outDir,outFormat,width)
+    workers = int(workers)
+    if workers == 1 or len(jobs) < 2:  # no need for a pool
+        statuses = []
+        for job in jobs:
+            statuses.append(RunBatchJob(job))
+            if chatty:
+                print statuses[-1]["status"], statuses[-1]["input"]
+        return statuses
+
+    import multiprocessing
+    if workers <= 0:
+        workers = multiprocessing.cpu_count()
+    pool = multiprocessing.Pool(min(workers,len(jobs)))
+    statuses = []
+    try:
+        for status in pool.imap(RunBatchJob,jobs):
+            statuses.append(status)
+            if chatty:
+                print status["status"], status["input"]
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return statuses
+
+def ReadBatchInput(job,maxBytes=READ_AHEAD_BYTES):
+    # Function ReadBatchInput() returns (job, input text, error message) for a job, reading
+    # (and decompressing) its input file. The input text is None, and the input left to be
+    # streamed from its file by the build, for a directory of raw output files, or for an
+    # input of more than maxBytes. Any error is caught and reported in the error message.
+    if os.path.isdir(job["input"]):
+        return (job, None, "")
+    try:
+        INFILE = compressedFiles.OpenInput(job["input"])
+        try:
+            data = INFILE.read(maxBytes + 1)
+        finally:
+            INFILE.close()
+    except Exception, e:
+        return (job, None, "%s: %s" % (e.__class__.__name__,e))
+    if len(data) > maxBytes:
+        return (job, None, "")
+    return (job, data, "")
+
+def BuildBatchOutputs(item):
+    # Function BuildBatchOutputs() builds the mssa for a job from its input text, as read by
+    # function ReadBatchInput, and writes it to memory; it may be run in a worker process.
+    # An input not read ahead is streamed from its file, and its mssa is written to its files
+    # here, rather than held in memory. Returns (job status, [(mssa file, mssa text), ...]).
+    (job, data, error) = item
+    status = {
+        "input"    : job["input"],
+        "status"   : STATUS_OK,
+        "mssa"     : job["mssa"],
+        "seconds"  : 0.0,
+        "message"  : "",
+        }
+    if error:
+        status["status"]  = STATUS_FAILED
+        status["message"] = error
+        return (status, [])
+    start = time.time()
+    outputs = []
+    try:
+        if data is None:
+            result = combAlign.BuildMSSA(job["input"],job["inFormat"],job["outFormat"],job["width"],job["mssa"],job["log"])
+        else:
+            result = combAlign.BuildMSSA(cStringIO.StringIO(data),job["inFormat"],job["outFormat"],job["width"],None,job["log"])
+            formats = combAlign.OutputFormats(job["outFormat"])
+            texts = [cStringIO.StringIO() for format in formats]
+            result.WriteAll(zip(formats,texts))
+            outputs = zip(renderers.OutputFileNames(job["mssa"],formats),[text.getvalue() for text in texts])
+        if result.alignment.alignmentCount == 0:
+            status["status"]  = STATUS_FAILED
+            status["message"] = "no pairwise alignments were added"
+        elif result.failures:
+            status["status"]  = STATUS_WARNING
+            status["message"] = "%s pairwise alignment(s) not added" % (len(result.failures))
+    except Exception, e:
+        status["status"]  = STATUS_FAILED
+        status["message"] = "%s: %s" % (e.__class__.__name__,e)
+    status["seconds"] = time.time() - start
+    return (status, outputs)
+
+def PipelineBatch(inputs,outDir=DEFAULT_OUTDIR,outFormat=combAlign.DEFAULT_OUTPUT_FORMAT,width=combAlign.DEFAULT_WIDTH,workers=1,depth=DEFAULT_DEPTH,chatty=False,maxBytes=READ_AHEAD_BYTES):
+    # Function PipelineBatch() builds an mssa for each (input file, input format) in inputs,
+    # as function BuildBatch does, but overlaps reading, building, and writing (see the
+    # description above). Inputs are read by a reader thread into a queue of at most depth
+    # inputs; mssas are built in the calling thread (workers 1) or in a pool of worker
+    # processes (0: one per cpu), with at most workers+depth inputs outstanding; and built
+    # mssas are passed through a queue of at most depth to a writer thread. Inputs larger
+    # than maxBytes are neither read ahead nor held in memory (see the description above).
+    # Returns the list of job statuses in input order.
+    jobs = CreateJobs(inputs,outDir,outFormat,width)
+    readQueue  = Queue.Queue(max(int(depth),1))
+    writeQueue = Queue.Queue(max(int(depth),1))
+    statuses = []
+
+    def ReadStage():  # the end of the inputs is always queued, so that the build never waits forever
+        try:
+            for job in jobs:
+                readQueue.put(ReadBatchInput(job,maxBytes))
+        finally:
+            readQueue.put(None)
+
+    def WriteStage():  # each job's error is caught, so that the writer takes every mssa queued
+        while True:
+            item = writeQueue.get()
+            if item is None:
+                return
+            (status, outputs) = item
+            start = time.time()
+            try:
+                for (mssaFile, text) in outputs:
+                    MSSAFILE = compressedFiles.OpenOutput(mssaFile)
+                    try:
+                        MSSAFILE.write(text)
+                    finally:
+                        MSSAFILE.close()
+            except Exception, e:
+                status["status"]  = STATUS_FAILED
+                status["message"] = "%s: %s" % (e.__class__.__name__,e)
+            status["seconds"] += time.time() - start
+            statuses.append(status)
+            if chatty:
+                print status["status"], status["input"]
+
+    reader = threading.Thread(target=ReadStage)
+    writer = threading.Thread(target=WriteStage)
+    for thread in (reader, writer):
+        thread.daemon = True  # do not outlive an interrupted batch
+        thread.start()
+    workers = int(workers)
+    pool = None
+    if workers != 1:
+        import multiprocessing, collections
+        if workers <= 0:
+            workers = multiprocessing.cpu_count()
+        pool = multiprocessing.Pool(workers)
+        pending = collections.deque()  # results of the inputs submitted, in input order
+    try:
+        item = readQueue.get()
+        while item is not None:
+            if pool:
+                pending.append(pool.apply_async(BuildBatchOutputs,(item,)))
+                while len(pending) >= workers + int(depth):
+                    writeQueue.put(pending.popleft().get())
+            else:
+                writeQueue.put(BuildBatchOutputs(item))
+            item = readQueue.get()
+        while pool and pending:
+            writeQueue.put(pending.popleft().get())
+        writeQueue.put(None)
+        writer.join()
+        if pool:
+            pool.close()
+    except:
+        if pool:
+            pool.terminate()
+        raise
+    finally:
+        if pool:
+            pool.join()
+    return statuses
+
+def WriteBatchSummary(statuses,OUTFILE):  # Prints one tab-delimited line per job, then the totals
+    OUTFILE.write("%s\t%s\t%s\t%s\t%s\n" % ("status","seconds","input","mssa","message"))
+    counts = {STATUS_OK:0, STATUS_WARNING:0, STATUS_FAILED:0}
+    for status in statuses:
+        counts[status["status"]] += 1
+        OUTFILE.write("%s\t%.3f\t%s\t%s\t%s\n" % (status["status"],status["seconds"],status["input"],status["mssa"],status["message"]))
+    OUTFILE.write("%s%s%s%s%s%s%s%s\n" % ("Jobs: ",len(statuses),"  OK: ",counts[STATUS_OK],"  WARNING: ",counts[STATUS_WARNING],"  FAILED: ",counts[STATUS_FAILED]))
+
+def main(argv):
+    directory = None
+    manifest  = None
+    inFormat  = combAlign.DEFAULT_FORMAT
+    outFormat = combAlign.DEFAULT_OUTPUT_FORMAT
+    width     = combAlign.DEFAULT_WIDTH
+    outDir    = DEFAULT_OUTDIR
+    workers   = DEFAULT_WORKERS
+    pipeline  = False
+    depth     = DEFAULT_DEPTH
+
+    for i in range(1,len(argv)):
+        if argv[i].lower() in ('help','usage'):
+            print USAGE_STRING
+            return 0
+        if '=' in argv[i]:
+            (parameter,value) = argv[i].split('=',1)
+            parameter = parameter.lower()
+            if parameter == 'dir':
+                directory = value
+            if parameter == 'manifest':
+                manifest = value
+            if parameter == 'in_format' or parameter == 'input':
+                inFormat = value
+            if parameter == 'out_format' or parameter == 'output':
+                outFormat = value
+            if parameter == 'width' or parameter == 'length':
+                width = value
+            if parameter == 'outdir':
+                outDir = value
+            if parameter == 'workers':
+                workers = value
+            if parameter == 'pipeline':
+                pipeline = value.lower() in ('yes','true','1')
+            if parameter == 'depth':
+                depth = value
+
+    if not directory and not manifest:
+        print "Please provide a directory (dir=) or manifest (manifest=) of input files."
+        print USAGE_STRING
+        return 0
+    if inFormat not in combAlign.ACCEPTABLE_INPUT_FORMATS:
+        print "Please use an acceptable format:", combAlign.ACCEPTABLE_INPUT_FORMATS
+        return 0
+    if not combAlign.CheckOutputFormats(outFormat):
+        print "Please request an acceptable output format:", combAlign.ACCEPTABLE_OUTPUT_FORMATS
+        return 0
+    if not str(workers).isdigit():
+        print "Please request a number of worker processes (0 for one per cpu)."
+        return 0
+    if not str(depth).isdigit() or int(depth) < 1:
+        print "Please request a pipeline depth of at least 1."
+        return 0
+
+    inputs = ListBatchInputs(directory,manifest,inFormat)
+    if pipeline:
+        statuses = PipelineBatch(inputs,outDir,outFormat,width,workers,depth,combAlign.CHATTY)
+    else:
+        statuses = BuildBatch(inputs,outDir,outFormat,width,workers,combAlign.CHATTY)
+    SUMMARYFILE = open(os.path.join(outDir,SUMMARY_FILE),"w")
+    WriteBatchSummary(statuses,SUMMARYFILE)
+    SUMMARYFILE.close()
+    WriteBatchSummary(statuses,sys.stdout)
+    for status in statuses:
+        if status["status"] == STATUS_FAILED:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,357 @@
+#############################################################################################
+# Module:  combAlignBenchmark.py
+# Version No.: 1.1
+#
+# Description:  This code benchmarks the stages of combAlign on synthetic input. A generator
+# produces realistic combAlign input files, in TM-align or DaliLite format, for a reference of
+# given length aligned to a given number of partner structures. The lengths of insertion loops
+# (gaps in the reference) follow a geometric distribution of given mean, occurring at a given
+# rate per reference residue, and a given fraction of reference residues is deleted (gapped) in
+# each partner. For each size in a sweep of reference lengths and partner counts, the input is
+# generated, and the following stages are timed separately:
+#   parse  - reading the input file with pairwise.PairwiseReader
+#   add    - Alignment.AddAlignment for each pairwise alignment
+#   create - Alignment.CreateAlignmentStrings
+#   print  - Alignment.PrintDisplayStrings2file
+# Each size is run in a fresh worker process, so that its peak memory (maximum resident set
+# size) can be reported. Optionally, the whole mssa written by combAlign (function
+# combAlign.BuildMSSA, which parses, maps, builds, and renders) is checked against that written
+# by the original program (combAlign.py and alignment.py, version 1.1), which is read from git
+# revision ORIGINAL_REVISION of this repository and run on the same input file; the check
+# therefore needs a git checkout of combAlign. Results are written as JSON, so that runs may be
+# compared over time.
+#
+# Copyright 2014 by Carol L. Ecale Zhou, Lawrence Livermore National Security. All Rights
+# Reserved. Permission to use, copy, modify, and distribute this software and its
+# documentation for educational, research, and not-for-profit purposes, without fee and
+# without a signed licensing agreement, is hereby granted, provided that the above
+# copyright notice, this paragraph and the following two paragraphs appear in all copies,
+# modifications, and distributions. Contact Office of XXXX, Lawrence Livermore National
+# Security for commercial licensing opportunities.
+#    In no event shall LLNS be liable to any party for direct, indirect, special, incidental,
+# or consequential damages, including lost profits, arising out of the use of this
+# software and its documentation, even if LLNS has been advised of the possibility of
+# such damage.
+#    LLNS disclaims any warranties, including, but no limited to, the implied
+# warranties of merchantability and fitness for a particular purpose. The software and
+# accompanying documentation, if any, provided hereunder is provided "as is", LLNS has
+# no obligation to provide maintenance, support, updates, enhancements, or modifications.
+#############################################################################################
+
+import sys
+import os
+import time
+import random
+import subprocess
+import alignment              # alignment.py module by C. Zhou
+import pairwise               # pairwise.py module; reads input file
+import combAlign              # combAlign.py module; builds and renders one mssa
+
+USAGE_STRING = """Here are some examples for how to run combAlignBenchmark.py:
+
+This command will time all stages for references of 300 and 700 residues, each against 10, 100, and 1000 partners:
+python combAlignBenchmark.py lengths=300,700 partners=10,100,1000 in_format=TM-align out=benchmark.json
+
+This command will also vary the insertion loops and deletions, and check the output against that of the original program:
+python combAlignBenchmark.py lengths=700 partners=100 in_format=DaliLite loop_mean=8 loop_rate=0.05 gap_density=0.1 check=yes
+
+This command will write a synthetic input file, without timing anything:
+python combAlignBenchmark.py generate=my_input lengths=700 partners=50 in_format=DaliLite
+"""
+
+DEFAULT_LENGTHS     = "300,700"
+DEFAULT_PARTNERS    = "10,100,1000"
+DEFAULT_LOOP_MEAN   = 4.0     # mean length of an insertion loop
+DEFAULT_LOOP_RATE   = 0.03    # probability of a loop ahead of any reference residue
+DEFAULT_GAP_DENSITY = 0.05    # fraction of reference residues deleted in a partner
+DEFAULT_WIDTH       = 80
+DEFAULT_OUT         = "combAlign_benchmark.json"
+CHECK_LIMIT         = 200000  # largest reference length x partner count checked against the original program
+ORIGINAL_REVISION   = "a85db7d"  # git revision holding the original program (version 1.1)
+ORIGINAL_FILES      = ("combAlign.py","alignment.py")  # the original program and the module it imports
+REPOSITORY_DIR      = os.path.dirname(os.path.abspath(__file__))
+ORIGINAL_MSSA       = "combAlign.mssa"  # written by the original program to its working directory
+RESIDUES            = "ACDEFGHIKLMNPQRSTVWY"
+DL_BLOCK            = 60      # columns per Dali Lite block
+TM_ALIGN            = "TM-align"
+DALI_LITE           = "DaliLite"
+
+def LoopLength(rng,loopMean):  # Draws a loop length from a geometric distribution with mean loopMean
+    length = 1
+    while rng.random() > 1.0 / loopMean:
+        length += 1
+    return length
+
+def GeneratePairwise(rng,refSequence,loopMean,loopRate,gapDensity,gapChar):
+    # Returns (referenceLine, correspondenceLine, matchLine) aligning refSequence to a synthetic
+    # partner, in which the partner has loops ahead of some reference residues, and deletions
+    # opposite others. A mutated residue is strongly (':') or weakly ('.') corresponding.
+    reference = []
+    correspondence = []
+    match = []
+    for refChar in refSequence:
+        if rng.random() < loopRate:
+            for i in xrange(0,LoopLength(rng,loopMean)):
+                reference.append(gapChar)
+                correspondence.append(' ')
+                match.append(rng.choice(RESIDUES))
+        reference.append(refChar)
+        if rng.random() < gapDensity:
+            correspondence.append(' ')
+            match.append(gapChar)
+        elif rng.random() < 0.7:
+            correspondence.append(':')
+            match.append(refChar)
+        else:
+            correspondence.append('.')
+            match.append(rng.choice(RESIDUES))
+    return (''.join(reference), ''.join(correspondence), ''.join(match))
+
+def GenerateInput(OUTFILE,inFormat,refLength,partners,loopMean=DEFAULT_LOOP_MEAN,loopRate=DEFAULT_LOOP_RATE,gapDensity=DEFAULT_GAP_DENSITY,seed=1):
+    # Function GenerateInput() writes a synthetic combAlign input file, in TM-align or DaliLite
+    # format, comprising a reference of refLength residues and its alignments to partners.
+    rng = random.Random(seed)
+    refSequence = ''.join([rng.choice(RESIDUES) for i in xrange(0,refLength)])
+    OUTFILE.write("REFERENCE Synthetic_reference\n>Synthetic_%s\n" % (refLength))
+    for start in xrange(0,refLength,70):
+        OUTFILE.write("%s\n" % (refSequence[start:start+70]))
+    for j in xrange(0,partners):
+        OUTFILE.write("ALIGNMENT Partner_%s\n" % (j+1))
+        if inFormat == DALI_LITE:
+            (reference, correspondence, match) = GeneratePairwise(rng,refSequence,loopMean,loopRate,gapDensity,'.')
+            correspondence = correspondence.replace(':','|').replace('.',' ')
+            for start in xrange(0,len(reference),DL_BLOCK):
+                end = start + DL_BLOCK
+                dssp = 'L' * len(reference[start:end])
+                OUTFILE.write("DSSP  %s\nQuery %s\nident %s\nSbjct %s\nDSSP  %s\n\n\n" % (
+                    dssp, reference[start:end], correspondence[start:end], match[start:end], dssp))
+        else:
+            (reference, correspondence, match) = GeneratePairwise(rng,refSequence,loopMean,loopRate,gapDensity,'-')
+            OUTFILE.write("%s\n%s\n%s\n" % (reference, correspondence, match))
+    OUTFILE.write("END\n")
+
+def PeakMemoryKB():  # Returns maximum resident set size of this process, in kilobytes
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":  # reported in bytes
+        peak = peak / 1024
+    return peak
+
+def ExtractOriginal(workDir):  # Writes the files of the original program, read from git, to directory workDir
+    for name in ORIGINAL_FILES:
+        source = subprocess.check_output(["git","show","%s:%s" % (ORIGINAL_REVISION,name)],cwd=REPOSITORY_DIR)
+        OUTFILE = open(os.path.join(workDir,name),"wb")
+        OUTFILE.write(source)
+        OUTFILE.close()
+
+def OriginalAvailable():  # Returns True if the original program can be read from git
+    DEVNULL = open(os.devnull,"w")
+    try:
+        for name in ORIGINAL_FILES:
+            subprocess.check_call(["git","cat-file","-e","%s:%s" % (ORIGINAL_REVISION,name)],
+                                  cwd=REPOSITORY_DIR,stdout=DEVNULL,stderr=DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return False
+    finally:
+        DEVNULL.close()
+    return True
+
+def RunOriginal(inFile,inFormat,width):
+    # Function RunOriginal() runs the original combAlign program, read from git, on an input
+    # file, in a temporary working directory, and returns the mssa it writes.
+    import tempfile, shutil
+    workDir = tempfile.mkdtemp(prefix="combAlign_original_")
+    try:
+        ExtractOriginal(workDir)
+        DEVNULL = open(os.devnull,"w")
+        try:
+            subprocess.check_call([sys.executable,os.path.join(workDir,ORIGINAL_FILES[0]),"file=" + os.path.abspath(inFile),
+                                   "in_format=" + inFormat,"out_format=" + alignment.STANDARD,"width=%s" % (width)],
+                                  cwd=workDir,stdout=DEVNULL,stderr=DEVNULL)
+        finally:
+            DEVNULL.close()
+        MSSAFILE = open(os.path.join(workDir,ORIGINAL_MSSA),"r")
+        mssa = MSSAFILE.read()
+        MSSAFILE.close()
+    finally:
+        shutil.rmtree(workDir)
+    return mssa
+
+def RunCase(case):
+    # Function RunCase() generates the input for one size, and times each stage; it is run in
+    # a fresh worker process. Returns a dict of parameters, timings, and peak memory.
+    import tempfile
+    (handle, inFile) = tempfile.mkstemp(suffix=".combAlign")
+    INFILE = os.fdopen(handle,"w")
+    GenerateInput(INFILE,case["inFormat"],case["refLength"],case["partners"],case["loopMean"],case["loopRate"],case["gapDensity"],case["seed"])
+    INFILE.close()
+    result = dict(case)
+    result["inputBytes"] = os.path.getsize(inFile)
+    try:
+        startMemory = PeakMemoryKB()
+        start = time.time()
+        INFILE = open(inFile,"r")
+        reader = pairwise.PairwiseReader(INFILE,case["inFormat"])
+        refSeq = reader.ReadReference()
+        pairwiseList = list(reader.Alignments())
+        INFILE.close()
+        result["parseSeconds"] = time.time() - start
+
+        start = time.time()
+        myAlignment = alignment.Alignment(case["inFormat"])
+        myAlignment.EnterReference(refSeq)
+        for nextPairwise in pairwiseList:
+            myAlignment.AddAlignment(nextPairwise)
+        result["addSeconds"] = time.time() - start
+        del pairwiseList
+
+        start = time.time()
+        myAlignment.CreateAlignmentStrings()
+        result["createSeconds"] = time.time() - start
+        result["gappedLength"] = len(myAlignment.refDisplayString)
+
+        OUTFILE = open(os.devnull,"w")
+        start = time.time()
+        myAlignment.PrintDisplayStrings2file(OUTFILE,case["width"])
+        result["printSeconds"] = time.time() - start
+        OUTFILE.close()
+        result["peakMemoryKB"] = PeakMemoryKB()
+        result["startMemoryKB"] = startMemory
+
+        # Check the whole mssa, from the input file, against that of the original program
+        result["checked"] = False
+        if case["check"] and case["refLength"] * case["partners"] <= CHECK_LIMIT:
+            del myAlignment
+            mssa = combAlign.BuildMSSA(inFile,case["inFormat"],alignment.STANDARD,case["width"]).Render()
+            result["checked"] = True
+            result["matchesOriginal"] = (mssa == RunOriginal(inFile,case["inFormat"],case["width"]))
+    finally:
+        os.remove(inFile)
+    return result
+
+def RunBenchmark(lengths,partnerCounts,inFormat=TM_ALIGN,loopMean=DEFAULT_LOOP_MEAN,loopRate=DEFAULT_LOOP_RATE,gapDensity=DEFAULT_GAP_DENSITY,width=DEFAULT_WIDTH,check=False,seed=1,chatty=False):
+    # Function RunBenchmark() runs one case per (reference length, partner count) in the
+    # sweep, each in a fresh worker process, and returns the list of case results.
+    import multiprocessing
+    results = []
+    for refLength in lengths:
+        for partners in partnerCounts:
+            case = {
+                "inFormat"   : inFormat,
+                "refLength"  : refLength,
+                "partners"   : partners,
+                "loopMean"   : loopMean,
+                "loopRate"   : loopRate,
+                "gapDensity" : gapDensity,
+                "width"      : width,
+                "check"      : check,
+                "seed"       : seed,
+                }
+            pool = multiprocessing.Pool(1)
+            try:
+                result = pool.apply(RunCase,(case,))
+            finally:
+                pool.close()
+                pool.join()
+            results.append(result)
+            if chatty:
+                print "length %6s  partners %6s  parse %8.3fs  add %8.3fs  create %8.3fs  print %8.3fs  peak %8s KB%s" % (
+                    refLength, partners, result["parseSeconds"], result["addSeconds"], result["createSeconds"],
+                    result["printSeconds"], result["peakMemoryKB"],
+                    result["checked"] and ("  matches original: %s" % (result["matchesOriginal"])) or "")
+    return results
+
+def WriteResults(results,outFile):  # Writes the results of a run, with a description of the platform, as JSON
+    import json, platform
+    run = {
+        "time"     : time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python"   : platform.python_version(),
+        "platform" : platform.platform(),
+        "engine"   : alignment.LINEAR_ENGINE,
+        "cases"    : results,
+        }
+    OUTFILE = open(outFile,"w")
+    json.dump(run,OUTFILE,indent=2,sort_keys=True)
+    OUTFILE.write("\n")
+    OUTFILE.close()
+
+def main(argv):
+    lengths    = DEFAULT_LENGTHS
+    partners   = DEFAULT_PARTNERS
+    inFormat   = TM_ALIGN
+    loopMean   = DEFAULT_LOOP_MEAN
+    loopRate   = DEFAULT_LOOP_RATE
+    gapDensity = DEFAULT_GAP_DENSITY
+    width      = DEFAULT_WIDTH
+    outFile    = DEFAULT_OUT
+    check      = False
+    seed       = 1
+    generate   = None
+
+    for i in range(1,len(argv)):
+        if argv[i].lower() in ('help','usage'):
+            print USAGE_STRING
+            return 0
+        if '=' in argv[i]:
+            (parameter,value) = argv[i].split('=',1)
+            parameter = parameter.lower()
+            try:
+                if parameter == 'lengths':
+                    lengths = value
+                if parameter == 'partners':
+                    partners = value
+                if parameter == 'in_format' or parameter == 'input':
+                    inFormat = value
+                if parameter == 'loop_mean':
+                    loopMean = float(value)
+                if parameter == 'loop_rate':
+                    loopRate = float(value)
+                if parameter == 'gap_density':
+                    gapDensity = float(value)
+                if parameter == 'width' or parameter == 'length':
+                    width = int(value)
+                if parameter == 'out':
+                    outFile = value
+                if parameter == 'check':
+                    check = value.lower() in ('yes','true','1')
+                if parameter == 'seed':
+                    seed = int(value)
+                if parameter == 'generate':
+                    generate = value
+            except ValueError:
+                print "Please give a number for parameter", parameter
+                return 0
+    try:
+        lengths  = [int(value) for value in str(lengths).split(',')]
+        partners = [int(value) for value in str(partners).split(',')]
+    except ValueError:
+        print "Please give lengths and partners as comma-separated numbers."
+        return 0
+    if inFormat not in (TM_ALIGN, DALI_LITE):
+        print "Please use an acceptable format:", (TM_ALIGN, DALI_LITE)
+        return 0
+    if loopMean < 1.0:
+        print "Please give a mean loop length of at least 1."
+        return 0
+
+    if generate:
+        OUTFILE = open(generate,"w")
+        GenerateInput(OUTFILE,inFormat,lengths[0],partners[0],loopMean,loopRate,gapDensity,seed)
+        OUTFILE.close()
+        return 0
+
+    if check and not OriginalAvailable():
+        print "Cannot read the original program from git revision %s; check=yes needs a git checkout of combAlign." % (ORIGINAL_REVISION)
+        return 0
+
+    results = RunBenchmark(lengths,partners,inFormat,loopMean,loopRate,gapDensity,width,check,seed,True)
+    WriteResults(results,outFile)
+    print "Results are in file", outFile
+    for result in results:
+        if result["checked"] and not result["matchesOriginal"]:
+            print "WARNING: output differs from that of the original program for length", result["refLength"], "partners", result["partners"]
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,321 @@
+#############################################################################################
+# Module:  combAlignServer.py
+# Version No.: 1.1
+#
+# Description:  This code runs combAlign as a long-running local service, so that a program
+# that needs many mssas pays for starting the interpreter, and for building an mssa from a
+# given input, only once. The service listens for HTTP requests on a port of the local host
+# (127.0.0.1) or on a Unix socket, and answers each with an mssa:
+#   POST /mssa?<parameters>   - the body of the request is a combAlign input file (type
+#                               'python combAlign.py input' for a description)
+#   GET  /mssa?file=<path>&<parameters>
+#                             - the input is read from a file (which may be compressed) or a
+#                               directory of unmodified TM-align or DaliLite output files, on
+#                               the host of the service
+#   GET  /status              - counts of requests and cache use, as JSON
+# The parameters are those of combAlign.py: in_format, out_format (one format), width,
+# consensus, region, compact, and, for a directory, reference and ref_fasta. The mssa is
+# returned as text; a request that cannot be met is answered with status 400 and a message.
+#
+# Built mssas are kept, as Alignment objects, in a cache holding the most recently used few,
+# keyed by a hash of the input content and the parameters that affect the build. A request
+# for an mssa already built (in any format, width, or region) is answered by writing it
+# from the cache; the most recently written mssas are themselves cached, so that a repeated
+# request is answered without writing. Mapped pairwise alignments are also kept in memory (see
+# alignmentCache.MemoryAlignmentCache), so that an input sharing most of its alignments with
+# an earlier one (e.g., the same panel with a structure added) maps only the new ones.
+# Requests are served one at a time.
+#
+# Copyright 2014 by Carol L. Ecale Zhou, Lawrence Livermore National Security. All Rights
+# Reserved. Permission to use, copy, modify, and distribute this software and its
+# documentation for educational, research, and not-for-profit purposes, without fee and
+# without a signed licensing agreement, is hereby granted, provided that the above
+# copyright notice, this paragraph and the following two paragraphs appear in all copies,
+# modifications, and distributions. Contact Office of XXXX, Lawrence Livermore National
+# Security for commercial licensing opportunities.
+#    In no event shall LLNS be liable to any party for direct, indirect, special, incidental,
+# or consequential damages, including lost profits, arising out of the use of this
+# software and its documentation, even if LLNS has been advised of the possibility of
+# such damage.
+#    LLNS disclaims any warranties, including, but no limited to, the implied
+# warranties of merchantability and fitness for a particular purpose. The software and
+# accompanying documentation, if any, provided hereunder is provided "as is", LLNS has
+# no obligation to provide maintenance, support, updates, enhancements, or modifications.
+#############################################################################################
+
+import sys
+import os
+import stat
+import hashlib
+import collections
+import cStringIO
+import urlparse
+import BaseHTTPServer
+import SocketServer
+import combAlign              # combAlign.py module; builds one mssa
+import compressedFiles        # compressedFiles.py module; errors reading compressed input
+import alignmentCache         # alignmentCache.py module; mapped alignments kept between builds
+import renderers              # renderers.py module; writes the mssa in each output format
+import rawInput               # rawInput.py module; lists a directory of raw output files
+
+USAGE_STRING = """Here are some examples for how to run combAlignServer.py:
+
+This command will start the service on port 8765 of the local host:
+python combAlignServer.py port=8765
+
+This command will start the service on Unix socket /tmp/combAlign.sock, keeping up to 32 built mssas and 512 megabytes of mapped alignments:
+python combAlignServer.py socket=/tmp/combAlign.sock alignments=32 cache_size=512
+
+These requests (made here with curl) return an mssa built from the input file sent, and from an input file on the host of the service:
+curl --data-binary @my_align_file1 'http://127.0.0.1:8765/mssa?in_format=TM-align&out_format=clustal&width=60'
+curl --unix-socket /tmp/combAlign.sock 'http://localhost/mssa?file=/data/my_align_file2.gz&in_format=DaliLite&region=300-500'
+
+This request returns counts of requests served and of cache use:
+curl 'http://127.0.0.1:8765/status'
+"""
+
+HOST              = "127.0.0.1"  # the service is reachable from the local host only
+DEFAULT_PORT      = 8765
+DEFAULT_ALIGNMENTS = 16          # built mssas kept
+DEFAULT_RENDERS   = 64           # written mssas kept
+MSSA_PATH         = "/mssa"
+STATUS_PATH       = "/status"
+CACHE_HEADER      = "X-CombAlign-Cache"     # 'written' (from the cache of written mssas), 'built' (from the cache of built ones), or 'new'
+FAILURES_HEADER   = "X-CombAlign-Failures"  # number of pairwise alignments that could not be added
+YES_VALUES        = ('yes','true','1')
+
+class RecentlyUsed(object):  # Holds up to maxEntries values by key, discarding the least recently used
+
+    def __init__(self,maxEntries):
+        self.maxEntries = maxEntries
+        self.entries    = collections.OrderedDict()
+        self.hits       = 0
+        self.misses     = 0
+
+    def Get(self,key):  # Returns the value held under key, or None; marks the value as recently used
+        if key not in self.entries:
+            self.misses += 1
+            return None
+        value = self.entries.pop(key)
+        self.entries[key] = value
+        self.hits += 1
+        return value
+
+    def Put(self,key,value):
+        self.entries.pop(key,None)
+        self.entries[key] = value
+        while len(self.entries) > self.maxEntries:
+            self.entries.popitem(last=False)
+
+class MSSAService(object):  # Builds, caches, and writes the mssas requested of the service
+
+    def __init__(self,maxAlignments=DEFAULT_ALIGNMENTS,maxRenders=DEFAULT_RENDERS,cacheBytes=combAlign.DEFAULT_CACHE_BYTES,chatty=False):
+        self.alignments  = RecentlyUsed(maxAlignments)  # build key -> combAlign.MSSAResult
+        self.renders     = RecentlyUsed(maxRenders)     # (build key, format, width, consensus, region) -> mssa text
+        self.mappedCache = alignmentCache.MemoryAlignmentCache(cacheBytes)
+        self.requests    = 0
+        self.chatty      = chatty
+
+    def BuildKey(self,parameters,body):
+        # Method BuildKey() returns the cache key of the mssa built from the input of a request:
+        # a hash of the input (the body of the request, the content of the file named, or the
+        # names, sizes, and times of modification of the files in the directory named) and of
+        # the parameters that affect the build.
+        digest = hashlib.sha1()
+        for name in ('in_format','compact','reference','ref_fasta'):
+            digest.update("%s=%s\0" % (name,parameters.get(name,"")))
+        if body is not None:  # hashed as alignmentCache.InputKey hashes a file, so that the same input sent or named is built once
+            digest.update(hashlib.sha1('\0' + body).hexdigest())
+        elif os.path.isdir(parameters["file"]):
+            for path in rawInput.ListRawFiles(parameters["file"]):
+                info = os.stat(path)
+                digest.update("%s\0%s\0%s\0" % (path,info.st_size,info.st_mtime))
+        else:
+            digest.update(alignmentCache.InputKey(parameters["file"],""))
+        return digest.hexdigest()
+
+    def Build(self,parameters,body):
+        # Method Build() returns (build key, MSSAResult, True if taken from the cache) for the
+        # input of a request. Unacceptable parameters or input raise ValueError or IOError.
+        inFormat = parameters.get('in_format',combAlign.DEFAULT_FORMAT)
+        if inFormat not in combAlign.ACCEPTABLE_INPUT_FORMATS:
+            raise ValueError("Please use an acceptable format: %s" % (combAlign.ACCEPTABLE_INPUT_FORMATS,))
+        if body is None and not parameters.get('file'):
+            raise ValueError("Please send a combAlign input file, or name one (file=).")
+        key = self.BuildKey(parameters,body)
+        result = self.alignments.Get(key)
+        if result:
+            return (key, result, True)
+        if body is None:
+            source = parameters['file']
+        else:
+            source = cStringIO.StringIO(body)
+        result = combAlign.BuildMSSA(source,inFormat,combAlign.DEFAULT_OUTPUT_FORMAT,combAlign.DEFAULT_WIDTH,
+            refFasta=parameters.get('ref_fasta'),referenceName=parameters.get('reference'),
+            compact=parameters.get('compact','').lower() in YES_VALUES,cache=self.mappedCache)
+        self.alignments.Put(key,result)
+        return (key, result, False)
+
+    def Render(self,parameters,body):
+        # Method Render() returns (mssa text, MSSAResult, cache use) for a request, building the
+        # mssa only if it is not in the cache. cache use is one of 'written', 'built', or 'new'.
+        outFormat = parameters.get('out_format',combAlign.DEFAULT_OUTPUT_FORMAT)
+        if outFormat not in combAlign.ACCEPTABLE_OUTPUT_FORMATS:
+            raise ValueError("Please request an acceptable output format: %s" % (combAlign.ACCEPTABLE_OUTPUT_FORMATS,))
+        width = parameters.get('width',str(combAlign.DEFAULT_WIDTH))
+        if combAlign.p_nonDigit.search(width) or not width or int(width) > 255:
+            raise ValueError("Choose a more realistic line width.")
+        consensus = parameters.get('consensus','').lower() in YES_VALUES
+        region = None
+        if parameters.get('region'):
+            region = combAlign.ParseRegion(parameters['region'])
+            if region is None:
+                raise ValueError("Please give the region as first-last reference residue numbers, e.g. region=300-500.")
+        (key, result, built) = self.Build(parameters,body)
+        renderKey = (key, outFormat, int(width), consensus, region)
+        text = self.renders.Get(renderKey)
+        if text is not None:
+            return (text, result, "written")
+        myAlignment = result.alignment
+        myAlignment.SetConsensusLine(consensus)
+        if region:
+            if myAlignment.SetRegion(region[0],region[1]) == 4:
+                raise ValueError("Region %s-%s is not within the reference sequence" % (region[0],region[1]))
+        else:
+            myAlignment.SetRegion(None)
+        OUTFILE = cStringIO.StringIO()
+        renderers.RenderAll(myAlignment,[(outFormat,OUTFILE)],int(width))
+        text = OUTFILE.getvalue()
+        self.renders.Put(renderKey,text)
+        return (text, result, built and "built" or "new")
+
+    def Status(self):  # Returns a dict of counts of requests served and of cache use
+        status = {
+            "requests"         : self.requests,
+            "alignmentsCached" : len(self.alignments.entries),
+            "alignmentHits"    : self.alignments.hits,
+            "alignmentMisses"  : self.alignments.misses,
+            "rendersCached"    : len(self.renders.entries),
+            "renderHits"       : self.renders.hits,
+            "renderMisses"     : self.renders.misses,
+            "mappedBytes"      : self.mappedCache.totalBytes,
+            "mappedHits"       : self.mappedCache.hits,
+            "mappedMisses"     : self.mappedCache.misses,
+            }
+        return status
+
+class MSSARequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.Respond(None)
+
+    def do_POST(self):
+        length = int(self.headers.getheader('content-length') or 0)
+        self.Respond(self.rfile.read(length))
+
+    def Respond(self,body):
+        service = self.server.service
+        service.requests += 1
+        url = urlparse.urlparse(self.path)
+        parameters = dict(urlparse.parse_qsl(url.query))
+        if url.path == STATUS_PATH:
+            import json
+            self.Send(200,json.dumps(service.Status(),sort_keys=True) + "\n","application/json")
+            return
+        if url.path != MSSA_PATH:
+            self.Send(404,"Please request %s or %s\n" % (MSSA_PATH,STATUS_PATH))
+            return
+        try:
+            (text, result, cacheUse) = service.Render(parameters,body)
+        except (ValueError, OSError) + compressedFiles.READ_ERRORS, e:
+            self.Send(400,"%s\n" % (e,))
+            return
+        except Exception, e:  # report, and keep serving
+            self.Send(500,"%s: %s\n" % (e.__class__.__name__,e))
+            return
+        self.Send(200,text,"text/plain",{CACHE_HEADER:cacheUse, FAILURES_HEADER:len(result.failures)})
+
+    def Send(self,code,text,contentType="text/plain",headers={}):
+        self.send_response(code)
+        self.send_header("Content-Type",contentType)
+        self.send_header("Content-Length",len(text))
+        for (name, value) in headers.items():
+            self.send_header(name,value)
+        self.end_headers()
+        self.wfile.write(text)
+
+    def address_string(self):  # Without a name lookup; a client on a Unix socket has no address
+        if isinstance(self.client_address,tuple):
+            return self.client_address[0]
+        return "local"
+
+    def log_message(self,format,*args):
+        if self.server.service.chatty:
+            sys.stderr.write("%s - - [%s] %s\n" % (self.address_string(),self.log_date_time_string(),format % args))
+
+class UnixHTTPServer(SocketServer.UnixStreamServer):  # An HTTP server listening on a Unix socket
+
+    def server_bind(self):
+        SocketServer.UnixStreamServer.server_bind(self)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+def CreateServer(service,port=DEFAULT_PORT,socketPath=None):
+    # Function CreateServer() returns a server, listening on socketPath if given and otherwise
+    # on port of the local host, that answers requests with service (an MSSAService).
+    if socketPath:
+        if os.path.exists(socketPath) and stat.S_ISSOCK(os.stat(socketPath).st_mode):
+            os.remove(socketPath)  # left by an earlier service
+        server = UnixHTTPServer(socketPath,MSSARequestHandler)
+    else:
+        server = BaseHTTPServer.HTTPServer((HOST,port),MSSARequestHandler)
+    server.service = service
+    return server
+
+def main(argv):
+    port          = DEFAULT_PORT
+    socketPath    = None
+    maxAlignments = DEFAULT_ALIGNMENTS
+    maxRenders    = DEFAULT_RENDERS
+    cacheBytes    = combAlign.DEFAULT_CACHE_BYTES
+
+    for i in range(1,len(argv)):
+        if argv[i].lower() in ('help','usage'):
+            print USAGE_STRING
+            return 0
+        if '=' in argv[i]:
+            (parameter,value) = argv[i].split('=',1)
+            parameter = parameter.lower()
+            if parameter == 'socket':
+                socketPath = value
+                continue
+            if combAlign.p_nonDigit.search(value) or not value:
+                print "Please give", parameter, "as a whole number."
+                return 0
+            if parameter == 'port':
+                port = int(value)
+            if parameter == 'alignments':
+                maxAlignments = int(value)
+            if parameter == 'renders':
+                maxRenders = int(value)
+            if parameter == 'cache_size':  # in megabytes
+                cacheBytes = int(value) * 1024 * 1024
+
+    service = MSSAService(maxAlignments,maxRenders,cacheBytes,combAlign.CHATTY)
+    server = CreateServer(service,port,socketPath)
+    if combAlign.CHATTY:
+        if socketPath:
+            print "Serving mssas on Unix socket", socketPath
+        else:
+            print "Serving mssas at http://%s:%s%s" % (HOST,port,MSSA_PATH)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+    if socketPath and os.path.exists(socketPath):
+        os.remove(socketPath)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,170 @@
+#################################################################################################
+# Module:  compactRows.py
+# Version No.: 1.1
+#
+# Description: This module contains a compact encoding of the display strings of an alignment.
+# Class: CompactRow
+#
+# A CompactRow holds the match and correspondence display strings of one aligned structure in
+# encoded form, and is indexed like the stringPair dict it replaces (row["match"],
+# row["correspondence"]); a string is decoded only when it is requested. The encoding is:
+#   match          - the residues (one byte each), without gaps, plus the gap ('-') runs of the
+#                    string, as the column at which each run starts and the number of residues
+#                    ahead of it (from which the run's length follows). If a string has so many
+#                    short gap runs that listing them would take more space than the gaps
+#                    themselves, the string is instead held as is.
+#   correspondence - the characters of the string, each coded as its index in the string's own
+#                    alphabet (e.g., ' .:*'), packed four 2-bit codes to a byte. If the string
+#                    has more than four distinct characters, it is held as is.
+# Method Segment decodes only the columns requested: the gap run at or ahead of the first column
+# is found by bisection, and gives the residue at which to start, so that the cost of a segment
+# is that of its own columns, and an alignment may be printed one segment at a time without
+# decoding each whole string (or the string up to the segment) once per segment.
+#
+# Copyright 2014 by Carol L. Ecale Zhou, Lawrence Livermore National Security.  All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational,
+# research, and not-for-profit purposes, without fee and without a signed licensing agreement, is
+# hereby granted, provided that the above copyright notice, this paragraph and the following two
+# paragraphs appear in all copies, modifications, and distributions. Contact Office of XXXX,
+# Lawrence Livermore National Security (LLNS) for commercial licensing opportunities.
+#    In no event shall LLNS be liable to any party for direct, indirect, special, incidental, or
+# consequential damages, including lost profits, arising out of the use of this software and its
+# documentation, even if LLNS has been advised of the possibility of such damage.
+#    LLNL disclaims any warranties, including, but not limited to, the implied warranties of
+# merchantability and fitness for a particular purpose. The software and accompanying documentation
+# if any, provided hereunder is provided "as is", LLNS has no obligation to provide maintenance,
+# support, updates, enhancements, or modifications.
+##################################################################################################
+
+import re, string, bisect
+from array import array
+
+MATCH          = "match"           # keys of a stringPair
+CORRESPONDENCE = "correspondence"
+CODES          = "\x00\x01\x02\x03"  # 2-bit codes of the (up to) four characters of an alphabet
+
+# Tables for packing four codes to a byte, and unpacking a byte to four codes
+PACK   = {}
+UNPACK = []
+for byte in xrange(0,256):
+    codes = ''.join([CODES[(byte >> shift) & 3] for shift in (6,4,2,0)])
+    PACK[codes] = chr(byte)
+    UNPACK.append(codes)
+UNPACK = dict([(chr(byte),UNPACK[byte]) for byte in xrange(0,256)])
+
+# PATTERNS
+p_gapRun      = re.compile('-+')
+p_fourCodes   = re.compile('....',re.S)
+
+def PackCorrespondence(correspondence):  # Returns (alphabet, packed codes) of a correspondence string, or (None, string)
+    alphabet = ''.join(sorted(set(correspondence)))
+    if len(alphabet) > len(CODES):
+        return (None, correspondence)
+    codes = correspondence.translate(string.maketrans(alphabet,CODES[:len(alphabet)]))
+    codes += CODES[0] * (-len(codes) % 4)
+    return (alphabet, ''.join(map(PACK.__getitem__,p_fourCodes.findall(codes))))
+
+def UnpackCorrespondence(alphabet,packed,start,end):  # Returns columns start:end of a packed correspondence string
+    codes = ''.join(map(UNPACK.__getitem__,packed[start/4:(end+3)/4]))
+    codes = codes[start%4:start%4+end-start]
+    return codes.translate(string.maketrans(CODES[:len(alphabet)],alphabet))
+
+class CompactRow(object):  # The match and correspondence display strings of one aligned structure, encoded
+
+    __slots__ = ("length", "residues", "gapStarts", "gapResidues", "alphabet", "packed")
+
+    def __init__(self,match="",correspondence=""):
+        self[MATCH] = match
+        self[CORRESPONDENCE] = correspondence
+
+    def __setitem__(self,key,value):
+        if key == MATCH:
+            self.length = len(value)
+            starts   = array('I')  # column of each gap run
+            residues = array('I')  # residues ahead of each gap run
+            gapCount = 0
+            for gap in p_gapRun.finditer(value):
+                starts.append(gap.start())
+                residues.append(gap.start() - gapCount)
+                gapCount += gap.end() - gap.start()
+            if 2 * starts.itemsize * len(starts) < gapCount:
+                self.residues    = value.replace('-','')
+                self.gapStarts   = starts
+                self.gapResidues = residues
+            else:  # run-length encoding would not save space
+                self.residues    = value
+                self.gapStarts   = None
+                self.gapResidues = None
+        elif key == CORRESPONDENCE:
+            (self.alphabet, self.packed) = PackCorrespondence(value)
+        else:
+            raise KeyError(key)
+
+    def __getitem__(self,key):
+        return self.Segment(key,0,self.length)
+
+    def GapEnd(self,k):  # Returns the column following gap run k of the match string
+        if k + 1 < len(self.gapStarts):
+            gapsThrough = self.gapStarts[k+1] - self.gapResidues[k+1]  # gaps ahead of the next run
+        else:
+            gapsThrough = self.length - len(self.residues)
+        return self.gapResidues[k] + gapsThrough
+
+    def Segment(self,key,start,end):  # Returns columns start:end of the match or correspondence string
+        end = min(end,self.length)
+        if key == CORRESPONDENCE:
+            if self.alphabet is None:
+                return self.packed[start:end]
+            return UnpackCorrespondence(self.alphabet,self.packed,start,end)
+        if key != MATCH:
+            raise KeyError(key)
+        if self.gapStarts is None:
+            return self.residues[start:end]
+        if start >= end:
+            return ""
+        pieces = []
+        starts = self.gapStarts
+        col = start  # column of the string reached so far
+        k = bisect.bisect_right(starts,start) - 1  # last gap run starting at or ahead of start
+        if k < 0:
+            res = start  # index of the residue at column col
+        else:
+            gapEnd = self.GapEnd(k)
+            res = self.gapResidues[k] + max(start-gapEnd,0)
+            if start < gapEnd:  # start is within gap run k
+                col = min(gapEnd,end)
+                pieces.append('-' * (col - start))
+        k += 1
+        while col < end:
+            if k < len(starts) and starts[k] < end:
+                pieces.append(self.residues[res:res+starts[k]-col])
+                res += starts[k] - col
+                gapEnd = min(self.GapEnd(k),end)
+                pieces.append('-' * (gapEnd - starts[k]))
+                col = gapEnd
+                k += 1
+            else:
+                pieces.append(self.residues[res:res+end-col])
+                col = end
+        return ''.join(pieces)
+
+    def __getstate__(self):
+        return dict([(slot, getattr(self,slot)) for slot in self.__slots__])
+
+    def __setstate__(self,state):  # Restores a row from a saved alignment (see alignment.SaveState)
+        for (slot, value) in state.items():
+            setattr(self,slot,value)
+
+    def __eq__(self,other):
+        try:
+            return self[MATCH] == other[MATCH] and self[CORRESPONDENCE] == other[CORRESPONDENCE]
+        except (KeyError, TypeError):
+            return False
+
+    def __ne__(self,other):
+        return not self.__eq__(other)
+
+def RowSegment(stringPair,key,start,end):  # Returns columns start:end of a stringPair dict's, or a row object's (e.g., CompactRow's), string
+    if isinstance(stringPair,dict):
+        return stringPair[key][start:end]
+    return stringPair.Segment(key,start,end)
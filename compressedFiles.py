@@ -0,0 +1,109 @@
+#################################################################################################
+# Module:  compressedFiles.py
+# Version No.: 1.1
+#
+# Description: This module opens input and output files that may be compressed with gzip, bzip2,
+# or xz, so that combAlign may read and write them as streams, without decompressing them to
+# (or compressing them from) a temporary file.
+#
+# Function OpenInput() determines the compression of a file from its name (.gz, .bz2, or .xz) or,
+# failing that, from the magic bytes at its start, and returns a file object from which the
+# uncompressed text is read, line by line, as from a plain file. Function OpenOutput() returns a
+# file object whose writes are compressed as they are made, according to the suffix of the file
+# name; a name with no compression suffix is opened as a plain file. xz compression requires the
+# lzma module (on python 2, the backports.lzma package), which is imported only when needed.
+# A truncated or corrupt compressed file raises EOFError or zlib.error, rather than IOError, as
+# it is read; READ_ERRORS lists the exceptions to catch to report an unreadable input.
+#
+# Copyright 2014 by Carol L. Ecale Zhou, Lawrence Livermore National Security.  All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational,
+# research, and not-for-profit purposes, without fee and without a signed licensing agreement, is
+# hereby granted, provided that the above copyright notice, this paragraph and the following two
+# paragraphs appear in all copies, modifications, and distributions. Contact Office of XXXX,
+# Lawrence Livermore National Security (LLNS) for commercial licensing opportunities.
+#    In no event shall LLNS be liable to any party for direct, indirect, special, incidental, or
+# consequential damages, including lost profits, arising out of the use of this software and its
+# documentation, even if LLNS has been advised of the possibility of such damage.
+#    LLNL disclaims any warranties, including, but not limited to, the implied warranties of
+# merchantability and fitness for a particular purpose. The software and accompanying documentation
+# if any, provided hereunder is provided "as is", LLNS has no obligation to provide maintenance,
+# support, updates, enhancements, or modifications.
+##################################################################################################
+
+import os, io, zlib
+
+GZIP         = "gz"
+BZIP2        = "bz2"
+XZ           = "xz"
+ACCEPTABLE_COMPRESSIONS = (GZIP, BZIP2, XZ)
+SUFFIXES     = {GZIP:".gz", BZIP2:".bz2", XZ:".xz"}
+MAGIC_BYTES  = ((GZIP,"\x1f\x8b"), (BZIP2,"BZh"), (XZ,"\xfd7zXZ\x00"))
+MAGIC_LENGTH = 6
+GZIP_LEVEL   = 6              # gzip's own default; faster than zlib's maximum, little larger
+BUFFER_SIZE  = 1024 * 1024    # bytes read from a compressed stream at a time
+READ_ERRORS  = (IOError, EOFError, zlib.error)  # raised by a missing, unreadable, or truncated input
+
+def ImportLzma():  # Returns the lzma module, or raises IOError if it is not installed
+    try:
+        import lzma
+    except ImportError:
+        try:
+            from backports import lzma
+        except ImportError:
+            raise IOError("Reading or writing xz files requires the lzma module (on python 2, install backports.lzma)")
+    return lzma
+
+def SuffixCompression(fileName):  # Returns the compression indicated by fileName's suffix, or None
+    for (compression, suffix) in SUFFIXES.items():
+        if fileName.endswith(suffix):
+            return compression
+    return None
+
+def MagicCompression(fileName):  # Returns the compression indicated by the first bytes of a file, or None
+    INFILE = open(fileName,"rb")
+    start = INFILE.read(MAGIC_LENGTH)
+    INFILE.close()
+    for (compression, magic) in MAGIC_BYTES:
+        if start.startswith(magic):
+            return compression
+    return None
+
+def SplitCompressionSuffix(fileName):  # Returns (fileName without its compression suffix, suffix)
+    compression = SuffixCompression(fileName)
+    if compression is None:
+        return (fileName, "")
+    suffix = SUFFIXES[compression]
+    return (fileName[:-len(suffix)], suffix)
+
+def OpenInput(fileName):
+    # Function OpenInput() opens a file, compressed or not, for reading as text. The compression
+    # is taken from the file's suffix, or else from its magic bytes.
+    compression = SuffixCompression(fileName) or MagicCompression(fileName)
+    if compression == GZIP:
+        import gzip
+        return io.BufferedReader(gzip.GzipFile(fileName,"rb"),BUFFER_SIZE)
+    if compression == BZIP2:
+        import bz2
+        return bz2.BZ2File(fileName,"r",BUFFER_SIZE)
+    if compression == XZ:
+        return io.BufferedReader(ImportLzma().LZMAFile(fileName,"rb"),BUFFER_SIZE)
+    return open(fileName,"r")
+
+def OpenOutput(fileName):
+    # Function OpenOutput() opens a file for writing, compressing what is written according to
+    # the file's suffix (none, if it has no compression suffix).
+    compression = SuffixCompression(fileName)
+    if compression == GZIP:
+        import gzip
+        return gzip.GzipFile(fileName,"wb",GZIP_LEVEL)
+    if compression == BZIP2:
+        import bz2
+        return bz2.BZ2File(fileName,"w")
+    if compression == XZ:
+        return ImportLzma().LZMAFile(fileName,"wb")
+    return open(fileName,"w")
+
+def AddCompressionSuffix(fileName,compression):  # Returns fileName with the suffix of compression, if it lacks one
+    if not compression or SuffixCompression(fileName):
+        return fileName
+    return fileName + SUFFIXES[compression]
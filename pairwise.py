@@ -0,0 +1,359 @@
+#################################################################################################
+# Module:  pairwise.py
+# Version No.: 1.1
+#
+# Description: This module contains a streaming reader for combAlign input files.
+# Class: PairwiseReader
+#
+# A combAlign input file comprises a reference sequence in fasta format, preceded by a
+# 'REFERENCE' line, followed by a set of pairwise alignments, each preceded by an 'ALIGNMENT'
+# line, and terminated by 'END' (type 'python combAlign.py input' for details).
+# Class PairwiseReader is intended to be used as follows:
+#   1) Construct a reader on an open input file, given the input format (TM-align or DaliLite)
+#   2) Obtain the reference sequence using method ReadReference; the returned refSeq dict is
+#      suitable for Alignment.EnterReference
+#   3) Iterate over method Alignments, which yields one completed pairwise dict at a time,
+#      suitable for Alignment.AddAlignment. For Dali Lite input, each pairwise dict also carries
+#      per-residue flags (fields referenceUnaligned and matchUnaligned) marking the residues that
+#      Dali Lite reports in lowercase, i.e., residues that are not structurally equivalenced.
+#      The flags are indexed by residue, not by alignment column: referenceUnaligned[i] is 1 if
+#      residue i of the reference sequence (numbered from 0) is unaligned, and matchUnaligned[k]
+#      likewise for residue k of the aligned structure; gap columns have no flag
+# An 'ALIGNMENT' line may end with the scores of its alignment, as name=value fields, e.g.
+#    ALIGNMENT Bundibugyo TM-score=0.712 RMSD=2.10 aligned_length=280
+# The scores recognized are listed in SCORE_ALIASES; each pairwise dict carries those given on
+# its 'ALIGNMENT' line (field scores, a dict of score name -> value). Function FailedThreshold
+# tests the scores of an alignment against thresholds such as min_tm or min_z (see
+# SCORE_THRESHOLDS), so that weak alignments may be skipped before they are mapped.
+# The input file is read one line at a time, so that no more than one pairwise alignment is
+# held in memory, regardless of the size of the input file.
+#
+# Copyright 2014 by Carol L. Ecale Zhou, Lawrence Livermore National Security.  All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational,
+# research, and not-for-profit purposes, without fee and without a signed licensing agreement, is
+# hereby granted, provided that the above copyright notice, this paragraph and the following two
+# paragraphs appear in all copies, modifications, and distributions. Contact Office of XXXX,
+# Lawrence Livermore National Security (LLNS) for commercial licensing opportunities.
+#    In no event shall LLNS be liable to any party for direct, indirect, special, incidental, or
+# consequential damages, including lost profits, arising out of the use of this software and its
+# documentation, even if LLNS has been advised of the possibility of such damage.
+#    LLNL disclaims any warranties, including, but not limited to, the implied warranties of
+# merchantability and fitness for a particular purpose. The software and accompanying documentation
+# if any, provided hereunder is provided "as is", LLNS has no obligation to provide maintenance,
+# support, updates, enhancements, or modifications.
+##################################################################################################
+
+import re
+
+TM_ALIGN           = "TM-align"
+DALI_LITE          = "DaliLite"
+REFERENCE_RECORD   = "reference"  # tags for the records produced by method ParseLines
+ALIGNMENT_RECORD   = "alignment"
+DL_START           = 6     # column number at which Dali Lite alignment data begins
+DL_DSSP            = "DSSP "  # first token (and following column) of each line of a Dali Lite block
+DL_QUERY           = "Query"
+DL_IDENT           = "ident"
+DL_SBJCT           = "Sbjct"
+DL_TAGS            = (DL_DSSP, DL_QUERY, DL_IDENT, DL_SBJCT)
+# Dali Lite marks residues that are not structurally equivalenced in lowercase; translating an
+# alignment line with this table yields its per-residue flags: 1 if unaligned, 0 otherwise.
+DL_UNALIGNED_FLAGS = ''.join([chr(c).islower() and '\x01' or '\x00' for c in xrange(0,256)])
+GAP_CHARACTERS     = "-."  # gaps in an alignment line; removed to give its residues
+
+TM_SCORE           = "TM-score"        # normalized by the length of the reference
+TM_SCORE_MATCH     = "TM-score_match"  # normalized by the length of the match structure
+RMSD               = "RMSD"
+ALIGNED_LENGTH     = "aligned_length"
+Z_SCORE            = "Z-score"
+IDENTITY           = "identity"        # percent identity of the aligned residues
+SCORE_NAMES        = (TM_SCORE, TM_SCORE_MATCH, RMSD, ALIGNED_LENGTH, Z_SCORE, IDENTITY)  # in order printed
+SCORE_ALIASES      = {                 # name of a score (in lowercase) as given -> score
+    "tm-score":TM_SCORE, "tm":TM_SCORE, "tm-score_match":TM_SCORE_MATCH, "rmsd":RMSD,
+    "aligned_length":ALIGNED_LENGTH, "lali":ALIGNED_LENGTH, "z-score":Z_SCORE, "z":Z_SCORE,
+    "identity":IDENTITY, "%id":IDENTITY,
+    }
+MINIMUM            = "minimum"
+MAXIMUM            = "maximum"
+SCORE_THRESHOLDS   = {                 # threshold parameter -> (score, kind of bound)
+    "min_tm"       : (TM_SCORE, MINIMUM),
+    "min_z"        : (Z_SCORE, MINIMUM),
+    "min_identity" : (IDENTITY, MINIMUM),
+    "min_aligned"  : (ALIGNED_LENGTH, MINIMUM),
+    "max_rmsd"     : (RMSD, MAXIMUM),
+    }
+
+# PATTERNS
+p_refName      = re.compile('^REFERENCE\s+(\w+)')
+p_scoreField   = re.compile('(?:^|\s+)([^\s=]+)=(\S+)$')  # last name=value field of a line
+p_scoreFields  = re.compile('([^\s=]+)=\s*([-+\d.eE]+)')  # name=value fields anywhere in a line
+p_sequence     = re.compile('[\w\*]')  # should be letters or '*'
+
+def SplitScores(text):
+    # Function SplitScores() returns (name, scores) of the text following 'ALIGNMENT': the
+    # name of the aligned structure, and a dict of the scores given by the text's trailing
+    # name=value fields. Fields whose name is not that of a score are part of the name.
+    scores = {}
+    text = text.strip()
+    match = p_scoreField.search(text)
+    while match and match.group(1).lower() in SCORE_ALIASES:
+        try:
+            value = float(match.group(2))
+        except ValueError:
+            break
+        scores.setdefault(SCORE_ALIASES[match.group(1).lower()],value)
+        text = text[:match.start()]
+        match = p_scoreField.search(text)
+    return (text.strip(), scores)
+
+def ParseScores(line):  # Returns dict of the scores given by name=value fields anywhere in a line
+    scores = {}
+    for (name, value) in p_scoreFields.findall(line):
+        if name.lower() in SCORE_ALIASES:
+            try:
+                scores.setdefault(SCORE_ALIASES[name.lower()],float(value))
+            except ValueError:
+                pass
+    return scores
+
+def UnalignedFlags(line):  # Returns the per-residue flags of a Dali Lite alignment line: 1 if unaligned (lowercase), 0 otherwise
+    return bytearray(line.translate(DL_UNALIGNED_FLAGS,GAP_CHARACTERS))
+
+def FormatScores(scores):  # Returns the scores of an alignment as name=value fields, in order of SCORE_NAMES
+    return ' '.join(["%s=%g" % (name,scores[name]) for name in SCORE_NAMES if name in scores])
+
+def FailedThreshold(scores,thresholds):
+    # Function FailedThreshold() returns a description of the first of thresholds (a dict of
+    # threshold parameter -> value; see SCORE_THRESHOLDS) that an alignment's scores fail, or
+    # None if they pass them all. An alignment passes a threshold on a score it was not given.
+    for parameter in sorted(thresholds):
+        (name, bound) = SCORE_THRESHOLDS[parameter]
+        if name not in scores:
+            continue
+        if bound == MINIMUM and scores[name] < thresholds[parameter]:
+            return "%s %g is below %g" % (name,scores[name],thresholds[parameter])
+        if bound == MAXIMUM and scores[name] > thresholds[parameter]:
+            return "%s %g is above %g" % (name,scores[name],thresholds[parameter])
+    return None
+
+def InvertPairwise(pairwise,referenceName):
+    # Function InvertPairwise() returns the alignment of a pairwise alignment's match structure
+    # to its reference structure (named referenceName), by exchanging the reference and match
+    # lines; the correspondence line is the same in either direction, as are the scores, but
+    # for the TM-scores normalized by the length of either structure, which are exchanged. The
+    # per-residue flags of a Dali Lite alignment, if any, are exchanged with their lines.
+    inverted = {
+        "matchName"          : referenceName,
+        "referenceLine"      : pairwise["matchLine"],
+        "correspondenceLine" : pairwise["correspondenceLine"],
+        "matchLine"          : pairwise["referenceLine"],
+        "scores"             : dict(pairwise.get("scores",{})),
+        }
+    for (name, other) in ((TM_SCORE, TM_SCORE_MATCH), (TM_SCORE_MATCH, TM_SCORE)):
+        if other in pairwise.get("scores",{}):
+            inverted["scores"][name] = pairwise["scores"][other]
+        else:
+            inverted["scores"].pop(name,None)
+    for (name, other) in (("referenceUnaligned", "matchUnaligned"), ("matchUnaligned", "referenceUnaligned")):
+        if other in pairwise:
+            inverted[name] = pairwise[other]
+    return inverted
+
+class PairwiseReader(object):
+
+    def __init__(self,INFILE,format,LOGFILE=None,chatty=False):
+        self.INFILE    = INFILE    # open input file; read one line at a time
+        self.format    = format    # program used to perform pairwise alignments
+        self.LOGFILE   = LOGFILE   # optional; problems with the input are logged here
+        self.chatty    = chatty    # When True, warnings will be printed
+        self.lineCount = 0         # number of lines read so far
+        self.refSeq = {            # Data pertaining to the sequence of the reference structure
+            "reference" : "",
+            "header"    : "",
+            "sequence"  : "",
+            }
+        self.records   = self.ParseLines()
+        self.pending   = None      # record read ahead of its turn
+
+    def NewPairwise(self,matchName,scores=None):
+        pairwise = {   # dict holding next pairwise alignment
+            "matchName"          : matchName,  # name of sequence aligned to reference
+            "scores"             : scores or {},  # score name -> value, as given (see SCORE_NAMES)
+            "referenceLine"      : "",  # reference sequence (complete) with possible gaps as '-'
+            "correspondenceLine" : "",  # string of characters: blank, '.', or ':'
+            "matchLine"          : "",  # match sequence (maybe incomplete) with possible gaps as '-'
+            }
+        if self.format == DALI_LITE:  # alignment lines are accumulated one block at a time
+            pairwise["referenceFragments"]      = []
+            pairwise["correspondenceFragments"] = []
+            pairwise["matchFragments"]          = []
+            pairwise["blockEnd"] = None
+            pairwise["lastTag"]  = None
+        return pairwise
+
+    def Warn(self,message):
+        if self.chatty:
+            print "WARNING:", message
+        if self.LOGFILE:
+            self.LOGFILE.write("\n%s\n" % (message))
+
+    def NextRecord(self):
+        if self.pending:
+            record = self.pending
+            self.pending = None
+            return record
+        return next(self.records,None)
+
+    def ReadReference(self):  # Returns the next reference refSeq dict, or None if input is exhausted
+        record = self.NextRecord()
+        while record and record[0] != REFERENCE_RECORD:
+            record = self.NextRecord()  # alignments without a preceding reference are skipped
+        if record:
+            return record[1]
+        return None
+
+    def Alignments(self):  # Yields each pairwise dict that follows the current reference
+        record = self.NextRecord()
+        while record:
+            if record[0] == REFERENCE_RECORD:
+                self.pending = record  # belongs to next call to ReadReference
+                return
+            yield record[1]
+            record = self.NextRecord()
+
+    def ParseLines(self):
+        # Method ParseLines() walks the input file one line at a time, and yields a tagged
+        # record as soon as it is complete: (REFERENCE_RECORD, refSeq) when the first alignment
+        # following a reference fasta is encountered, and (ALIGNMENT_RECORD, pairwise) when the
+        # next alignment, or 'END', is encountered. Additional formats could be accommodated here.
+
+        # Switches that control handling of input file data lines
+        FASTA = False
+        ALIGN = False
+        DALI  = self.format == DALI_LITE
+        referenceLine      = True  # Bool; controls capture of data line for TM-align format
+        correspondenceLine = False #  "
+        matchLine          = False #  "
+        pairwise = self.NewPairwise("")
+
+        for nextLine in self.INFILE:
+            self.lineCount += 1
+            nextLine = nextLine.rstrip('\r\n')
+
+            if ALIGN and DALI and nextLine[:5] in DL_TAGS:
+                self.ReadDaliLine(nextLine,pairwise)
+                continue
+
+            if (nextLine == '' or nextLine.startswith('#')):  # comment line starts with '#'
+                continue  # skip blank and comment lines
+            i = self.lineCount - 1  # index of the current line
+
+            # Check if end of data input is reached
+            if nextLine.startswith('END'):
+                if ALIGN:   # (should be true) save away current alignment data
+                    yield (ALIGNMENT_RECORD, self.CompletePairwise(pairwise))
+                    ALIGN = False
+                else:
+                    self.Warn("%s %s" % ("Problem with input data file at line", i))
+                return  # this should be last line of data anyway
+
+            # Check if alignment is next
+            if nextLine.startswith('ALIGNMENT'):
+                fields = nextLine.split(None,1)
+                if len(fields) > 1:
+                    (matchName, scores) = SplitScores(fields[1])
+                else:
+                    (matchName, scores) = ("", {})
+                if ALIGN:  # If ALIGN flag is 'on', then last data item was the previous alignment
+                    yield (ALIGNMENT_RECORD, self.CompletePairwise(pairwise))
+                elif FASTA:  # If FASTA flag still 'on', then last data item was the reference fasta
+                    yield (REFERENCE_RECORD, self.refSeq)
+                    FASTA = False  # done!, and there should be only one fasta per reference
+                    ALIGN = True
+                else:
+                    self.Warn("%s %s" % ("Problem with input file at line", i))
+                    continue
+                pairwise = self.NewPairwise(matchName,scores)
+                referenceLine      = True
+                correspondenceLine = False
+                matchLine          = False
+                continue
+
+            # Check if fasta header is next
+            if nextLine.startswith('REFERENCE'): # Reference fasta is next
+                if ALIGN:  # wrap up last alignment of previous reference
+                    yield (ALIGNMENT_RECORD, self.CompletePairwise(pairwise))
+                FASTA = True
+                ALIGN = False
+                self.refSeq = {"reference":"", "header":"", "sequence":""}
+                match = p_refName.match(nextLine)
+                if match:
+                    self.refSeq["reference"] = match.group(1)
+                continue
+
+            if FASTA:  # Capture fasta data
+
+                # Check if it's a header line
+                if nextLine.startswith('>'):
+                    self.refSeq["header"] = nextLine
+                    if (self.refSeq["reference"] == ''):  # use header as reference name if user did not provide
+                        self.refSeq["reference"] = self.refSeq["header"].lstrip('>')
+                    continue
+
+                # Check if it's a sequence line
+                if p_sequence.search(nextLine):
+                    self.refSeq["sequence"] += nextLine
+                    continue
+
+            if ALIGN and not DALI:  # Capture TM-align alignment data
+                if referenceLine:
+                    pairwise["referenceLine"] = nextLine
+                    referenceLine = False
+                    correspondenceLine = True
+                elif correspondenceLine:
+                    pairwise["correspondenceLine"] = nextLine
+                    correspondenceLine = False
+                    matchLine = True
+                elif matchLine:
+                    pairwise["matchLine"] = nextLine
+                    matchLine = False
+                    referenceLine = True
+                continue
+
+        # Input ended without 'END'; the last alignment is nonetheless complete
+        if ALIGN:
+            yield (ALIGNMENT_RECORD, self.CompletePairwise(pairwise))
+
+    def ReadDaliLine(self,nextLine,pairwise):
+        # Method ReadDaliLine() captures one line of a Dali Lite block, which comprises 5 lines,
+        # each recognized by its first token:
+        #   DSSP  lLLLLLLLLLHHHHH   (secondary structure of query; opens the block)
+        #   Query mGSGYQLLQLPRERF   59
+        #   ident        ||||||||
+        #   Sbjct .MVTSGILQLPRERF   58
+        #   DSSP  .LLLLLLLLLHHHHH   (secondary structure of subject; closes the block)
+        # The alignment data occupy the columns spanned by the opening DSSP string; this span is
+        # determined once per block, and used to slice the Query, ident, and Sbjct lines.
+        tag = nextLine[:5]
+        if tag == DL_DSSP:
+            if pairwise["lastTag"] != DL_SBJCT:  # opening line of the next block
+                end = nextLine.find(' ',DL_START)
+                if end < 0:
+                    end = len(nextLine)
+                pairwise["blockEnd"] = end
+        elif tag == DL_QUERY:
+            pairwise["referenceFragments"].append(nextLine[DL_START:pairwise["blockEnd"]])  # fragment of nextLine containing sequence
+        elif tag == DL_IDENT:
+            pairwise["correspondenceFragments"].append(nextLine[DL_START:pairwise["blockEnd"]])
+        else:
+            pairwise["matchFragments"].append(nextLine[DL_START:pairwise["blockEnd"]])
+        pairwise["lastTag"] = tag
+
+    def CompletePairwise(self,pairwise):  # Joins the fragments of a Dali Lite alignment and flags its unaligned residues
+        if "referenceFragments" in pairwise:
+            pairwise["referenceLine"]      = ''.join(pairwise.pop("referenceFragments"))
+            pairwise["correspondenceLine"] = ''.join(pairwise.pop("correspondenceFragments"))
+            pairwise["matchLine"]          = ''.join(pairwise.pop("matchFragments"))
+            pairwise["referenceUnaligned"] = UnalignedFlags(pairwise["referenceLine"])
+            pairwise["matchUnaligned"]     = UnalignedFlags(pairwise["matchLine"])
+            del pairwise["lastTag"], pairwise["blockEnd"]
+        return pairwise
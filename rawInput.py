@@ -0,0 +1,214 @@
+#################################################################################################
+# Module:  rawInput.py
+# Version No.: 1.1
+#
+# Description: This module reads pairwise alignments directly from the unmodified output files
+# of TM-align and Dali Lite, so that a combAlign input file need not be assembled by hand.
+#
+# A directory holds one output file per run of the alignment program:
+#   TM-align: the standard output of one run, in which the structure given first (Chain_1) is
+#      aligned to the structure given second (Chain_2). The names of the structures are taken
+#      from the 'Name of Chain_1:' and 'Name of Chain_2:' lines (file name, without directory
+#      or extension), and the three alignment lines from those following the line beginning
+#      '(":" denotes'. The aligned length, RMSD, and sequence identity are taken from the
+#      'Aligned length=' line, and the TM-scores from the 'TM-score=' lines.
+#   DaliLite: a pairwise result file, in which a query structure is aligned to one or more
+#      subject structures. Each alignment begins with a line of the form
+#         No 1: Query=mol1A Sbjct=mol2A Z-score=25.0
+#      followed by blocks of DSSP, Query, ident, Sbjct, and DSSP lines, as in a combAlign
+#      input file. Scores (e.g., the Z-score) are taken from the name=value fields of this line.
+# The files are parsed in a pool of worker processes, and their alignments are returned in
+# order of file name. Every alignment is given as (name of first structure, name of second
+# structure, pairwise dict); function OrientAlignments orients each toward a chosen reference
+# structure, inverting those in which the reference is the second structure. The reference
+# sequence is read from a fasta file, if one is given, and otherwise is derived from the
+# reference line of an alignment, by removing its gap characters. The alignment programs' output
+# files, and the fasta file, may be compressed with gzip, bzip2, or xz (see compressedFiles.py).
+#
+# Copyright 2014 by Carol L. Ecale Zhou, Lawrence Livermore National Security.  All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational,
+# research, and not-for-profit purposes, without fee and without a signed licensing agreement, is
+# hereby granted, provided that the above copyright notice, this paragraph and the following two
+# paragraphs appear in all copies, modifications, and distributions. Contact Office of XXXX,
+# Lawrence Livermore National Security (LLNS) for commercial licensing opportunities.
+#    In no event shall LLNS be liable to any party for direct, indirect, special, incidental, or
+# consequential damages, including lost profits, arising out of the use of this software and its
+# documentation, even if LLNS has been advised of the possibility of such damage.
+#    LLNL disclaims any warranties, including, but not limited to, the implied warranties of
+# merchantability and fitness for a particular purpose. The software and accompanying documentation
+# if any, provided hereunder is provided "as is", LLNS has no obligation to provide maintenance,
+# support, updates, enhancements, or modifications.
+##################################################################################################
+
+import os, re
+import pairwise               # pairwise.py module; Dali Lite block handling
+import compressedFiles        # compressedFiles.py module; reads gzip, bzip2, and xz files
+
+TM_ALIGN           = "TM-align"
+DALI_LITE          = "DaliLite"
+TM_CHAIN_1         = "Name of Chain_1:"
+TM_CHAIN_2         = "Name of Chain_2:"
+TM_ALIGNMENT       = '(":" denotes'   # line preceding the three alignment lines
+GAP_CHARACTERS     = "-. "            # characters removed from a reference line to derive its sequence
+
+# PATTERNS
+p_daliPair     = re.compile('^No\s+\d+:\s+Query=(\S+)\s+Sbjct=(\S+)')
+p_tmSummary    = re.compile('^Aligned length=\s*(\d+),\s*RMSD=\s*([\d.]+),\s*Seq_ID=\S*?=\s*([\d.]+)')
+p_tmScore      = re.compile('^TM-score=\s*([\d.]+)\s*\(if normalized by length of Chain_([12])')
+
+def StructureName(field):  # Returns the name of a structure given as a file name
+    return os.path.splitext(os.path.basename(field))[0]
+
+def ParseTMalignOutput(lines):
+    # Function ParseTMalignOutput() returns the alignment in the standard output of one run of
+    # TM-align, as a list holding (name of Chain_1, name of Chain_2, pairwise dict), or an empty
+    # list if no alignment was found.
+    name1 = ""
+    name2 = ""
+    scores = {}
+    alignmentLines = []
+    ALIGN = False
+    for nextLine in lines:
+        nextLine = nextLine.rstrip('\r\n')
+        if ALIGN:
+            alignmentLines.append(nextLine)
+            if len(alignmentLines) == 3:
+                break
+        elif nextLine.startswith(TM_CHAIN_1):
+            name1 = StructureName(nextLine[len(TM_CHAIN_1):].split()[0])
+        elif nextLine.startswith(TM_CHAIN_2):
+            name2 = StructureName(nextLine[len(TM_CHAIN_2):].split()[0])
+        elif p_tmSummary.match(nextLine):
+            match = p_tmSummary.match(nextLine)
+            scores[pairwise.ALIGNED_LENGTH] = float(match.group(1))
+            scores[pairwise.RMSD]           = float(match.group(2))
+            scores[pairwise.IDENTITY]       = 100.0 * float(match.group(3))  # given as a fraction
+        elif p_tmScore.match(nextLine):
+            match = p_tmScore.match(nextLine)
+            if match.group(2) == '1':  # Chain_1 is the reference of the alignment lines
+                scores[pairwise.TM_SCORE] = float(match.group(1))
+            else:
+                scores[pairwise.TM_SCORE_MATCH] = float(match.group(1))
+        elif nextLine.startswith(TM_ALIGNMENT):
+            ALIGN = True
+    if len(alignmentLines) < 3:
+        return []
+    newPairwise = {
+        "matchName"          : name2,
+        "referenceLine"      : alignmentLines[0],
+        "correspondenceLine" : alignmentLines[1],
+        "matchLine"          : alignmentLines[2],
+        "scores"             : scores,
+        }
+    return [(name1, name2, newPairwise)]
+
+def ParseDaliOutput(lines):
+    # Function ParseDaliOutput() returns the alignments in a Dali Lite pairwise result file, as
+    # a list holding (query name, subject name, pairwise dict) for each, in order.
+    reader = pairwise.PairwiseReader([],DALI_LITE)  # used for its Dali Lite block handling
+    alignments = []
+    names = None
+    newPairwise = None
+    for nextLine in lines:
+        nextLine = nextLine.rstrip('\r\n')
+        if newPairwise and nextLine[:5] in pairwise.DL_TAGS:
+            reader.ReadDaliLine(nextLine,newPairwise)
+            continue
+        match = p_daliPair.match(nextLine)
+        if match or nextLine.startswith('#'):  # next alignment, or end of alignments
+            if newPairwise:
+                alignments.append(names + (reader.CompletePairwise(newPairwise),))
+                newPairwise = None
+            if match:
+                names = (match.group(1), match.group(2))
+                newPairwise = reader.NewPairwise(match.group(2),pairwise.ParseScores(nextLine))
+    if newPairwise:
+        alignments.append(names + (reader.CompletePairwise(newPairwise),))
+    return alignments
+
+def ParseRawFile(job):
+    # Function ParseRawFile() parses one output file; it may be run in a worker process. job is
+    # (file name, format). Returns (file name, line count, alignments, error message).
+    (path, inFormat) = job
+    try:
+        INFILE = compressedFiles.OpenInput(path)
+        lines = INFILE.readlines()
+        INFILE.close()
+    except compressedFiles.READ_ERRORS, e:
+        return (path, 0, [], str(e))
+    if inFormat == DALI_LITE:
+        alignments = ParseDaliOutput(lines)
+    else:
+        alignments = ParseTMalignOutput(lines)
+    if not alignments:
+        return (path, len(lines), [], "no alignment found")
+    return (path, len(lines), alignments, "")
+
+def ListRawFiles(directory):  # Returns the (non-hidden) files in directory, in order of name
+    files = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory,name)
+        if not name.startswith('.') and os.path.isfile(path):
+            files.append(path)
+    return files
+
+def ReadRawDirectory(directory,inFormat,workers=0):
+    # Function ReadRawDirectory() parses every output file in directory, in a pool of worker
+    # processes (0: one per cpu), and yields the result of ParseRawFile for each file, in order
+    # of file name.
+    import multiprocessing
+    jobs = [(path,inFormat) for path in ListRawFiles(directory)]
+    if workers <= 0:
+        workers = multiprocessing.cpu_count()
+    if workers == 1 or len(jobs) < 2:  # no need for a pool
+        for job in jobs:
+            yield ParseRawFile(job)
+        return
+    pool = multiprocessing.Pool(min(workers,len(jobs)))
+    try:
+        for result in pool.imap(ParseRawFile,jobs,4):
+            yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+def ReadFasta(fastaFile,referenceName=None):  # Returns a refSeq dict holding the first sequence of a fasta file
+    refSeq = {"reference":"", "header":"", "sequence":""}
+    FASTA = compressedFiles.OpenInput(fastaFile)
+    sequence = []
+    for nextLine in FASTA:
+        nextLine = nextLine.strip()
+        if nextLine.startswith('>'):
+            if refSeq["header"]:
+                break
+            refSeq["header"] = nextLine
+        elif nextLine and not nextLine.startswith('#'):
+            sequence.append(nextLine)
+    FASTA.close()
+    refSeq["sequence"]  = ''.join(sequence)
+    refSeq["reference"] = referenceName or refSeq["header"].lstrip('>')
+    return refSeq
+
+def DeriveReference(referenceName,referenceLine):  # Returns a refSeq dict derived from the reference line of an alignment
+    refSeq = {
+        "reference" : referenceName,
+        "header"    : ">" + referenceName,
+        "sequence"  : referenceLine.rstrip('*').translate(None,GAP_CHARACTERS),
+        }
+    return refSeq
+
+def OrientAlignments(alignments,referenceName):
+    # Function OrientAlignments() returns (oriented, skipped): the pairwise dicts of the
+    # (name, name, pairwise dict) alignments that involve structure referenceName, each with
+    # referenceName as its reference, and the (name, name) of those that do not.
+    oriented = []
+    skipped  = []
+    for (name1, name2, newPairwise) in alignments:
+        if name1 == referenceName:
+            oriented.append(newPairwise)
+        elif name2 == referenceName:
+            oriented.append(pairwise.InvertPairwise(newPairwise,name1))
+        else:
+            skipped.append((name1,name2))
+    return (oriented, skipped)
@@ -0,0 +1,342 @@
+#################################################################################################
+# Module:  renderers.py
+# Version No.: 1.1
+#
+# Description: This module writes a built multiple alignment (see alignment.py) in each of the
+# acceptable output formats, to any number of open files in a single pass over the alignment.
+# Classes: Renderer, CombAlignRenderer, AlignedFastaRenderer, ClustalRenderer,
+#          StockholmRenderer, A2MRenderer
+#
+# The output formats are:
+#   combAlign     - the standard combAlign mssa (summary lines, then the correspondence and match
+#                   lines of each aligned structure, whole or in segments of 'width' columns)
+#   aligned_fasta - one fasta record per sequence (www.bioperl.org/wiki/FASTA_multiple_alignment_format)
+#   clustal       - Clustal W: blocks of 'width' columns (60 if width is 0), each sequence on a
+#                   line beginning with its name, followed by a line marking with '*' each
+#                   column in which every sequence has the same residue
+#   stockholm     - Stockholm 1.0, one line per sequence (not interleaved), with a '#=GC RF' line
+#                   marking the columns of reference residues ('x') and of insertions ('.'), and a
+#                   '#=GS <name> DE' line giving the scores of each alignment that has any
+#   a2m           - fasta records in which the columns of reference residues hold upper-case
+#                   residues and '-' gaps, and the insertion columns (gaps in the reference) hold
+#                   lower-case residues and '.' gaps
+# Function RenderAll() creates one renderer per (format, file), computes the column statistics
+# at most once for all of them, and decodes each aligned structure's display strings once,
+# passing them to every renderer that writes sequences one after another. The interleaved
+# formats (combAlign with a width, and clustal) cannot write a structure's line until every
+# structure's line of the preceding block is written; they take the columns of each block
+# directly from the display strings at the end of the pass.
+# The terminal '*' column of the alignment is not written in the clustal, stockholm, and a2m
+# formats, and whitespace within a name is replaced by '_' in the clustal and stockholm formats.
+#
+# Copyright 2014 by Carol L. Ecale Zhou, Lawrence Livermore National Security.  All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational,
+# research, and not-for-profit purposes, without fee and without a signed licensing agreement, is
+# hereby granted, provided that the above copyright notice, this paragraph and the following two
+# paragraphs appear in all copies, modifications, and distributions. Contact Office of XXXX,
+# Lawrence Livermore National Security (LLNS) for commercial licensing opportunities.
+#    In no event shall LLNS be liable to any party for direct, indirect, special, incidental, or
+# consequential damages, including lost profits, arising out of the use of this software and its
+# documentation, even if LLNS has been advised of the possibility of such damage.
+#    LLNL disclaims any warranties, including, but not limited to, the implied warranties of
+# merchantability and fitness for a particular purpose. The software and accompanying documentation
+# if any, provided hereunder is provided "as is", LLNS has no obligation to provide maintenance,
+# support, updates, enhancements, or modifications.
+##################################################################################################
+
+import os, re
+import alignment              # alignment.py module; format names, summary and fasta records
+import compactRows            # compactRows.py module; columns of display strings
+import compressedFiles        # compressedFiles.py module; compression suffixes
+import pairwise               # pairwise.py module; scores of pairwise alignments
+
+FORMAT_EXTENSIONS = {         # file extension of each output format, when several are written
+    alignment.STANDARD      : ".mssa",
+    alignment.ALIGNED_FASTA : ".fasta",
+    alignment.CLUSTAL       : ".aln",
+    alignment.STOCKHOLM     : ".sto",
+    alignment.A2M           : ".a2m",
+    }
+CLUSTAL_HEADER     = "CLUSTAL W multiple sequence alignment (combAlign)"
+CLUSTAL_WIDTH      = 60       # columns per block when no width is given
+CLUSTAL_PADDING    = 6        # spaces between the longest name and the residues
+STOCKHOLM_HEADER   = "# STOCKHOLM 1.0"
+STOCKHOLM_END      = "//"
+
+# PATTERNS
+p_whitespace  = re.compile('\s+')
+p_gapRun      = re.compile('-+')
+
+def SafeName(name):  # Returns name with whitespace replaced, for formats in which a name is one word
+    return p_whitespace.sub('_',name.strip()) or "unnamed"
+
+def OutputFileNames(mssaFile,formats):
+    # Function OutputFileNames() returns the file to write for each of formats: mssaFile itself
+    # if there is only one format, and otherwise mssaFile with its extension replaced by that
+    # of each format (e.g., my_mssa.aln, my_mssa.sto), keeping any compression suffix (e.g.,
+    # my_mssa.aln.gz).
+    if len(formats) == 1:
+        return [mssaFile]
+    (name, suffix) = compressedFiles.SplitCompressionSuffix(mssaFile)
+    base = os.path.splitext(name)[0]
+    return [base + FORMAT_EXTENSIONS[format] + suffix for format in formats]
+
+class Renderer(object):  # Writes an alignment in one format; subclasses override Begin, Row and End
+
+    format          = None
+    sequential      = True   # False: the whole alignment is written by method End
+    dropTerminal    = False  # True: the terminal '*' column is not written
+
+    def __init__(self,myAlignment,OUTFILE,width,first,last):
+        self.alignment  = myAlignment
+        self.OUTFILE    = OUTFILE
+        self.width      = width
+        self.first      = first      # columns first through last-1 of the alignment are written
+        self.last       = last
+        if self.dropTerminal and last == len(myAlignment.refDisplayString) and last > first:
+            self.last = last - 1
+        self.statistics = None       # column statistics of columns first on, set by RenderAll
+        self.needsCorrespondence = False
+
+    def NeedsStatistics(self):
+        return self.NeedsConsensus()
+
+    def NeedsConsensus(self):
+        return self.alignment.consensusLine and self.alignment.alignmentCount > 0
+
+    def Consensus(self):  # Returns the consensus line of the columns written, or None
+        if self.statistics is None or not self.NeedsConsensus():
+            return None
+        return self.statistics["consensus"][:self.last-self.first]
+
+    def Names(self):  # Returns the name of the reference, followed by those of the aligned structures
+        return [SafeName(self.alignment.reference)] + [SafeName(name) for name in self.alignment.matchNameList]
+
+    def Begin(self):
+        pass
+
+    def Row(self,j,match,correspondence):
+        # Method Row() is passed columns first through last-1 (as given to RenderAll) of the match
+        # and, if needsCorrespondence, correspondence strings of alignment j, in order of j.
+        pass
+
+    def End(self):
+        pass
+
+class CombAlignRenderer(Renderer):
+
+    format = alignment.STANDARD
+
+    def __init__(self,myAlignment,OUTFILE,width,first,last):
+        Renderer.__init__(self,myAlignment,OUTFILE,width,first,last)
+        self.sequential = (width == 0)
+        self.needsCorrespondence = self.sequential
+        self.segmentCount = 0
+
+    def Begin(self):
+        self.segmentCount = self.alignment.PrintSummary(self.OUTFILE,self.width,self.first,self.last,self.format)
+        if self.width == 0:  # Simple case:  print as is
+            self.OUTFILE.write("%s%s%s\n" % (self.alignment.refDisplayString[self.first:self.last], " ", self.alignment.refHeader))
+        else:
+            self.OUTFILE.write("%s%s\n" % ("There are this many segment sets: ", self.alignment.alignmentCount * self.segmentCount))
+
+    def Row(self,j,match,correspondence):
+        self.OUTFILE.write("%s\n%s\n" % (correspondence,match))
+
+    def End(self):
+        consensus = self.Consensus()
+        if self.width == 0:
+            if consensus:
+                self.OUTFILE.write("%s%s%s\n" % (consensus, " ", alignment.CONSENSUS_NAME))
+            return
+
+        # The alignment is written one segment (block of 'width' columns) at a time, directly
+        # from the display strings. Assuming you have pairwise alignments A, B, C, and D,
+        # comprising alignment chunks A1, A2, A3, etc., this is printed as:
+        #    A1
+        #    B1
+        #    C1
+        #    D1
+        #    A2
+        #    B2  etc.
+        myAlignment = self.alignment
+        refHeader = myAlignment.refHeader[1:]  # trim '>' from header
+        for i in xrange(0,self.segmentCount):
+            start = self.first + i * self.width
+            if i == self.segmentCount-1:  # last segment (may be shorter than width)
+                end = self.last
+            else:
+                end = start + self.width
+            lines = []
+            if myAlignment.alignmentCount > 0:
+                lines.append("%s%s%s" % (myAlignment.refDisplayString[start:end]," ",refHeader))
+            for j in xrange(0,myAlignment.alignmentCount):
+                stringPair = myAlignment.displayStrings[j]
+                lines.append(compactRows.RowSegment(stringPair,"correspondence",start,end))
+                lines.append("%s%s%s" % (compactRows.RowSegment(stringPair,"match",start,end)," ",myAlignment.matchNameList[j]))
+            if consensus:
+                lines.append("%s%s%s" % (consensus[start-self.first:end-self.first]," ",alignment.CONSENSUS_NAME))
+            lines.append("\n")
+            self.OUTFILE.write("\n".join(lines))
+
+class AlignedFastaRenderer(Renderer):  # Each sequence is written from its display string with a single write call
+
+    format = alignment.ALIGNED_FASTA
+
+    def Begin(self):
+        self.alignment.PrintSummary(self.OUTFILE,self.width,self.first,self.last,self.format)
+        self.alignment.WriteFastaRecord(self.OUTFILE,self.alignment.refHeader,self.alignment.refDisplayString[self.first:self.last],self.width)
+
+    def Row(self,j,match,correspondence):
+        self.alignment.WriteFastaRecord(self.OUTFILE,">" + self.alignment.matchNameList[j],match,self.width)
+
+    def End(self):
+        consensus = self.Consensus()
+        if consensus:
+            self.alignment.WriteFastaRecord(self.OUTFILE,">" + alignment.CONSENSUS_NAME,consensus,self.width)
+
+class ClustalRenderer(Renderer):
+
+    format       = alignment.CLUSTAL
+    sequential   = False
+    dropTerminal = True
+
+    def NeedsStatistics(self):  # for the conservation line
+        return True
+
+    def End(self):
+        myAlignment = self.alignment
+        names = self.Names()
+        nameWidth = max([len(name) for name in names]) + CLUSTAL_PADDING
+        width = self.width or CLUSTAL_WIDTH
+        frequencies = self.statistics["frequencies"]
+        gapFraction = self.statistics["gapFraction"]
+        self.OUTFILE.write("%s\n" % (CLUSTAL_HEADER))
+        for start in xrange(self.first,self.last,width):
+            end = min(start + width,self.last)
+            lines = [""]
+            lines.append("%-*s%s" % (nameWidth,names[0],myAlignment.refDisplayString[start:end]))
+            for j in xrange(0,myAlignment.alignmentCount):
+                match = compactRows.RowSegment(myAlignment.displayStrings[j],"match",start,end)
+                lines.append("%-*s%s" % (nameWidth,names[j+1],match.replace('.','-')))  # Clustal has only '-' gaps
+            conservation = []
+            for i in xrange(start-self.first,end-self.first):
+                if len(frequencies[i]) == 1 and gapFraction[i] == 0:
+                    conservation.append('*')
+                else:
+                    conservation.append(' ')
+            lines.append("%s%s" % (" " * nameWidth,''.join(conservation)))
+            lines.append("")
+            self.OUTFILE.write("\n".join(lines))
+
+class StockholmRenderer(Renderer):
+
+    format       = alignment.STOCKHOLM
+    dropTerminal = True
+
+    def Begin(self):
+        names = self.Names()
+        self.nameWidth = max([len(name) for name in names] + [len("#=GC seq_cons")]) + 1
+        reference = self.alignment.refDisplayString[self.first:self.last]
+        self.OUTFILE.write("%s\n" % (STOCKHOLM_HEADER))
+        self.OUTFILE.write("%s%s\n" % ("#=GF ID ",names[0]))
+        self.OUTFILE.write("%s%s\n" % ("#=GF DE ",self.alignment.refHeader[1:]))
+        scores = self.alignment.scores
+        for j in sorted(scores):
+            self.OUTFILE.write("%s %s %s %s\n" % ("#=GS",names[j+1],"DE",pairwise.FormatScores(scores[j])))
+        self.OUTFILE.write("\n%-*s%s\n" % (self.nameWidth,names[0],reference))
+        self.names = names
+
+    def Row(self,j,match,correspondence):
+        self.OUTFILE.write("%-*s%s\n" % (self.nameWidth,self.names[j+1],match[:self.last-self.first]))
+
+    def End(self):
+        reference = self.alignment.refDisplayString[self.first:self.last]
+        consensus = self.Consensus()
+        if consensus:
+            self.OUTFILE.write("%-*s%s\n" % (self.nameWidth,"#=GC seq_cons",consensus))
+        self.OUTFILE.write("%-*s%s\n" % (self.nameWidth,"#=GC RF",''.join([(c == '-' and '.' or 'x') for c in reference])))
+        self.OUTFILE.write("%s\n" % (STOCKHOLM_END))
+
+class A2MRenderer(Renderer):
+
+    format       = alignment.A2M
+    dropTerminal = True
+
+    def Begin(self):
+        # The insertion columns are the runs of gaps in the reference; each sequence is split into
+        # runs of match and insertion columns, and each run converted in one call
+        reference = self.alignment.refDisplayString[self.first:self.last]
+        self.runs = []  # (start, end, insertion) of each run of columns
+        prev = 0
+        for gap in p_gapRun.finditer(reference):
+            if gap.start() > prev:
+                self.runs.append((prev, gap.start(), False))
+            self.runs.append((gap.start(), gap.end(), True))
+            prev = gap.end()
+        if len(reference) > prev:
+            self.runs.append((prev, len(reference), False))
+        self.alignment.WriteFastaRecord(self.OUTFILE,self.alignment.refHeader,self.Convert(reference),self.width)
+
+    def Convert(self,sequence):
+        # Method Convert() returns the columns written of a gapped sequence, in a2m form: gaps in
+        # insertion columns are '.', and gaps in match columns (including DaliLite's '.') are '-'
+        pieces = []
+        for (start, end, insertion) in self.runs:
+            if insertion:
+                pieces.append(sequence[start:end].lower().replace('-','.'))
+            else:
+                pieces.append(sequence[start:end].upper().replace('.','-'))
+        return ''.join(pieces)
+
+    def Row(self,j,match,correspondence):
+        self.alignment.WriteFastaRecord(self.OUTFILE,">" + self.alignment.matchNameList[j],self.Convert(match),self.width)
+
+RENDERERS = dict([(renderer.format, renderer) for renderer in
+    (CombAlignRenderer, AlignedFastaRenderer, ClustalRenderer, StockholmRenderer, A2MRenderer)])
+
+def RenderAll(myAlignment,outputs,width=0):
+    # Function RenderAll() writes an alignment (once its strings are created) in each format of
+    # outputs, a list of (format, open file), making a single pass over the aligned structures.
+    # Only the columns of the region set by the alignment's method SetRegion, if any, are written.
+    # An unacceptable format raises ValueError, before anything is written.
+    width = int(width) # cast to integer
+    (first, last) = myAlignment.GetPrintColumns()
+    renderers = []
+    for (format, OUTFILE) in outputs:
+        if format not in RENDERERS:
+            raise ValueError("Please request an acceptable output format: %s" % (alignment.ACCEPTABLE_OUTPUT_FORMATS,))
+        renderers.append(RENDERERS[format](myAlignment,OUTFILE,width,first,last))
+    if [renderer for renderer in renderers if renderer.NeedsStatistics()]:
+        statistics = myAlignment.ComputeColumnStatistics(first,last)
+        for renderer in renderers:
+            renderer.statistics = statistics
+    for renderer in renderers:
+        renderer.Begin()
+    sequential = [renderer for renderer in renderers if renderer.sequential]
+    if sequential:
+        needsCorrespondence = [renderer for renderer in sequential if renderer.needsCorrespondence]
+        # Alignments that share a row of the column store (see alignment.py) share its decoded
+        # strings, which are kept only until the row's last alignment is written
+        lastUse = {}
+        for j in xrange(0,myAlignment.alignmentCount):
+            lastUse[myAlignment.rowIndex[j]] = j
+        decoded = {}
+        for j in xrange(0,myAlignment.alignmentCount):
+            r = myAlignment.rowIndex[j]
+            if r in decoded:
+                (match, correspondence) = decoded[r]
+            else:
+                stringPair = myAlignment.displayStrings[j]
+                match = compactRows.RowSegment(stringPair,"match",first,last)
+                correspondence = None
+                if needsCorrespondence:
+                    correspondence = compactRows.RowSegment(stringPair,"correspondence",first,last)
+                if lastUse[r] > j:
+                    decoded[r] = (match, correspondence)
+            if lastUse[r] == j:
+                decoded.pop(r,None)
+            for renderer in sequential:
+                renderer.Row(j,match,correspondence)
+    for renderer in renderers:
+        renderer.End()
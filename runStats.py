@@ -0,0 +1,127 @@
+#################################################################################################
+# Module:  runStats.py
+# Version No.: 1.1
+#
+# Description: This module contains instrumentation for a combAlign run.
+# Classes: RunStats, CountingWriter
+#
+# Class RunStats accumulates, for each stage of a run (e.g., parsing the input, adding pairwise
+# alignments, creating the alignment strings, writing the mssa), the elapsed wall-clock time,
+# the CPU time (user plus system) and the number of times the stage was entered, along with a
+# set of named counters (e.g., lines read, alignments added, gapped length). A stage may be
+# entered any number of times; its times are summed. The run is summarized as a single JSON
+# record by method WriteJSON, suitable for collection by a job scheduler. Optionally, the run's
+# stages are profiled with cProfile, and the profile is saved by method WriteProfile (read it
+# with the standard pstats module).
+# Class CountingWriter wraps an open output file and counts the bytes written through it.
+#
+# Copyright 2014 by Carol L. Ecale Zhou, Lawrence Livermore National Security.  All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational,
+# research, and not-for-profit purposes, without fee and without a signed licensing agreement, is
+# hereby granted, provided that the above copyright notice, this paragraph and the following two
+# paragraphs appear in all copies, modifications, and distributions. Contact Office of XXXX,
+# Lawrence Livermore National Security (LLNS) for commercial licensing opportunities.
+#    In no event shall LLNS be liable to any party for direct, indirect, special, incidental, or
+# consequential damages, including lost profits, arising out of the use of this software and its
+# documentation, even if LLNS has been advised of the possibility of such damage.
+#    LLNL disclaims any warranties, including, but not limited to, the implied warranties of
+# merchantability and fitness for a particular purpose. The software and accompanying documentation
+# if any, provided hereunder is provided "as is", LLNS has no obligation to provide maintenance,
+# support, updates, enhancements, or modifications.
+##################################################################################################
+
+import os, time
+
+STAGE_TOTAL  = "total"   # names of the stages of a combAlign run
+STAGE_PARSE  = "parse"
+STAGE_MAP    = "map"
+STAGE_ADD    = "add"
+STAGE_CREATE = "create"
+STAGE_STATE  = "state"
+STAGE_WRITE  = "write"
+
+def CpuSeconds():  # Returns user plus system CPU time of this process
+    times = os.times()
+    return times[0] + times[1]
+
+class RunStats(object):
+
+    def __init__(self,profile=False):
+        self.stages     = {}    # stage name -> [wall seconds, cpu seconds, calls]
+        self.stageOrder = []    # stage names, in order first entered
+        self.running    = {}    # stage name -> (wall, cpu) at which the stage was entered
+        self.counters   = {}    # counter name -> value
+        self.fields     = {}    # descriptive fields of the run (input file, formats, ...)
+        self.started    = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self.profiler   = None
+        if profile:
+            import cProfile
+            self.profiler = cProfile.Profile()
+
+    def Start(self,stage):  # Enters stage; the profiler, if any, runs while any stage is entered
+        if self.profiler and not self.running:
+            self.profiler.enable()
+        self.running[stage] = (time.time(), CpuSeconds())
+
+    def Stop(self,stage):  # Leaves stage, adding the time since it was entered
+        (wall, cpu) = self.running.pop(stage)
+        if stage not in self.stages:
+            self.stages[stage] = [0.0, 0.0, 0]
+            self.stageOrder.append(stage)
+        totals = self.stages[stage]
+        totals[0] += time.time() - wall
+        totals[1] += CpuSeconds() - cpu
+        totals[2] += 1
+        if self.profiler and not self.running:
+            self.profiler.disable()
+
+    def Timed(self,stage,iterable):  # Yields the items of iterable, timing the production of each as stage
+        iterator = iter(iterable)
+        while True:
+            self.Start(stage)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.Stop(stage)
+                return
+            self.Stop(stage)
+            yield item
+
+    def Count(self,name,value):  # Sets counter name
+        self.counters[name] = value
+
+    def Increment(self,name,value=1):
+        self.counters[name] = self.counters.get(name,0) + value
+
+    def Describe(self,name,value):  # Sets a descriptive field of the run
+        self.fields[name] = value
+
+    def Record(self):  # Returns a dict summarizing the run
+        record = dict(self.fields)
+        record["started"]  = self.started
+        record["counters"] = dict(self.counters)
+        record["stages"]   = []
+        for stage in self.stageOrder:
+            (wall, cpu, calls) = self.stages[stage]
+            record["stages"].append({"stage":stage, "wallSeconds":round(wall,6), "cpuSeconds":round(cpu,6), "calls":calls})
+        return record
+
+    def WriteJSON(self,OUTFILE):  # Writes the run's record as one line of JSON
+        import json
+        OUTFILE.write("%s\n" % (json.dumps(self.Record(),sort_keys=True)))
+
+    def WriteProfile(self,profileFile):  # Saves the profile of the run's stages; returns False if not profiled
+        if not self.profiler:
+            return False
+        self.profiler.dump_stats(profileFile)
+        return True
+
+class CountingWriter(object):  # Passes writes through to an open file, counting the bytes written
+
+    def __init__(self,OUTFILE):
+        self.OUTFILE = OUTFILE
+        self.bytes   = 0
+
+    def write(self,data):
+        self.bytes += len(data)
+        self.OUTFILE.write(data)
@@ -0,0 +1,45 @@
+#############################################################################################
+# Module:  test_pairwise.py
+#
+# Description:  Tests of module pairwise. Run with: python -m unittest test_pairwise
+#############################################################################################
+
+import os
+import unittest
+import pairwise               # pairwise.py module; reads input file
+
+DALI_LITE_INPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)),"GP_Reston_DaliLite_In.txt")
+
+def LineFlags(line):  # Returns the per-residue flags of an alignment line, computed one residue at a time
+    return bytearray([residue.islower() and 1 or 0 for residue in line if residue not in pairwise.GAP_CHARACTERS])
+
+class InvertPairwiseTest(unittest.TestCase):
+
+    def setUp(self):
+        INFILE = open(DALI_LITE_INPUT,"r")
+        reader = pairwise.PairwiseReader(INFILE,"DaliLite")
+        reader.ReadReference()
+        self.alignments = list(reader.Alignments())
+        INFILE.close()
+
+    def testUnalignedFlagsFollowTheirLines(self):
+        for original in self.alignments:
+            inverted = pairwise.InvertPairwise(original,"reference")
+            self.assertEqual(inverted["referenceUnaligned"],original["matchUnaligned"])
+            self.assertEqual(inverted["matchUnaligned"],original["referenceUnaligned"])
+            for field in ("reference", "match"):
+                self.assertEqual(inverted[field + "Unaligned"],LineFlags(inverted[field + "Line"]))
+
+    def testInvertingTwiceRestoresFlags(self):
+        for original in self.alignments:
+            restored = pairwise.InvertPairwise(pairwise.InvertPairwise(original,"reference"),original["matchName"])
+            self.assertEqual(restored["referenceUnaligned"],original["referenceUnaligned"])
+            self.assertEqual(restored["matchUnaligned"],original["matchUnaligned"])
+
+    def testNoFlagsWithoutDaliLite(self):
+        original = {"matchName":"b", "referenceLine":"AC-D", "correspondenceLine":":: :", "matchLine":"ACED"}
+        inverted = pairwise.InvertPairwise(original,"a")
+        self.assertFalse("referenceUnaligned" in inverted or "matchUnaligned" in inverted)
+
+if __name__ == "__main__":
+    unittest.main()
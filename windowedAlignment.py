@@ -0,0 +1,309 @@
+#################################################################################################
+# Module:  windowedAlignment.py
+# Version No.: 1.1
+#
+# Description: This module builds a multiple alignment out of core, for panels of aligned
+# structures too large for the column store and display strings to be held in memory at once.
+# Classes: WindowedAlignment, SpilledRow
+#
+# A WindowedAlignment is used exactly as an Alignment (see alignment.py), and produces exactly
+# the same strings, but:
+#   1) Each distinct pairwise alignment, as mapped onto the reference (see function
+#      alignment.MapAlignment), is appended to a spill file, rather than to the column store in
+#      memory. Only the spill file offset of each row, and the width of the widest loop opened
+#      ahead of each reference position, are kept in memory.
+#   2) The display strings are created one window of reference positions at a time: the match
+#      and correspondence characters and the loops of each row within the window are read back
+#      from the spill file, and the row's columns of the window are written to a second pair of
+#      spill files (one for match strings, one for correspondence strings). Each window's columns
+#      are stored together, row after row, so that a window of every row is a single read.
+#   3) The display strings of each aligned structure are SpilledRow objects, which, like the
+#      CompactRow of module compactRows, return the columns requested of a string, here by
+#      reading them from the spill files. An alignment is therefore written (see renderers.py)
+#      holding a single row in memory at a time.
+# The windows are chosen so that the columns of a window, across all aligned structures, fit
+# within the memory budget given; column statistics (e.g., the consensus line) are computed
+# one window at a time. Memory use is then bounded by the budget, plus a few dozen bytes per
+# pairwise alignment (its name, and its row's spill file offset), and the length of the gapped
+# reference, however many structures are aligned.
+# The spill files are anonymous temporary files (in directory spillDir, if given, and otherwise
+# in the system's temporary directory), which are removed when they are closed. A
+# WindowedAlignment cannot be saved with method SaveState.
+#
+# Copyright 2014 by Carol L. Ecale Zhou, Lawrence Livermore National Security.  All Rights Reserved.
+# Permission to use, copy, modify, and distribute this software and its documentation for educational,
+# research, and not-for-profit purposes, without fee and without a signed licensing agreement, is
+# hereby granted, provided that the above copyright notice, this paragraph and the following two
+# paragraphs appear in all copies, modifications, and distributions. Contact Office of XXXX,
+# Lawrence Livermore National Security (LLNS) for commercial licensing opportunities.
+#    In no event shall LLNS be liable to any party for direct, indirect, special, incidental, or
+# consequential damages, including lost profits, arising out of the use of this software and its
+# documentation, even if LLNS has been advised of the possibility of such damage.
+#    LLNL disclaims any warranties, including, but not limited to, the implied warranties of
+# merchantability and fitness for a particular purpose. The software and accompanying documentation
+# if any, provided hereunder is provided "as is", LLNS has no obligation to provide maintenance,
+# support, updates, enhancements, or modifications.
+##################################################################################################
+
+import bisect, tempfile
+from array import array
+import alignment              # alignment.py module; the Alignment class and mapped alignments
+
+MATCH          = "match"      # keys of a stringPair
+CORRESPONDENCE = "correspondence"
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024  # bytes
+WINDOW_BYTES_PER_CELL = 6     # memory taken per column of a window, per aligned structure, while
+                              # computing column statistics (strings read, joined, and uppercased)
+SPILL_PREFIX   = "combAlign_spill_"
+
+class SpilledRow(object):  # The match and correspondence display strings of one row of a WindowedAlignment
+
+    __slots__ = ("store", "row")
+
+    def __init__(self,store,row):
+        self.store = store  # the WindowedAlignment
+        self.row   = row    # row of the column store
+
+    def __getitem__(self,key):
+        return self.Segment(key,0,len(self.store.refDisplayString))
+
+    def Segment(self,key,start,end):  # Returns columns start:end of the match or correspondence string
+        return self.store.ReadColumns(key,self.row,start,end)
+
+class WindowedAlignment(alignment.Alignment):
+
+    def __init__(self,format,memoryBudget=DEFAULT_MEMORY_BUDGET,spillDir=None):
+        alignment.Alignment.__init__(self,format)
+        self.memoryBudget = int(memoryBudget)  # bytes of columns held in memory at once
+        self.spillDir     = spillDir
+        self.SPILLFILE    = self.OpenSpillFile()  # mapped alignments, one record per row
+        self.rowOffsets   = array('L')  # spill file offset of each row's record
+        self.rowLoopCounts = array('I') # number of loops of each row
+        self.maxLoopWidths = None       # width of the widest loop opened ahead of each reference position
+        self.loopCount    = 0
+        self.gappedFiles  = {}          # MATCH, CORRESPONDENCE -> spill file of the display strings
+        self.windowStarts  = array('I') # first reference position of each window, then refLength
+        self.windowColumns = array('L') # first gapped column of each window, then the gapped length
+
+    def OpenSpillFile(self):
+        return tempfile.TemporaryFile(prefix=SPILL_PREFIX,dir=self.spillDir)
+
+    def Close(self):  # Closes (and so removes) the spill files; the alignment may no longer be written
+        for SPILLFILE in [self.SPILLFILE] + self.gappedFiles.values():
+            SPILLFILE.close()
+
+    def SaveState(self,STATEFILE):
+        raise ValueError("An out-of-core alignment cannot be saved")
+
+    def AddMappedAlignment(self,matchName,mapped):
+        # Method AddMappedAlignment() appends a mapped pairwise alignment to the spill file, as a
+        # record comprising its match and correspondence rows, loop positions, loop ends, and
+        # loop residues, unless it is identical to an alignment already added.
+        if len(mapped["matchRow"]) != self.refLength:
+            print "reference residue count is", len(mapped["matchRow"]), "reference sequence length is", self.refLength
+            return 3  # error code
+        key = alignment.MappedDigest(mapped)
+        if key in self.rowKeys:
+            return self.AddSharedAlignment(matchName,self.rowKeys[key])
+        if self.maxLoopWidths is None:
+            self.maxLoopWidths = array('I',[0]) * self.refLength
+        self.rowKeys[key] = len(self.rowOwners)
+        self.rowIndex.append(len(self.rowOwners))
+        self.rowOwners.append(self.alignmentCount)
+        self.SPILLFILE.seek(0,2)
+        self.rowOffsets.append(self.SPILLFILE.tell())
+        self.rowLoopCounts.append(len(mapped["loopPositions"]))
+        for field in (mapped["matchRow"], mapped["correspondenceRow"], mapped["loopPositions"].tostring(),
+                      mapped["loopEnds"].tostring(), mapped["loopResidues"]):
+            self.SPILLFILE.write(field)
+        prev = 0
+        for (position, end) in zip(mapped["loopPositions"],mapped["loopEnds"]):
+            if end - prev > self.maxLoopWidths[position]:
+                self.maxLoopWidths[position] = end - prev
+            prev = end
+        self.loopCount += len(mapped["loopPositions"])
+        self.matchNameList.append(matchName)
+        self.loopStrings.append("")
+        self.displayStrings.append(None)  # a SpilledRow, once the strings are created
+        self.alignmentCount += 1
+        return 0
+
+    def ReadRecord(self,r,start=0,end=None):  # See method Alignment.ReadRecord; the row is read from the spill file
+        if end is None:
+            end = self.refLength
+        refLength = self.refLength
+        count = self.rowLoopCounts[r]
+        SPILLFILE = self.SPILLFILE
+        SPILLFILE.seek(self.rowOffsets[r] + start)
+        matchRow = SPILLFILE.read(end - start)
+        SPILLFILE.seek(self.rowOffsets[r] + refLength + start)
+        correspondenceRow = SPILLFILE.read(end - start)
+        loops = {}
+        if count:
+            SPILLFILE.seek(self.rowOffsets[r] + 2 * refLength)
+            positions = array('I')
+            positions.fromstring(SPILLFILE.read(positions.itemsize * count))
+            first = bisect.bisect_left(positions,start)
+            last  = bisect.bisect_left(positions,end)
+            if first < last:
+                ends = array('I')
+                ends.fromstring(SPILLFILE.read(ends.itemsize * count))
+                base = first and ends[first-1]
+                SPILLFILE.seek(self.rowOffsets[r] + 2 * refLength + (positions.itemsize + ends.itemsize) * count + base)
+                residues = SPILLFILE.read(ends[last-1] - base)  # residues of loops first through last-1
+                prev = base
+                for k in xrange(first,last):
+                    loops[positions[k]] = residues[prev-base:ends[k]-base]
+                    prev = ends[k]
+        return (matchRow, correspondenceRow, loops)
+
+    def GetMappedAlignment(self,j):  # Returns alignment j from the spill file, as mapped by function MapAlignment
+        r = self.rowIndex[j]
+        (matchRow, correspondenceRow, loops) = self.ReadRecord(r)
+        positions = sorted(loops)
+        loopEnds = array('I')
+        end = 0
+        for position in positions:
+            end += len(loops[position])
+            loopEnds.append(end)
+        mapped = {
+            "matchRow"          : matchRow,
+            "correspondenceRow" : correspondenceRow,
+            "loopPositions"     : array('I',positions),
+            "loopEnds"          : loopEnds,
+            "loopResidues"      : ''.join([loops[position] for position in positions]),
+            }
+        return mapped
+
+    def GetLoops(self,j):  # Returns dict of loop strings in alignment j, keyed by the reference position they precede
+        return self.ReadRecord(self.rowIndex[j])[2]
+
+    def GetLoop(self,j,position):  # Returns loop string (possibly empty) opened by alignment j ahead of position
+        return self.ReadRecord(self.rowIndex[j],position,position+1)[2].get(position,"")
+
+    def GetPairwiseData(self,i):  # See method Alignment.GetPairwiseData
+        pairwise = {
+            "refChar"            : "",
+            "correspondenceList" : [],
+            "matchList"          : [],
+            "gapList"            : [],
+            }
+        if self.alignmentCount > 0:
+            pairwise["refChar"] = self.refSequence[i]
+        nextPosition = (i + 1) % self.refLength  # loop opened ahead of next position (leading loop wraps to '*')
+        for j in xrange(0,self.alignmentCount):
+            (matchRow, correspondenceRow, loops) = self.ReadRecord(self.rowIndex[j],i,i+1)
+            pairwise["matchList"].append(matchRow)
+            pairwise["correspondenceList"].append(correspondenceRow)
+            pairwise["gapList"].append(self.GetLoop(j,nextPosition))
+        return pairwise
+
+    def ComputeLoopWidths(self):  # Widths are kept up to date as alignments are added
+        if self.maxLoopWidths is None:
+            return [0] * self.refLength
+        return list(self.maxLoopWidths)
+
+    def CreateAlignmentStrings(self):  # The strings are always written in a single pass (see CreateDisplayRows)
+        self.CreateAlignmentStringsLinear()
+
+    def ExtendAlignmentStrings(self):  # Recreates the strings; the windows depend on every alignment added
+        self.CreateAlignmentStrings()
+
+    def PlanWindows(self):
+        # Method PlanWindows() divides the reference positions into windows, each spanning as
+        # many gapped columns (a position, and the gap columns opened ahead of it) as fit within
+        # the memory budget, given the number of aligned structures; a window holds at least
+        # one position.
+        maxColumns = max(self.memoryBudget / (WINDOW_BYTES_PER_CELL * (self.alignmentCount + 1)), 1)
+        self.windowStarts  = array('I')
+        self.windowColumns = array('L')
+        columns = 0
+        col = 0
+        for i in xrange(0,self.refLength):
+            width = self.loopWidths[i] + 1
+            if i == 0 or columns + width > maxColumns:
+                self.windowStarts.append(i)
+                self.windowColumns.append(col)
+                columns = 0
+            columns += width
+            col += width
+        self.windowStarts.append(self.refLength)
+        self.windowColumns.append(col)
+
+    def CreateDisplayRows(self):
+        # Method CreateDisplayRows() writes the display strings of every row, window by window,
+        # to new spill files, and points each alignment to a SpilledRow reading them.
+        self.PlanWindows()
+        for SPILLFILE in self.gappedFiles.values():
+            SPILLFILE.close()
+        self.gappedFiles = {MATCH:self.OpenSpillFile(), CORRESPONDENCE:self.OpenSpillFile()}
+        MATCHFILE = self.gappedFiles[MATCH]
+        CORRESPONDENCEFILE = self.gappedFiles[CORRESPONDENCE]
+        for w in xrange(0,len(self.windowStarts)-1):
+            (start, end) = (self.windowStarts[w], self.windowStarts[w+1])
+            width = self.windowColumns[w+1] - self.windowColumns[w]
+            loopPositions = [i for i in xrange(start,end) if self.loopWidths[i]]
+            for r in xrange(0,len(self.rowOwners)):
+                (matchRow, correspondenceRow, loops) = self.ReadRecord(r,start,end)
+                MATCHFILE.write(self.BuildWindowRow(matchRow,loops,start,loopPositions,self.loopWidths,width,'-'))
+                CORRESPONDENCEFILE.write(self.BuildWindowRow(correspondenceRow,{},start,loopPositions,self.loopWidths,width,' '))
+        MATCHFILE.flush()
+        CORRESPONDENCEFILE.flush()
+        for (r, j) in enumerate(self.rowOwners):
+            self.displayStrings[j] = SpilledRow(self,r)
+        self.ShareDisplayStrings()
+        self.builtCount = self.alignmentCount
+
+    def WindowOffset(self,w,r):  # Returns the offset in a display string spill file of window w of row r
+        return len(self.rowOwners) * self.windowColumns[w] + r * (self.windowColumns[w+1] - self.windowColumns[w])
+
+    def ReadColumns(self,key,r,start,end):  # Returns columns start:end of the match or correspondence string of row r
+        SPILLFILE = self.gappedFiles[key]
+        end = min(end,self.windowColumns[-1])
+        pieces = []
+        w = bisect.bisect_right(self.windowColumns,start) - 1
+        while start < end:
+            stop = min(end,self.windowColumns[w+1])
+            SPILLFILE.seek(self.WindowOffset(w,r) + start - self.windowColumns[w])
+            pieces.append(SPILLFILE.read(stop - start))
+            start = stop
+            w += 1
+        return ''.join(pieces)
+
+    def ReadWindow(self,key,w):  # Returns the columns of window w of the match or correspondence string of each row
+        SPILLFILE = self.gappedFiles[key]
+        width = self.windowColumns[w+1] - self.windowColumns[w]
+        SPILLFILE.seek(self.WindowOffset(w,0))
+        block = SPILLFILE.read(width * len(self.rowOwners))
+        return [block[r*width:(r+1)*width] for r in xrange(0,len(self.rowOwners))]
+
+    def ComputeColumnStatistics(self,first=0,last=None):
+        # Method ComputeColumnStatistics() computes the statistics of alignment.Alignment's method,
+        # one window at a time, reading every row's columns of the window from the spill files.
+        gappedLength = len(self.refDisplayString)
+        statistics = {"strong":[], "weak":[], "gapFraction":[], "frequencies":[], "entropy":[], "consensus":""}
+        if last is None:
+            last = gappedLength
+        consensus = []
+        for w in xrange(0,len(self.windowStarts)-1):
+            (windowFirst, windowLast) = (self.windowColumns[w], self.windowColumns[w+1])
+            if windowLast <= first or windowFirst >= last:
+                continue
+            matches = self.ReadWindow(MATCH,w)
+            correspondences = self.ReadWindow(CORRESPONDENCE,w)
+            windowStatistics = alignment.ColumnStatistics(self.refDisplayString[windowFirst:windowLast],
+                [matches[r] for r in self.rowIndex],[correspondences[r] for r in self.rowIndex],
+                max(first,windowFirst) - windowFirst,min(last,windowLast) - windowFirst)
+            for (key, values) in windowStatistics.items():
+                if key == "consensus":
+                    consensus.append(values)
+                else:
+                    statistics[key].extend(values)
+        statistics["consensus"] = ''.join(consensus)
+        return statistics
+
+    def GetBuildCounters(self):  # Returns dict of counts describing the alignment and its display strings
+        counters = alignment.Alignment.GetBuildCounters(self)
+        counters["loopCount"] = self.loopCount
+        counters["windows"]   = max(len(self.windowStarts) - 1, 0)
+        return counters